@@ -0,0 +1,168 @@
+from __future__ import annotations
+
+import argparse
+import json
+import multiprocessing
+import shutil
+import tempfile
+from collections.abc import Callable
+from pathlib import Path
+from typing import Any
+
+import pyarrow.parquet as pq
+from synthetic import (
+    ID_STYLES,
+    STRING_IDS,
+    ScenarioSize,
+    generate_scenario,
+    vehicle_presence,
+)
+
+from prep_disolv.common.config import OUTPUT_PATH, OUTPUT_SETTINGS, Config
+from prep_disolv.common.metrics import StageMetrics, run_measured
+from prep_disolv.rsu.junction import JunctionPlacement
+from prep_disolv.vehicle.sumo import SumoConverter
+from prep_disolv.vehicle.veh_activations import VehicleActivation
+
+SCALES = {
+    "small": (200, 50, 50),
+    "medium": (1000, 200, 200),
+    "large": (5000, 400, 1000),
+}
+SEED = 0
+
+
+def _output_path(config: Config) -> Path:
+    """Get the output folder of the scenario, which the config creates."""
+    return config.path / config.get(OUTPUT_SETTINGS)[OUTPUT_PATH]
+
+
+def setup_sumo_converter(config: Config, _size: ScenarioSize) -> SumoConverter:
+    return SumoConverter(config, _output_path(config))
+
+
+def run_sumo_converter(converter: SumoConverter) -> int:
+    converter.fcd_to_parquet()
+    return pq.ParquetFile(converter.get_parquet_file()).metadata.num_rows
+
+
+def setup_vehicle_activation(config: Config, size: ScenarioSize) -> tuple:
+    presence = vehicle_presence(size, SEED + 1)
+    return VehicleActivation(_output_path(config)), presence
+
+
+def run_vehicle_activation(state: tuple) -> int:
+    activation, presence = state
+    updates = 0
+    for step, present in enumerate(presence):
+        for vehicle in present.nonzero()[0]:
+            activation.update_activation(step * 1000, int(vehicle))
+            updates += 1
+        activation.time_step_complete(step * 1000)
+    return updates
+
+
+def setup_vehicle_activation_writer(
+    config: Config, size: ScenarioSize
+) -> VehicleActivation:
+    state = setup_vehicle_activation(config, size)
+    run_vehicle_activation(state)
+    return state[0]
+
+
+def run_vehicle_activation_writer(activation: VehicleActivation) -> int:
+    activation.write_activation_data()
+    return pq.ParquetFile(activation.activation_file).metadata.num_rows
+
+
+def setup_junction_placement(config: Config, _size: ScenarioSize) -> JunctionPlacement:
+    return JunctionPlacement(config, _output_path(config), 0)
+
+
+def run_junction_placement(placement: JunctionPlacement) -> int:
+    placement.create_rsu_data()
+    return placement.get_unique_rsu_count()
+
+
+def setup_rsu_activation_writer(
+    config: Config, _size: ScenarioSize
+) -> JunctionPlacement:
+    placement = JunctionPlacement(config, _output_path(config), 0)
+    placement.read_rsu_data()
+    return placement
+
+
+def run_rsu_activation_writer(placement: JunctionPlacement) -> int:
+    placement._write_activation_data(placement.junctions)
+    return len(placement.junctions)
+
+
+# Each benchmark sets up its state untimed and returns the rows of the timed run.
+BENCHMARKS: dict[str, tuple[Callable[..., Any], Callable[[Any], int]]] = {
+    "sumo_converter": (setup_sumo_converter, run_sumo_converter),
+    "vehicle_activation": (setup_vehicle_activation, run_vehicle_activation),
+    "vehicle_activation_writer": (
+        setup_vehicle_activation_writer,
+        run_vehicle_activation_writer,
+    ),
+    "junction_placement": (setup_junction_placement, run_junction_placement),
+    "rsu_activation_writer": (setup_rsu_activation_writer, run_rsu_activation_writer),
+}
+
+
+def run_benchmark(name: str, config_file: Path, size: ScenarioSize) -> StageMetrics:
+    """Run one benchmark, which is called in a fresh process for its peak memory."""
+    setup, run = BENCHMARKS[name]
+    state = setup(Config(str(config_file)), size)
+    row_count, metrics = run_measured(name, run, (state,))
+    metrics.rows = row_count
+    return metrics
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run the throughput benchmarks.")
+    parser.add_argument(
+        "--scales", nargs="+", choices=list(SCALES), default=["small", "medium"]
+    )
+    parser.add_argument(
+        "--benchmarks", nargs="+", choices=list(BENCHMARKS), default=list(BENCHMARKS)
+    )
+    parser.add_argument("--id-style", choices=ID_STYLES, default=STRING_IDS)
+    parser.add_argument("--output", type=Path, help="Write the results as JSON.")
+    parser.add_argument("--keep", type=Path, help="Keep the scenarios in a folder.")
+    args = parser.parse_args()
+
+    scenario_root = args.keep or Path(tempfile.mkdtemp(prefix="prep_disolv_bench_"))
+    context = multiprocessing.get_context("spawn")
+    results = []
+    print(
+        f"{'scale':<8}{'benchmark':<28}{'rows':>10}{'wall s':>10}"
+        f"{'rows/s':>14}{'peak rss MB':>14}"
+    )
+    try:
+        for scale in args.scales:
+            size = ScenarioSize(*SCALES[scale], id_style=args.id_style)
+            config_file = generate_scenario(scenario_root / scale, size, SEED)
+            for name in args.benchmarks:
+                with context.Pool(1) as pool:
+                    metrics = pool.apply(run_benchmark, (name, config_file, size))
+                peak_rss = (metrics.peak_rss or 0) / 2**20
+                print(
+                    f"{scale:<8}{name:<28}{metrics.rows:>10}"
+                    f"{metrics.wall_time:>10.3f}{metrics.rows_per_second:>14.1f}"
+                    f"{peak_rss:>14.1f}"
+                )
+                results.append(
+                    {"scale": scale, "size": repr(size), **metrics.to_dict()}
+                )
+    finally:
+        if args.keep is None:
+            shutil.rmtree(scenario_root, ignore_errors=True)
+
+    if args.output is not None:
+        with Path.open(args.output, "w") as f:
+            json.dump({"benchmarks": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+from __future__ import annotations
+
+import argparse
+import statistics
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+from synthetic import ScenarioSize, generate_scenario
+
+CLI = Path(__file__).resolve().parents[1] / "src" / "__main__.py"
+
+# These are only needed once a stage runs, never for --help or --validate.
+HEAVY_MODULES = ["numpy", "pandas", "polars", "pyarrow", "pyproj", "tqdm"]
+
+
+def parse_import_times(stderr: str) -> dict[str, int]:
+    """Get the cumulative import time in microseconds of each top level import."""
+    import_times = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        _, cumulative, module = line.split("|")
+        # Nested imports are indented below the module that imports them.
+        if module.startswith("  "):
+            continue
+        import_times[module.strip()] = int(cumulative)
+    return import_times
+
+
+def run_with_import_times(command: list[str]) -> str:
+    """Run the command with -X importtime and get the import time report."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", *command],
+        capture_output=True,
+        text=True,
+        check=False,
+    )
+    if result.returncode != 0:
+        msg = f"{command} failed: {result.stdout}{result.stderr[-2000:]}"
+        raise RuntimeError(msg)
+    return result.stderr
+
+
+def measure(command: list[str]) -> dict[str, int]:
+    """Get the top level import times of the command."""
+    return parse_import_times(run_with_import_times(command))
+
+
+def startup_time(command: list[str], interpreter: set[str], runs: int) -> tuple:
+    """Get the median import time of the command beyond the bare interpreter."""
+    totals = []
+    import_times: dict[str, int] = {}
+    for _ in range(runs):
+        import_times = measure(command)
+        totals.append(
+            sum(t for module, t in import_times.items() if module not in interpreter)
+        )
+    return statistics.median(totals) / 1000, import_times
+
+
+def all_imported_modules(command: list[str]) -> set[str]:
+    """Get the names of every module the command imports."""
+    return {
+        line.split("|")[2].strip()
+        for line in run_with_import_times(command).splitlines()
+        if line.startswith("import time:") and "imported package" not in line
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Check the command line start up.")
+    parser.add_argument(
+        "--budget-ms",
+        type=float,
+        default=60.0,
+        help="The import time budget of each command in milliseconds.",
+    )
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    interpreter = set(measure(["-c", "pass"]))
+    failed = False
+    with tempfile.TemporaryDirectory(prefix="prep_disolv_startup_") as folder:
+        config_file = generate_scenario(Path(folder), ScenarioSize(10, 5, 4))
+        commands = {
+            "help": [str(CLI), "--help"],
+            "validate": [str(CLI), "--validate", "-c", str(config_file)],
+        }
+        print(f"{'command':<10}{'imports ms':>12}{'budget ms':>12}  slowest imports")
+        for name, command in commands.items():
+            import_ms, import_times = startup_time(command, interpreter, args.runs)
+            slowest = sorted(
+                (item for item in import_times.items() if item[0] not in interpreter),
+                key=lambda item: item[1],
+                reverse=True,
+            )[:3]
+            slowest_text = ", ".join(f"{m} {t / 1000:.1f}" for m, t in slowest)
+            print(
+                f"{name:<10}{import_ms:>12.1f}{args.budget_ms:>12.1f}  {slowest_text}"
+            )
+
+            heavy = sorted(set(HEAVY_MODULES) & all_imported_modules(command))
+            if heavy:
+                print(f"{name}: imports {heavy}, which should be imported lazily")
+                failed = True
+            if import_ms > args.budget_ms:
+                print(f"{name}: {import_ms:.1f} ms is over the budget")
+                failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
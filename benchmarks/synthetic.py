@@ -0,0 +1,252 @@
+from __future__ import annotations
+
+import argparse
+from pathlib import Path
+
+import numpy as np
+
+NET_OFFSET_X = -500000.0
+NET_OFFSET_Y = -5000000.0
+PROJECTION = "+proj=utm +zone=32 +ellps=WGS84 +datum=WGS84 +units=m +no_defs"
+STRING_IDS = "string"
+NUMERIC_IDS = "numeric"
+MIXED_IDS = "mixed"
+ID_STYLES = [STRING_IDS, NUMERIC_IDS, MIXED_IDS]
+VEHICLE_TYPES = ["car", "bus", "truck"]
+
+
+class ScenarioSize:
+    def __init__(
+        self,
+        vehicles: int,
+        time_steps: int,
+        junctions: int,
+        id_style: str = STRING_IDS,
+        area: float = 2000.0,
+        step_size: float = 1.0,
+    ) -> None:
+        """The size of a synthetic scenario.
+
+        Parameters
+        ----------
+        vehicles : int
+            The number of distinct vehicles in the trace.
+        time_steps : int
+            The number of time steps in the trace.
+        junctions : int
+            The number of priority junctions in the network, which become RSUs.
+        id_style : str
+            Whether the vehicle IDs are strings, numbers or both.
+        area : float
+            The side of the square network in metres.
+        step_size : float
+            The time between two time steps in seconds.
+        """
+        if id_style not in ID_STYLES:
+            msg = f"Unknown ID style {id_style}, use one of {ID_STYLES}."
+            raise ValueError(msg)
+        self.vehicles = vehicles
+        self.time_steps = time_steps
+        self.junctions = junctions
+        self.id_style = id_style
+        self.area = area
+        self.step_size = step_size
+
+    def __repr__(self) -> str:
+        return (
+            f"ScenarioSize({self.vehicles} vehicles, {self.time_steps} steps, "
+            f"{self.junctions} junctions, {self.id_style} IDs)"
+        )
+
+
+def vehicle_id_labels(vehicle_count: int, id_style: str) -> list[str]:
+    """Get the trace IDs of the vehicles in the given style."""
+    if id_style == NUMERIC_IDS:
+        return [str(vehicle) for vehicle in range(vehicle_count)]
+    if id_style == MIXED_IDS:
+        return [
+            str(vehicle) if vehicle % 2 == 0 else f"veh{vehicle}"
+            for vehicle in range(vehicle_count)
+        ]
+    return [f"veh{vehicle}" for vehicle in range(vehicle_count)]
+
+
+def vehicle_presence(size: ScenarioSize, seed: int) -> np.ndarray:
+    """Get the time steps at which each vehicle is in the trace.
+
+    Every vehicle departs at a random step and stays for a random duration. A
+    tenth of the vehicles leave the trace for a few steps to create activations
+    with more than one interval.
+
+    Returns
+    -------
+    np.ndarray
+        A boolean array of shape (time_steps, vehicles).
+    """
+    rng = np.random.default_rng(seed)
+    steps = np.arange(size.time_steps)[:, np.newaxis]
+    departures = rng.integers(0, max(size.time_steps // 2, 1), size.vehicles)
+    durations = rng.integers(
+        max(size.time_steps // 4, 1), size.time_steps + 1, size.vehicles
+    )
+    present = (steps >= departures) & (steps < departures + durations)
+
+    gap_starts = departures + durations // 2
+    has_gap = rng.random(size.vehicles) < 0.1
+    in_gap = (steps >= gap_starts) & (steps < gap_starts + 3) & has_gap
+    return present & ~in_gap
+
+
+def generate_network(net_file: Path, size: ScenarioSize, seed: int) -> None:
+    """Write a SUMO network with the location, edges and junctions of the size."""
+    rng = np.random.default_rng(seed)
+    edge_count = max(size.junctions, 1) * 2
+    with Path.open(net_file, "w") as f:
+        f.write('<?xml version="1.0" encoding="UTF-8"?>\n<net version="1.16">\n')
+        f.write(
+            f'    <location netOffset="{NET_OFFSET_X:.2f},{NET_OFFSET_Y:.2f}" '
+            f'convBoundary="0.00,0.00,{size.area:.2f},{size.area:.2f}" '
+            f'origBoundary="0,0,1,1" projParameter="{PROJECTION}"/>\n'
+        )
+        edge_starts = rng.uniform(0, size.area - 100.0, (edge_count, 2))
+        for edge, (x, y) in enumerate(edge_starts):
+            f.write(
+                f'    <edge id="e{edge}" from="j{edge % max(size.junctions, 1)}" '
+                f'to="j{(edge + 1) % max(size.junctions, 1)}">\n'
+                f'        <lane id="e{edge}_0" index="0" speed="13.89" '
+                f'length="100.00" shape="{x:.2f},{y:.2f} {x + 100.0:.2f},{y:.2f}"/>\n'
+                f"    </edge>\n"
+            )
+
+        junction_points = rng.uniform(0, size.area, (size.junctions, 2))
+        junction_points += np.array([NET_OFFSET_X, NET_OFFSET_Y])
+        for junction, (x, y) in enumerate(junction_points):
+            # Priority junctions become RSUs, the others are skipped.
+            junction_type = "priority" if junction % 4 else "dead_end"
+            f.write(
+                f'    <junction id="j{junction}" type="{junction_type}" '
+                f'x="{x:.2f}" y="{y:.2f}" '
+                f'shape="{x - 5:.2f},{y - 5:.2f} {x + 5:.2f},{y - 5:.2f} '
+                f'{x + 5:.2f},{y + 5:.2f} {x - 5:.2f},{y + 5:.2f}"/>\n'
+            )
+        f.write("</net>\n")
+
+
+def generate_trace(fcd_file: Path, size: ScenarioSize, seed: int) -> int:
+    """Write a SUMO FCD trace of the size and return the number of rows."""
+    rng = np.random.default_rng(seed)
+    presence = vehicle_presence(size, seed)
+    labels = vehicle_id_labels(size.vehicles, size.id_style)
+    edge_count = max(size.junctions, 1) * 2
+    lanes = [f"e{vehicle % edge_count}_0" for vehicle in range(size.vehicles)]
+    types = [
+        VEHICLE_TYPES[vehicle % len(VEHICLE_TYPES)] for vehicle in range(size.vehicles)
+    ]
+    positions = rng.uniform(0, size.area, (size.vehicles, 2))
+    headings = rng.uniform(0, 2 * np.pi, size.vehicles)
+
+    row_count = 0
+    with Path.open(fcd_file, "w") as f:
+        f.write('<?xml version="1.0" encoding="UTF-8"?>\n<fcd-export>\n')
+        for step in range(size.time_steps):
+            speeds = rng.uniform(0.0, 20.0, size.vehicles)
+            headings += rng.normal(0.0, 0.1, size.vehicles)
+            distances = speeds * size.step_size
+            positions[:, 0] += distances * np.cos(headings)
+            positions[:, 1] += distances * np.sin(headings)
+            np.clip(positions, 0.0, size.area, out=positions)
+
+            f.write(f'    <timestep time="{step * size.step_size:.2f}">\n')
+            for vehicle in np.flatnonzero(presence[step]):
+                x = positions[vehicle, 0] + NET_OFFSET_X
+                y = positions[vehicle, 1] + NET_OFFSET_Y
+                f.write(
+                    f'        <vehicle id="{labels[vehicle]}" x="{x:.2f}" '
+                    f'y="{y:.2f}" angle="{np.degrees(headings[vehicle]) % 360:.2f}" '
+                    f'type="{types[vehicle]}" speed="{speeds[vehicle]:.2f}" '
+                    f'pos="0.00" lane="{lanes[vehicle]}" slope="0.00"/>\n'
+                )
+            f.write("    </timestep>\n")
+            row_count += int(presence[step].sum())
+        f.write("</fcd-export>\n")
+    return row_count
+
+
+def write_config(config_file: Path, size: ScenarioSize) -> None:
+    """Write a prep-disolv config for the synthetic network and trace."""
+    duration = int(size.time_steps * size.step_size)
+    config_file.write_text(
+        f"""[logging]
+log_level = "warning"
+log_overwrite = true
+
+[simulation]
+duration = {duration}
+step_size = {size.step_size}
+
+[traffic]
+network = "synthetic.net.xml"
+trace = "synthetic.fcd.xml"
+
+[vehicles]
+simulator = "sumo"
+id_init = 100000
+
+[rsu]
+placement = "junction"
+start_time = 0
+id_init = 200000
+
+[controller]
+placement = "center"
+start_time = 0
+id_init = 300000
+
+[output]
+output_path = "output"
+"""
+    )
+
+
+def generate_scenario(folder: Path, size: ScenarioSize, seed: int = 0) -> Path:
+    """Write the network, trace and config of a synthetic scenario.
+
+    The same size and seed always produce the same files.
+
+    Parameters
+    ----------
+    folder : Path
+        The folder of the scenario, created if missing.
+    size : ScenarioSize
+        The size of the scenario.
+    seed : int
+        The seed of the random generator.
+
+    Returns
+    -------
+    Path
+        The config file of the scenario.
+    """
+    folder.mkdir(parents=True, exist_ok=True)
+    generate_network(folder / "synthetic.net.xml", size, seed)
+    generate_trace(folder / "synthetic.fcd.xml", size, seed + 1)
+    config_file = folder / "config.toml"
+    write_config(config_file, size)
+    return config_file
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Generate a synthetic scenario.")
+    parser.add_argument("folder", type=Path, help="The output folder.")
+    parser.add_argument("--vehicles", type=int, default=1000)
+    parser.add_argument("--time-steps", type=int, default=100)
+    parser.add_argument("--junctions", type=int, default=100)
+    parser.add_argument("--id-style", choices=ID_STYLES, default=STRING_IDS)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    size = ScenarioSize(args.vehicles, args.time_steps, args.junctions, args.id_style)
+    generate_scenario(args.folder, size, args.seed)
+
+
+if __name__ == "__main__":
+    main()
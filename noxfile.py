@@ -42,6 +42,18 @@ def tests(session: nox.Session) -> None:
     session.run("pytest", *session.posargs)
 
 
+@nox.session
+def benchmarks(session: nox.Session) -> None:
+    """
+    Run the throughput benchmarks on synthetic scenarios. Pass "--scales large"
+    or "--output results.json" to change the run. The start up of the command
+    line is checked against its import time budget first.
+    """
+    session.install(".")
+    session.run("python", "benchmarks/startup.py")
+    session.run("python", "benchmarks/run_benchmarks.py", *session.posargs)
+
+
 @nox.session(reuse_venv=True)
 def docs(session: nox.Session) -> None:
     """
@@ -4,19 +4,70 @@ import argparse
 import sys
 import time
 
-from prep_disolv.core.core import Core
+from prep_disolv.common.config import Config, expand_config_files
+
+
+def validate(config_files: list) -> int:
+    """Validate the config files without preparing the scenarios."""
+    from prep_disolv.common.validation import validate_config
+
+    invalid_count = 0
+    for config_file in config_files:
+        try:
+            errors = validate_config(Config(str(config_file), create_folders=False))
+        except (OSError, ValueError) as error:
+            errors = [f"Could not read the config: {error}"]
+        for error in errors:
+            print(f"{config_file}: {error}")
+        if errors:
+            invalid_count += 1
+        else:
+            print(f"{config_file}: OK")
+    return 1 if invalid_count else 0
 
 
 def main():
     parser = argparse.ArgumentParser()
-    parser.add_argument("-c", "--config", help="Config file path", required=True)
+    inputs = parser.add_mutually_exclusive_group(required=True)
+    inputs.add_argument("-c", "--config", help="Config file path")
+    inputs.add_argument(
+        "-b", "--batch", nargs="+", help="Config file paths or glob patterns"
+    )
+    parser.add_argument(
+        "-w", "--workers", type=int, default=1, help="Worker processes in batch mode"
+    )
+    parser.add_argument(
+        "--validate",
+        action="store_true",
+        help="Only check the config files and the input files they name",
+    )
     args = parser.parse_args()
-    core = Core(args.config)
+    try:
+        config_files = (
+            expand_config_files(args.batch) if args.batch is not None else [args.config]
+        )
+    except ValueError as error:
+        print(f"Invalid config files: {error}")
+        return 1
+    if args.validate:
+        return validate(config_files)
+
     # calculate execution time
     exec_start = time.time()
-    core.prepare_scenario()
+    # The scenario modules are imported here to keep --help and --validate fast.
+    if args.batch is not None:
+        from prep_disolv.core.batch import BatchRunner
+
+        batch_runner = BatchRunner(config_files, args.workers)
+        batch_runner.run()
+    else:
+        from prep_disolv.core.core import Core
+
+        core = Core(args.config)
+        core.prepare_scenario()
     exec_end = time.time()
     print(f"Execution time: {exec_end - exec_start:.3f} seconds")
+    return 0
 
 
 if __name__ == "__main__":
@@ -0,0 +1,57 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+import numpy as np
+
+from prep_disolv.common.columns import ACTIVATION_COLUMNS
+
+
+def write_activations_polars(
+    activation_file: Path,
+    agent_ids: list[int],
+    ns3_ids: list[int],
+    start_times: list[list[int]],
+    end_times: list[list[int]],
+) -> None:
+    """Write an activation table with Polars in one pass.
+
+    Every agent has a list of start times and a list of end times, which become
+    one row per activation interval.
+
+    Parameters
+    ----------
+    activation_file : Path
+        The parquet file to write.
+    agent_ids : list[int]
+        The IDs of the agents.
+    ns3_ids : list[int]
+        The ns-3 IDs of the agents.
+    start_times : list[list[int]]
+        The start times of the activation intervals of every agent.
+    end_times : list[list[int]]
+        The end times of the activation intervals of every agent.
+    """
+    import polars as pl
+
+    interval_counts = np.array([len(times) for times in start_times], dtype=np.int64)
+    activations = pl.DataFrame(
+        {
+            ACTIVATION_COLUMNS[0]: np.repeat(
+                np.asarray(agent_ids, dtype=np.int64), interval_counts
+            ),
+            ACTIVATION_COLUMNS[1]: np.repeat(
+                np.asarray(ns3_ids, dtype=np.int64), interval_counts
+            ),
+            ACTIVATION_COLUMNS[2]: _flatten(start_times),
+            ACTIVATION_COLUMNS[3]: _flatten(end_times),
+        }
+    )
+    activations.write_parquet(activation_file)
+
+
+def _flatten(times: list[list[int]]) -> np.ndarray:
+    """Concatenate the times of all agents."""
+    return np.fromiter(
+        (time for agent_times in times for time in agent_times), dtype=np.int64
+    )
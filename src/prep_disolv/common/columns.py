@@ -9,11 +9,20 @@ ON_TIMES = "on_times"
 OFF_TIMES = "off_times"
 LAT = "lat"
 LON = "lon"
+TARGET_ID = "target_id"
+AGENT_TYPE = "agent_type"
+DISTANCE = "distance"
+ORIGINAL_ID = "original_id"
+VELOCITY = "velocity"
+ACTIVE = "active"
 
 ACTIVATION_COLUMNS = [AGENT_ID, NS3_ID, ON_TIMES, OFF_TIMES]
 RSU_COLUMNS = [TIME_STEP, AGENT_ID, NS3_ID, COORD_X, COORD_Y, LAT, LON]
 CONTROLLER_COLUMNS = [TIME_STEP, AGENT_ID, NS3_ID, COORD_X, COORD_Y, LAT, LON]
+ACTIVATION_UPDATE_COLUMNS = [TIME_STEP, AGENT_ID, ACTIVE]
+LINK_COLUMNS = [TIME_STEP, AGENT_ID, TARGET_ID, DISTANCE]
 
 # Folders
 POSITIONS_FOLDER = "positions"
 ACTIVATIONS_FOLDER = "activations"
+LINKS_FOLDER = "links"
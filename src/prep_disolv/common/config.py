@@ -1,12 +1,16 @@
+import logging
 from pathlib import Path
 
 import toml
 
 from prep_disolv.common.columns import (
     ACTIVATIONS_FOLDER,
+    LINKS_FOLDER,
     POSITIONS_FOLDER,
 )
 
+logger = logging.getLogger(__name__)
+
 # Config keys.
 LOG_SETTINGS = "logging"
 TRAFFIC_SETTINGS = "traffic"
@@ -16,21 +20,76 @@ RSU_SETTINGS = "rsu"
 OUTPUT_SETTINGS = "output"
 CONTROLLER_SETTINGS = "controller"
 SIMULATION_SETTINGS = "simulation"
+LINK_SETTINGS = "links"
+NS3_SETTINGS = "ns3"
+EXECUTION_SETTINGS = "execution"
+PERFORMANCE_SETTINGS = "performance"
+GEOMETRY_SETTINGS = "geometry"
+MOSAIC_SETTINGS = "mosaic"
+FEATURE_SETTINGS = "features"
+EDGE_SETTINGS = "edges"
 
 # Common keys.
 ID_INIT = "id_init"
+WORKERS = "workers"
+
+# Geometry keys, the feature conversion uses the same format key.
+GEOMETRY_FORMAT = "format"
+
+# Feature keys.
+FEATURE_INPUT = "input"
+FEATURE_LAYERS = "layers"
+CHUNK_SIZE = "chunk_size"
+
+# Edge statistics keys.
+EDGE_WINDOW = "window"
+PERCENTILES = "percentiles"
+
+# MOSAIC keys.
+VEHICLE_CLASS = "vehicle_class"
+VEHICLE_APPLICATIONS = "vehicle_applications"
+RSU_APPLICATIONS = "rsu_applications"
+CONTROLLER_APPLICATIONS = "controller_applications"
+
+# Execution keys.
+ENGINE = "engine"
+MEMORY_LIMIT = "memory_limit"
+
+# Table engines of the post-processing stages.
+ARROW_ENGINE = "arrow"
+POLARS_ENGINE = "polars"
+
+# Storage types of the vehicle coordinates and velocities.
+FLOAT64_COORDINATES = "float64"
+FLOAT32_COORDINATES = "float32"
+FIXED_COORDINATES = "fixed"
+COORDINATE_TYPES = [FLOAT64_COORDINATES, FLOAT32_COORDINATES, FIXED_COORDINATES]
+
+# Parquet encodings of the vehicle coordinates and velocities.
+PLAIN_ENCODING = "plain"
+BYTE_STREAM_SPLIT_ENCODING = "byte_stream_split"
+DELTA_ENCODING = "delta"
+COLUMN_ENCODINGS = [PLAIN_ENCODING, BYTE_STREAM_SPLIT_ENCODING, DELTA_ENCODING]
 
 # Traffic keys.
 NETWORK_FILE = "network"
 TRACE_FILE = "trace"
 OFFSET_X = "offset_x"
 OFFSET_Y = "offset_y"
+ID_MAPPING = "id_mapping"
+FOLLOW = "follow"
+FOLLOW_TIMEOUT = "follow_timeout"
 
 # Vehicle keys.
 SIMULATOR = "simulator"
+COORDINATES = "coordinates"
+RESOLUTION = "resolution"
+COLUMN_ENCODING = "encoding"
+QUEUE_SIZE = "queue_size"
 
 # Output keys.
 OUTPUT_PATH = "output_path"
+AGENT_MAJOR = "agent_major"
 
 # RSU keys.
 PLACEMENT = "placement"
@@ -45,6 +104,21 @@ LOG_OVERWRITE = "log_overwrite"
 DURATION = "duration"
 STEP_SIZE = "step_size"
 
+# Link keys, each holds the link range in metres.
+V2V = "v2v"
+V2R = "v2r"
+R2V = "r2v"
+R2R = "r2r"
+LINK_TYPES = [V2V, V2R, R2V, R2R]
+TRANSITIONS = "transitions"
+LINK_FORMAT = "format"
+DISTANCE_RESOLUTION = "distance_resolution"
+LINK_COMPRESSION = "compression"
+
+# Performance keys.
+REPORT_FILE = "report_file"
+TRACEMALLOC = "tracemalloc"
+
 
 def read_config_toml(config_toml: str) -> dict:
     """
@@ -54,19 +128,66 @@ def read_config_toml(config_toml: str) -> dict:
         return toml.load(f)
 
 
+def trace_files(traffic_settings: dict) -> list[str]:
+    """Get the trace files of a scenario, one or the shards of a sharded trace."""
+    traces = traffic_settings[TRACE_FILE]
+    return [traces] if isinstance(traces, str) else list(traces)
+
+
+def trace_stem(traffic_settings: dict) -> str:
+    """Get the name of the positions file converted from the trace files."""
+    traces = trace_files(traffic_settings)
+    stem = Path(traces[0]).stem
+    return stem if len(traces) == 1 else f"{stem}_merged"
+
+
+def expand_config_files(patterns: list[str]) -> list[Path]:
+    """Expand the config file paths and glob patterns, keeping the given order."""
+    config_files: list[Path] = []
+    for pattern in patterns:
+        if any(char in pattern for char in "*?["):
+            parts = Path(pattern).parts
+            first_glob = next(
+                index
+                for index, part in enumerate(parts)
+                if any(char in part for char in "*?[")
+            )
+            base = Path(*parts[:first_glob]) if first_glob > 0 else Path()
+            matches = sorted(base.glob(str(Path(*parts[first_glob:]))))
+        else:
+            matches = [Path(pattern)]
+        for config_file in matches:
+            if config_file not in config_files:
+                config_files.append(config_file)
+
+    if not config_files:
+        msg = f"No config files match {patterns}."
+        logger.error(msg)
+        raise ValueError(msg)
+    for config_file in config_files:
+        if not config_file.is_file():
+            msg = f"Config file {config_file} does not exist."
+            logger.error(msg)
+            raise ValueError(msg)
+    return config_files
+
+
 class Config:
-    def __init__(self, config_file: str) -> None:
+    def __init__(self, config_file: str, create_folders: bool = True) -> None:
         """Stores the configuration data.
 
         Parameters
         ----------
         config_file : str
             The path to the configuration file.
+        create_folders : bool
+            Whether to create the output folders, which validation skips.
         """
         self.config_file: str = config_file
         self.path: Path = Path(config_file).parent
         self.settings: dict = read_config_toml(config_file)
-        self._create_output_folders()
+        if create_folders:
+            self._create_output_folders()
 
     def _create_output_folders(self) -> None:
         """Create the output folders."""
@@ -82,6 +203,8 @@ class Config:
         output_path.mkdir(parents=True, exist_ok=True)
         Path.mkdir(output_path / ACTIVATIONS_FOLDER, exist_ok=True)
         Path.mkdir(output_path / POSITIONS_FOLDER, exist_ok=True)
+        if LINK_SETTINGS in self.settings:
+            Path.mkdir(output_path / LINKS_FOLDER, exist_ok=True)
 
     def get(self, key: str) -> dict:
         """Get the configuration data for a specific key.
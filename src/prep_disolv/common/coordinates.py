@@ -0,0 +1,173 @@
+from __future__ import annotations
+
+import logging
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from prep_disolv.common.columns import COORD_X, COORD_Y, VELOCITY
+from prep_disolv.common.config import (
+    BYTE_STREAM_SPLIT_ENCODING,
+    COLUMN_ENCODINGS,
+    COORDINATE_TYPES,
+    DELTA_ENCODING,
+    FIXED_COORDINATES,
+    FLOAT32_COORDINATES,
+    FLOAT64_COORDINATES,
+    PLAIN_ENCODING,
+)
+
+logger = logging.getLogger(__name__)
+
+# The parquet names of the column encodings.
+PARQUET_ENCODINGS = {
+    BYTE_STREAM_SPLIT_ENCODING: "BYTE_STREAM_SPLIT",
+    DELTA_ENCODING: "DELTA_BINARY_PACKED",
+}
+
+# The resolution of fixed-point coordinates in metres and metres per second.
+DEFAULT_RESOLUTION = 0.01
+QUANTIZED_COLUMNS = [COORD_X, COORD_Y, VELOCITY]
+COORDINATE_RESOLUTION = "coordinate_resolution"
+FIXED_POINT_LIMIT = np.iinfo(np.int32).max
+
+
+class CoordinateEncoding:
+    def __init__(
+        self,
+        coordinates: str = FLOAT64_COORDINATES,
+        resolution: float = DEFAULT_RESOLUTION,
+        encoding: str = PLAIN_ENCODING,
+    ) -> None:
+        """The storage type and the parquet encoding of the position columns.
+
+        Fixed-point columns hold the values divided by the resolution as 32-bit
+        integers, and the resolution is kept in the parquet metadata, so the
+        readers can decode the values.
+
+        Parameters
+        ----------
+        coordinates : str
+            Store the x, y and velocity columns as float64, float32 or fixed.
+        resolution : float
+            The resolution of the fixed-point columns.
+        encoding : str
+            The parquet encoding of the columns, plain, byte_stream_split or
+            delta. Delta encoding is only available for fixed-point columns.
+        """
+        if coordinates not in COORDINATE_TYPES:
+            msg = f"Unknown coordinates '{coordinates}', use one of {COORDINATE_TYPES}."
+            logger.error(msg)
+            raise ValueError(msg)
+        if encoding not in COLUMN_ENCODINGS:
+            msg = f"Unknown encoding '{encoding}', use one of {COLUMN_ENCODINGS}."
+            logger.error(msg)
+            raise ValueError(msg)
+        if encoding == DELTA_ENCODING and coordinates != FIXED_COORDINATES:
+            msg = "The delta encoding needs fixed-point coordinates."
+            logger.error(msg)
+            raise ValueError(msg)
+        if not resolution > 0:
+            msg = f"The coordinate resolution must be positive, not {resolution}."
+            logger.error(msg)
+            raise ValueError(msg)
+        self.coordinates = coordinates
+        self.resolution = resolution
+        self.encoding = encoding
+
+    @property
+    def field_type(self) -> pa.DataType:
+        """Get the Arrow type of the stored columns."""
+        if self.coordinates == FIXED_COORDINATES:
+            return pa.int32()
+        if self.coordinates == FLOAT32_COORDINATES:
+            return pa.float32()
+        return pa.float64()
+
+    def schema_metadata(self) -> dict[str, str] | None:
+        """Get the resolution of the fixed-point columns for the parquet metadata."""
+        if self.coordinates != FIXED_COORDINATES:
+            return None
+        return {COORDINATE_RESOLUTION: str(self.resolution)}
+
+    def encode(self, column: str, values: list[float]) -> pa.Array:
+        """Convert the values of a column to its stored type."""
+        if self.coordinates != FIXED_COORDINATES:
+            return pa.array(values, self.field_type)
+        scaled = np.rint(np.asarray(values, dtype=np.float64) / self.resolution)
+        if len(scaled) > 0 and np.abs(scaled).max() > FIXED_POINT_LIMIT:
+            msg = (
+                f"The {column} values do not fit into fixed-point integers at the "
+                f"resolution {self.resolution}, use a coarser resolution."
+            )
+            logger.error(msg)
+            raise ValueError(msg)
+        return pa.array(scaled.astype(np.int32), pa.int32())
+
+    def writer_options(self, schema: pa.Schema) -> dict:
+        """Get the parquet writer options of the column encoding."""
+        if self.encoding == PLAIN_ENCODING:
+            return {}
+        # Columns with an explicit encoding cannot be dictionary encoded.
+        return {
+            "use_dictionary": [
+                name for name in schema.names if name not in QUANTIZED_COLUMNS
+            ],
+            "column_encoding": dict.fromkeys(
+                QUANTIZED_COLUMNS, PARQUET_ENCODINGS[self.encoding]
+            ),
+        }
+
+
+def read_resolution(schema: pa.Schema) -> float | None:
+    """Get the resolution of the fixed-point columns of a positions schema."""
+    resolution = (schema.metadata or {}).get(COORDINATE_RESOLUTION.encode())
+    return None if resolution is None else float(resolution)
+
+
+def decode_positions(
+    positions: pa.Table | pa.RecordBatch, resolution: float | None = None
+) -> pa.Table | pa.RecordBatch:
+    """Convert the stored x, y and velocity columns back to float64.
+
+    Parameters
+    ----------
+    positions : pa.Table | pa.RecordBatch
+        The positions as read, with any subset of the columns.
+    resolution : float | None
+        The resolution of the fixed-point columns, read from the metadata of
+        the positions when not given.
+
+    Returns
+    -------
+    pa.Table | pa.RecordBatch
+        The positions with float64 coordinates and velocity.
+    """
+    if resolution is None:
+        resolution = read_resolution(positions.schema)
+    for column in QUANTIZED_COLUMNS:
+        index = positions.schema.get_field_index(column)
+        if index < 0 or positions.schema.field(index).type == pa.float64():
+            continue
+        values = pc.cast(positions.column(index), pa.float64())
+        if resolution is not None and pa.types.is_integer(
+            positions.schema.field(index).type
+        ):
+            values = pc.multiply(values, resolution)
+        positions = positions.set_column(index, pa.field(column, pa.float64()), values)
+    return positions
+
+
+def decoded_schema(schema: pa.Schema) -> pa.Schema:
+    """Get the schema of positions once their x, y and velocity are decoded."""
+    for column in QUANTIZED_COLUMNS:
+        index = schema.get_field_index(column)
+        if index >= 0:
+            schema = schema.set(index, pa.field(column, pa.float64()))
+    metadata = {
+        key: value
+        for key, value in (schema.metadata or {}).items()
+        if key != COORDINATE_RESOLUTION.encode()
+    }
+    return schema.with_metadata(metadata)
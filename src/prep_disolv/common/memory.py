@@ -0,0 +1,178 @@
+from __future__ import annotations
+
+import logging
+import re
+
+from prep_disolv.common.config import (
+    EXECUTION_SETTINGS,
+    MEMORY_LIMIT,
+    WORKERS,
+    Config,
+)
+from prep_disolv.common.metrics import current_rss_bytes, peak_rss_bytes
+
+logger = logging.getLogger(__name__)
+
+MEMORY_UNITS = {
+    "": 1,
+    "b": 1,
+    "kb": 10**3,
+    "mb": 10**6,
+    "gb": 10**9,
+    "kib": 2**10,
+    "mib": 2**20,
+    "gib": 2**30,
+}
+
+# Below this share of the limit left to the buffers, the batches get very small.
+MIN_BUFFER_SHARE = 0.1
+# The share of the bytes per row estimate that is kept after every batch with
+# narrower rows, so the batches grow again when the rows get smaller.
+ROW_BYTES_DECAY = 0.9
+
+
+def memory_limit_bytes(memory_limit: object) -> int | None:
+    """Get the bytes of a memory limit such as 4096, "512MB" or "2GiB".
+
+    Returns None if the value is not a memory size.
+    """
+    if isinstance(memory_limit, bool) or not isinstance(memory_limit, int | str):
+        return None
+    if isinstance(memory_limit, int):
+        return memory_limit
+    match = re.fullmatch(r"\s*(\d+(?:\.\d+)?)\s*([a-zA-Z]*)\s*", memory_limit)
+    if match is None or match.group(2).lower() not in MEMORY_UNITS:
+        return None
+    return int(float(match.group(1)) * MEMORY_UNITS[match.group(2).lower()])
+
+
+def parse_memory_limit(memory_limit: object) -> int:
+    """Parse a memory limit to bytes."""
+    limit = memory_limit_bytes(memory_limit)
+    if limit is None or limit <= 0:
+        msg = f"Could not read the memory limit {memory_limit}."
+        logger.error(msg)
+        raise ValueError(msg)
+    return limit
+
+
+class MemoryBudget:
+    def __init__(self, limit: int, shares: int = 1) -> None:
+        """The memory that the batch buffers of a stage may use.
+
+        The memory the process already holds is taken from the limit first, and
+        the rest is split between the processes that run at the same time.
+
+        Parameters
+        ----------
+        limit : int
+            The memory limit of the run in bytes.
+        shares : int
+            The number of processes that share the limit.
+
+        Raises
+        ------
+        ValueError
+            If the process already holds the whole limit.
+        """
+        self.limit = limit
+        self.shares = max(shares, 1)
+        used = current_rss_bytes() or peak_rss_bytes() or 0
+        available = limit - used
+        if available <= 0:
+            msg = (
+                f"The process already uses {used} bytes, which leaves nothing of "
+                f"the memory limit of {limit} bytes to the batches."
+            )
+            logger.error(msg)
+            raise ValueError(msg)
+        if available < limit * MIN_BUFFER_SHARE:
+            logger.warning(
+                "Only %d of the %d bytes of the memory limit are left to the "
+                "batches, which makes them small",
+                available,
+                limit,
+            )
+        self.buffer_bytes = available // self.shares
+
+    def share(self, shares: int) -> MemoryBudget:
+        """Split this budget between worker processes."""
+        return MemoryBudget(self.limit, self.shares * shares)
+
+    def __repr__(self) -> str:
+        return f"MemoryBudget({self.limit}, {self.shares}, {self.buffer_bytes})"
+
+
+def memory_budget(config: Config) -> MemoryBudget | None:
+    """Get the memory budget of a stage, None if no memory limit is configured.
+
+    The stages that run at the same time on the execution workers share the limit.
+    """
+    execution_settings = config.get(EXECUTION_SETTINGS) or {}
+    memory_limit = execution_settings.get(MEMORY_LIMIT)
+    if memory_limit is None:
+        return None
+    return MemoryBudget(
+        parse_memory_limit(memory_limit), int(execution_settings.get(WORKERS, 1))
+    )
+
+
+class BatchSizer:
+    def __init__(
+        self,
+        budget: MemoryBudget | None,
+        default_rows: int,
+        row_bytes: int,
+        min_rows: int = 1000,
+    ) -> None:
+        """Sizes the batches of a stage to fit its memory budget.
+
+        The size starts from an estimate of the bytes per row. Wider rows
+        raise the estimate at once and shrink the next batch, narrower rows
+        lower it a little with every batch, so the batches grow again while
+        they fit. Without a budget, the batches keep the default size. A budget
+        too small for the smallest batch size wins over it, with a warning, so
+        the batches never exceed the budget.
+
+        Parameters
+        ----------
+        budget : MemoryBudget | None
+            The memory budget of the stage.
+        default_rows : int
+            The batch size without a budget.
+        row_bytes : int
+            The estimated bytes a buffered row holds before any is observed.
+        min_rows : int
+            The smallest batch size that keeps the row groups useful, as long
+            as it fits the budget.
+        """
+        self.budget = budget
+        self.default_rows = default_rows
+        self.row_bytes = row_bytes
+        self.min_rows = min_rows
+        self.warned = False
+
+    @property
+    def rows(self) -> int:
+        """Get the number of rows of the next batch."""
+        if self.budget is None:
+            return self.default_rows
+        rows = self.budget.buffer_bytes // max(self.row_bytes, 1)
+        if rows < self.min_rows and not self.warned:
+            logger.warning(
+                "Batches of %d rows of %d bytes fit the %d bytes of the memory "
+                "budget, which makes small row groups",
+                rows,
+                self.row_bytes,
+                self.budget.buffer_bytes,
+            )
+            self.warned = True
+        return max(rows, 1)
+
+    def observe(self, row_count: int, byte_count: int) -> None:
+        """Update the bytes per row from a batch of the given size."""
+        if row_count <= 0:
+            return
+        self.row_bytes = max(
+            -(-byte_count // row_count), int(self.row_bytes * ROW_BYTES_DECAY)
+        )
@@ -0,0 +1,249 @@
+from __future__ import annotations
+
+import json
+import logging
+import sys
+import time
+import tracemalloc
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any
+
+try:
+    import resource
+except ImportError:  # pragma: no cover - not available on Windows
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+TOP_ALLOCATIONS = 5
+# Writing 5 to this file resets the peak resident set size of the process.
+CLEAR_REFS_FILE = Path("/proc/self/clear_refs")
+STATM_FILE = Path("/proc/self/statm")
+# The VmHWM line is the peak resident set size since the last reset. Unlike the
+# ru_maxrss of getrusage, it does not include the peaks of exited threads.
+STATUS_FILE = Path("/proc/self/status")
+HIGH_WATER_MARK = "VmHWM:"
+# The scope of a reported peak, the stage when the peak can be reset.
+STAGE_PEAK = "stage"
+PROCESS_PEAK = "process"
+
+
+def peak_rss_bytes() -> int | None:
+    """Get the peak resident set size of this process in bytes."""
+    if resource is None:
+        return None
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS reports bytes.
+    return peak_rss if sys.platform == "darwin" else peak_rss * 1024
+
+
+def stage_peak_rss_bytes() -> int | None:
+    """Get the peak resident set size since the last reset in bytes, only on Linux."""
+    try:
+        status = STATUS_FILE.read_text()
+    except OSError:
+        return None
+    for line in status.splitlines():
+        if line.startswith(HIGH_WATER_MARK):
+            # The status file reports kilobytes.
+            return int(line.split()[1]) * 1024
+    return None
+
+
+def reset_peak_rss() -> bool:
+    """Reset the peak resident set size to the current one, only on Linux."""
+    try:
+        CLEAR_REFS_FILE.write_text("5")
+    except OSError:
+        return False
+    return True
+
+
+def current_rss_bytes() -> int | None:
+    """Get the current resident set size of this process in bytes, only on Linux."""
+    try:
+        resident_pages = int(STATM_FILE.read_text().split()[1])
+    except (OSError, IndexError, ValueError):
+        return None
+    return resident_pages * resource.getpagesize()
+
+
+def _children_cpu_time() -> float:
+    """Get the CPU time of the finished child processes."""
+    if resource is None:
+        return 0.0
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+class SectionTimer:
+    def __init__(self) -> None:
+        """Adds up the wall time spent in named sections of a stage."""
+        self.sections: dict[str, float] = {}
+
+    def add(self, section: str, seconds: float) -> None:
+        """Add the seconds to a section."""
+        self.sections[section] = self.sections.get(section, 0.0) + seconds
+
+    @contextmanager
+    def time(self, section: str) -> Iterator[None]:
+        """Time a block of code as part of a section."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(section, time.perf_counter() - start)
+
+
+class StageMetrics:
+    def __init__(self, name: str) -> None:
+        """The performance metrics of one stage."""
+        self.name = name
+        self.wall_time = 0.0
+        self.cpu_time = 0.0
+        self.rows = 0
+        self.bytes = 0
+        self.start_rss: int | None = None
+        self.peak_rss: int | None = None
+        self.peak_rss_scope = PROCESS_PEAK
+        self.traced_peak: int | None = None
+        self.top_allocations: list[str] = []
+        self.sections: dict[str, float] = {}
+
+    @property
+    def rows_per_second(self) -> float:
+        """Get the throughput of the stage."""
+        return self.rows / self.wall_time if self.wall_time > 0 else 0.0
+
+    def to_dict(self) -> dict[str, Any]:
+        """Convert the metrics to a JSON serializable dictionary."""
+        return {
+            "stage": self.name,
+            "wall_time": round(self.wall_time, 6),
+            "cpu_time": round(self.cpu_time, 6),
+            "rows": self.rows,
+            "bytes": self.bytes,
+            "rows_per_second": round(self.rows_per_second, 3),
+            "start_rss": self.start_rss,
+            "peak_rss": self.peak_rss,
+            "peak_rss_scope": self.peak_rss_scope,
+            "traced_peak": self.traced_peak,
+            "top_allocations": self.top_allocations,
+            "sections": {name: round(sec, 6) for name, sec in self.sections.items()},
+        }
+
+    def __repr__(self) -> str:
+        return (
+            f"StageMetrics({self.name}, {self.wall_time:.3f} s, "
+            f"{self.rows} rows, {self.rows_per_second:.1f} rows/s)"
+        )
+
+
+def run_measured(
+    name: str,
+    func: Callable[..., Any],
+    args: tuple,
+    trace_memory: bool = False,
+    count_children: bool = False,
+) -> tuple[Any, StageMetrics]:
+    """Run a stage function and measure it in the process that runs it.
+
+    Where the peak resident set size can be reset, the reported peak is the one
+    of the stage, otherwise it is the peak of the process so far and includes
+    the earlier stages.
+
+    Parameters
+    ----------
+    name : str
+        The name of the stage.
+    func : Callable[..., Any]
+        The stage function.
+    args : tuple
+        The arguments of the stage function.
+    trace_memory : bool
+        Whether to trace the Python allocations with tracemalloc, which is slow.
+    count_children : bool
+        Whether the CPU time of the child processes that finish during the stage
+        is counted, for stages that run their own process pool.
+
+    Returns
+    -------
+    tuple[Any, StageMetrics]
+        The result of the stage function and its metrics.
+    """
+    metrics = StageMetrics(name)
+    if reset_peak_rss() and stage_peak_rss_bytes() is not None:
+        metrics.peak_rss_scope = STAGE_PEAK
+    metrics.start_rss = current_rss_bytes()
+    if trace_memory:
+        tracemalloc.start()
+    wall_start = time.perf_counter()
+    children_start = _children_cpu_time() if count_children else 0.0
+    cpu_start = time.process_time()
+    try:
+        result = func(*args)
+    finally:
+        metrics.wall_time = time.perf_counter() - wall_start
+        metrics.cpu_time = time.process_time() - cpu_start
+        if count_children:
+            metrics.cpu_time += _children_cpu_time() - children_start
+        metrics.peak_rss = (
+            stage_peak_rss_bytes()
+            if metrics.peak_rss_scope == STAGE_PEAK
+            else peak_rss_bytes()
+        )
+        if trace_memory:
+            metrics.traced_peak = tracemalloc.get_traced_memory()[1]
+            snapshot = tracemalloc.take_snapshot()
+            metrics.top_allocations = [
+                str(stat) for stat in snapshot.statistics("lineno")[:TOP_ALLOCATIONS]
+            ]
+            tracemalloc.stop()
+    return result, metrics
+
+
+def file_size(path: Path | None) -> int:
+    """Get the size of a file or of all files in a folder."""
+    if path is None or not Path(path).exists():
+        return 0
+    path = Path(path)
+    if path.is_dir():
+        return sum(part.stat().st_size for part in path.rglob("*") if part.is_file())
+    return path.stat().st_size
+
+
+class PerformanceReport:
+    def __init__(self) -> None:
+        """Collects the metrics of all stages of a run."""
+        self.stages: list[StageMetrics] = []
+
+    def add(self, metrics: StageMetrics) -> None:
+        """Add the metrics of a finished stage."""
+        self.stages.append(metrics)
+
+    def log(self) -> None:
+        """Log the metrics of every stage."""
+        for metrics in self.stages:
+            logger.info(
+                "Stage %s: wall %.3f s, cpu %.3f s, %d rows, %d bytes, "
+                "%.1f rows/s, %s peak rss %s bytes",
+                metrics.name,
+                metrics.wall_time,
+                metrics.cpu_time,
+                metrics.rows,
+                metrics.bytes,
+                metrics.rows_per_second,
+                metrics.peak_rss_scope,
+                metrics.peak_rss,
+            )
+            for section, seconds in metrics.sections.items():
+                logger.info(
+                    "Stage %s: section %s %.3f s", metrics.name, section, seconds
+                )
+
+    def write(self, report_file: Path) -> None:
+        """Write the metrics to a JSON file."""
+        with Path.open(report_file, "w") as f:
+            json.dump({"stages": [m.to_dict() for m in self.stages]}, f, indent=2)
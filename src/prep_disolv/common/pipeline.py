@@ -0,0 +1,106 @@
+from __future__ import annotations
+
+import logging
+import os
+import queue
+import threading
+from collections.abc import Callable
+from typing import Any
+
+logger = logging.getLogger(__name__)
+
+# The batches waiting for the writer thread.
+DEFAULT_QUEUE_SIZE = 2
+# Marks the end of the batches in the queue.
+_DONE = object()
+
+
+def default_queue_size() -> int:
+    """Get the queue size of a writer thread, which only pays off with a spare CPU."""
+    # The CPUs this process may run on, which macOS and Windows do not tell.
+    sched_getaffinity = getattr(os, "sched_getaffinity", None)
+    if sched_getaffinity is not None:
+        cpu_count = len(sched_getaffinity(0))
+    else:
+        cpu_count = os.cpu_count() or 1
+    return DEFAULT_QUEUE_SIZE if cpu_count > 1 else 0
+
+
+def batches_in_memory(queue_size: int) -> int:
+    """Get the most batches a writer thread and its producer hold at once."""
+    # The queued batches, the one being written and the one being filled.
+    return queue_size + 2 if queue_size > 0 else 1
+
+
+class WriterThread:
+    def __init__(
+        self, write: Callable[[Any], None], queue_size: int = DEFAULT_QUEUE_SIZE
+    ) -> None:
+        """Writes the batches of a producer on a thread behind a bounded queue.
+
+        The producer waits while the queue is full, so at most the queued
+        batches, the batch being written and the batch being filled are in
+        memory. Compression and disk writes release the GIL, so they overlap
+        with the producer. Without a queue, every batch is written right away on
+        the calling thread.
+
+        Parameters
+        ----------
+        write : Callable[[Any], None]
+            Writes one batch.
+        queue_size : int
+            The number of batches that may wait for the writer, 0 to write on
+            the calling thread.
+        """
+        self.write = write
+        self.queue_size = queue_size
+        self.error: Exception | None = None
+        self.queue: queue.Queue | None = None
+        self.thread: threading.Thread | None = None
+        if queue_size > 0:
+            self.queue = queue.Queue(maxsize=queue_size)
+            self.thread = threading.Thread(target=self._run, name="writer", daemon=True)
+            self.thread.start()
+
+    def put(self, batch: Any) -> None:
+        """Hand a batch to the writer, waiting while the queue is full."""
+        if self.thread is None:
+            self.write(batch)
+            return
+        self._raise_error()
+        self.queue.put(batch)
+
+    def close(self, raise_error: bool = True) -> None:
+        """Wait until the queued batches are written.
+
+        A producer that fails itself closes the writer without raising its
+        error, so the error of the producer is the one that is raised.
+        """
+        if self.thread is None:
+            return
+        self.queue.put(_DONE)
+        self.thread.join()
+        self.thread = None
+        if raise_error:
+            self._raise_error()
+
+    def _run(self) -> None:
+        """Write the queued batches until the end marker."""
+        while True:
+            batch = self.queue.get()
+            if batch is _DONE:
+                return
+            # After a failed write the queue is only drained, so the producer
+            # never waits on a full queue.
+            if self.error is not None:
+                continue
+            try:
+                self.write(batch)
+            except Exception as error:
+                logger.exception("The writer thread failed")
+                self.error = error
+
+    def _raise_error(self) -> None:
+        """Raise the error of a failed write on the calling thread."""
+        if self.error is not None:
+            raise self.error
@@ -0,0 +1,205 @@
+from __future__ import annotations
+
+from collections.abc import Iterable, Iterator
+from itertools import pairwise
+from pathlib import Path
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+from prep_disolv.common.columns import TIME_STEP
+
+
+def iter_time_step_chunks(batches: Iterable[pa.RecordBatch]) -> Iterator[pa.Table]:
+    """Regroup record batches that are sorted by time step into whole time steps.
+
+    A time step may be split across several record batches, so the rows of the
+    last step in every batch are carried over until the next step starts. Every
+    yielded table holds one or more complete time steps.
+
+    Parameters
+    ----------
+    batches : Iterable[pa.RecordBatch]
+        The record batches, sorted by the time step column.
+
+    Yields
+    ------
+    pa.Table
+        The rows of one or more complete time steps.
+    """
+    pending: pa.Table | None = None
+    for batch in batches:
+        if batch.num_rows == 0:
+            continue
+        table = pa.Table.from_batches([batch])
+        if pending is not None:
+            table = pa.concat_tables([pending, table])
+
+        time_steps = table[TIME_STEP]
+        last_step = time_steps[table.num_rows - 1].as_py()
+        complete_rows = table.num_rows - pc.sum(pc.equal(time_steps, last_step)).as_py()
+        if complete_rows > 0:
+            yield table.slice(0, complete_rows)
+        pending = table.slice(complete_rows)
+
+    if pending is not None and pending.num_rows > 0:
+        yield pending
+
+
+def iter_time_steps(
+    batches: Iterable[pa.RecordBatch],
+) -> Iterator[tuple[int, pa.Table]]:
+    """Regroup record batches that are sorted by time step into one table per step.
+
+    Parameters
+    ----------
+    batches : Iterable[pa.RecordBatch]
+        The record batches, sorted by the time step column.
+
+    Yields
+    ------
+    tuple[int, pa.Table]
+        The time step and the rows that belong to it.
+    """
+    for chunk in iter_time_step_chunks(batches):
+        time_steps = chunk[TIME_STEP].to_numpy()
+        step_starts = np.flatnonzero(np.diff(time_steps)) + 1
+        step_bounds = np.concatenate(([0], step_starts, [len(time_steps)]))
+        for start, end in pairwise(step_bounds):
+            yield int(time_steps[start]), chunk.slice(start, end - start)
+
+
+def iter_dataset_batches(
+    dataset_path: Path, columns: list[str] | None = None
+) -> Iterator[pa.RecordBatch]:
+    """Read the part files of a dataset folder, or a single file, in order."""
+    part_files = (
+        sorted(dataset_path.glob("*.parquet"))
+        if dataset_path.is_dir()
+        else [dataset_path]
+    )
+    for part_file in part_files:
+        # Pre-buffering would keep every row group read so far in memory.
+        parquet_file = pq.ParquetFile(part_file, pre_buffer=False)
+        yield from parquet_file.iter_batches(columns=columns)
+
+
+class TimePartition:
+    def __init__(
+        self,
+        index: int,
+        row_groups: list[int],
+        start_time: int | None,
+        end_time: int | None,
+    ) -> None:
+        """A contiguous range of time steps in a parquet file sorted by time step.
+
+        Parameters
+        ----------
+        index : int
+            The position of the partition in time order.
+        row_groups : list[int]
+            The row groups that may contain rows of the partition.
+        start_time : int | None
+            The first time step of the partition, None if unbounded.
+        end_time : int | None
+            The time step after the partition (exclusive), None if unbounded.
+        """
+        self.index = index
+        self.row_groups = row_groups
+        self.start_time = start_time
+        self.end_time = end_time
+
+    def __repr__(self) -> str:
+        return (
+            f"TimePartition({self.index}, {self.row_groups}, "
+            f"{self.start_time}, {self.end_time})"
+        )
+
+    def iter_batches(
+        self, parquet_file: pq.ParquetFile, columns: list[str]
+    ) -> Iterator[pa.RecordBatch]:
+        """Read only the row groups of the partition and drop rows outside it."""
+        for batch in parquet_file.iter_batches(
+            row_groups=self.row_groups, columns=columns
+        ):
+            time_steps = batch.column(TIME_STEP)
+            mask = None
+            if self.start_time is not None:
+                mask = pc.greater_equal(time_steps, self.start_time)
+            if self.end_time is not None:
+                end_mask = pc.less(time_steps, self.end_time)
+                mask = end_mask if mask is None else pc.and_(mask, end_mask)
+            yield batch if mask is None else batch.filter(mask)
+
+
+def _time_step_statistics(
+    parquet_file: pq.ParquetFile,
+) -> list[tuple[int, int]] | None:
+    """Get the minimum and maximum time step of every row group."""
+    metadata = parquet_file.metadata
+    column_index = parquet_file.schema_arrow.get_field_index(TIME_STEP)
+    ranges = []
+    for row_group in range(metadata.num_row_groups):
+        statistics = metadata.row_group(row_group).column(column_index).statistics
+        if statistics is None or not statistics.has_min_max:
+            return None
+        ranges.append((statistics.min, statistics.max))
+    return ranges
+
+
+def plan_time_partitions(
+    parquet_file: pq.ParquetFile, partition_count: int
+) -> list[TimePartition]:
+    """Split a parquet file sorted by time step into contiguous time ranges.
+
+    The split uses the row group statistics, so no data is read. Row groups are
+    balanced by their row counts and every time step belongs to exactly one
+    partition, even when it spans several row groups.
+
+    Parameters
+    ----------
+    parquet_file : pq.ParquetFile
+        The parquet file sorted by time step.
+    partition_count : int
+        The requested number of partitions.
+
+    Returns
+    -------
+    list[TimePartition]
+        The partitions in time order, at most partition_count of them.
+    """
+    metadata = parquet_file.metadata
+    all_row_groups = list(range(metadata.num_row_groups))
+    time_ranges = _time_step_statistics(parquet_file)
+    if partition_count <= 1 or time_ranges is None or len(all_row_groups) <= 1:
+        return [TimePartition(0, all_row_groups, None, None)]
+
+    row_counts = np.array(
+        [metadata.row_group(row_group).num_rows for row_group in all_row_groups]
+    )
+    first_rows = np.cumsum(row_counts) - row_counts
+    targets = np.arange(1, partition_count) * (metadata.num_rows / partition_count)
+    split_groups = np.unique(np.searchsorted(first_rows, targets))
+    first_time = time_ranges[0][0]
+    start_times = sorted(
+        {
+            time_ranges[group][0]
+            for group in split_groups
+            if 0 < group < len(all_row_groups) and time_ranges[group][0] > first_time
+        }
+    )
+
+    bounds = [None, *start_times, None]
+    partitions = []
+    for index, (start, end) in enumerate(pairwise(bounds)):
+        row_groups = [
+            group
+            for group in all_row_groups
+            if (start is None or time_ranges[group][1] >= start)
+            and (end is None or time_ranges[group][0] < end)
+        ]
+        partitions.append(TimePartition(index, row_groups, start, end))
+    return partitions
@@ -1,7 +1,10 @@
 from __future__ import annotations
 
 import logging
+import os
+import shutil
 import xml.etree.ElementTree as Et
+from functools import lru_cache
 from pathlib import Path
 
 BOUNDARY = "convBoundary"
@@ -10,6 +13,8 @@ LOCATION = "location"
 PROJECTION = "projParameter"
 
 
+# The network lookups are cached, as several stages read the same network.
+@lru_cache(maxsize=16)
 def get_offsets(sumo_net_file: Path) -> (float, float):
     """Get the offsets from the sumo net file."""
     sumo_iter = Et.iterparse(str(sumo_net_file), events=("start", "end"))
@@ -24,6 +29,7 @@ def get_offsets(sumo_net_file: Path) -> (float, float):
     raise ValueError(msg)
 
 
+@lru_cache(maxsize=16)
 def get_projection(sumo_net_file: Path) -> (float, float):
     """Get the offsets from the sumo net file."""
     sumo_iter = Et.iterparse(str(sumo_net_file), events=("start", "end"))
@@ -35,6 +41,7 @@ def get_projection(sumo_net_file: Path) -> (float, float):
     raise ValueError(msg)
 
 
+@lru_cache(maxsize=16)
 def get_center(sumo_net_file: Path) -> (float, float):
     """Get the center of the sumo net file."""
     offsets = get_offsets(sumo_net_file)
@@ -57,3 +64,14 @@ def get_center(sumo_net_file: Path) -> (float, float):
     msg = "Could not find network center in sumo net file."
     logging.error(msg)
     raise ValueError(msg)
+
+
+def link_or_copy(source: Path, target: Path) -> None:
+    """Hard link a file to the target, or copy it if linking is not possible."""
+    if Path(source).resolve() == Path(target).resolve():
+        return
+    target.unlink(missing_ok=True)
+    try:
+        os.link(source, target)
+    except OSError:
+        shutil.copy2(source, target)
@@ -0,0 +1,203 @@
+from __future__ import annotations
+
+from prep_disolv.common.config import (
+    ARROW_ENGINE,
+    COLUMN_ENCODING,
+    COLUMN_ENCODINGS,
+    CONTROLLER_SETTINGS,
+    COORDINATE_TYPES,
+    COORDINATES,
+    DELTA_ENCODING,
+    DURATION,
+    EDGE_SETTINGS,
+    EDGE_WINDOW,
+    ENGINE,
+    EXECUTION_SETTINGS,
+    FEATURE_INPUT,
+    FEATURE_SETTINGS,
+    FIXED_COORDINATES,
+    FOLLOW,
+    FOLLOW_TIMEOUT,
+    GEOMETRY_FORMAT,
+    GEOMETRY_SETTINGS,
+    ID_INIT,
+    ID_MAPPING,
+    LINK_FORMAT,
+    LINK_SETTINGS,
+    LINK_TYPES,
+    MEMORY_LIMIT,
+    MOSAIC_SETTINGS,
+    NETWORK_FILE,
+    NS3_SETTINGS,
+    OUTPUT_PATH,
+    OUTPUT_SETTINGS,
+    PLACEMENT,
+    POLARS_ENGINE,
+    QUEUE_SIZE,
+    RESOLUTION,
+    RSU_SETTINGS,
+    SIMULATION_SETTINGS,
+    SIMULATOR,
+    START_TIME,
+    STEP_SIZE,
+    TRACE_FILE,
+    TRAFFIC_SETTINGS,
+    VEHICLE_SETTINGS,
+    WORKERS,
+    Config,
+)
+from prep_disolv.common.memory import memory_limit_bytes
+
+# The keys every scenario needs.
+REQUIRED_KEYS = {
+    SIMULATION_SETTINGS: [DURATION, STEP_SIZE],
+    TRAFFIC_SETTINGS: [NETWORK_FILE, TRACE_FILE],
+    VEHICLE_SETTINGS: [SIMULATOR, ID_INIT],
+    OUTPUT_SETTINGS: [OUTPUT_PATH],
+}
+
+# The keys needed once an optional section is given.
+SECTION_KEYS = {
+    RSU_SETTINGS: [PLACEMENT, START_TIME, ID_INIT],
+    CONTROLLER_SETTINGS: [PLACEMENT, START_TIME, ID_INIT],
+    NS3_SETTINGS: [OUTPUT_PATH],
+    GEOMETRY_SETTINGS: [OUTPUT_PATH],
+    MOSAIC_SETTINGS: [OUTPUT_PATH],
+    FEATURE_SETTINGS: [FEATURE_INPUT, OUTPUT_PATH],
+    EDGE_SETTINGS: [OUTPUT_PATH],
+}
+
+# The supported values of the option keys.
+OPTION_VALUES = {
+    (VEHICLE_SETTINGS, SIMULATOR): ["sumo"],
+    (VEHICLE_SETTINGS, COORDINATES): COORDINATE_TYPES,
+    (VEHICLE_SETTINGS, COLUMN_ENCODING): COLUMN_ENCODINGS,
+    (RSU_SETTINGS, PLACEMENT): ["junction", "given"],
+    (CONTROLLER_SETTINGS, PLACEMENT): ["center"],
+    (LINK_SETTINGS, LINK_FORMAT): ["long", "csr"],
+    (EXECUTION_SETTINGS, ENGINE): [ARROW_ENGINE, POLARS_ENGINE],
+    (GEOMETRY_SETTINGS, GEOMETRY_FORMAT): ["geoparquet", "gpkg"],
+    (FEATURE_SETTINGS, GEOMETRY_FORMAT): ["geoparquet", "gpkg"],
+}
+
+# The input files, relative to the config file.
+INPUT_FILES = [
+    (TRAFFIC_SETTINGS, NETWORK_FILE),
+    (TRAFFIC_SETTINGS, TRACE_FILE),
+    (TRAFFIC_SETTINGS, ID_MAPPING),
+    (FEATURE_SETTINGS, FEATURE_INPUT),
+]
+
+
+def validate_config(config: Config) -> list[str]:
+    """Check the config without reading the inputs or preparing anything.
+
+    Parameters
+    ----------
+    config : Config
+        The configuration to check.
+
+    Returns
+    -------
+    list[str]
+        The problems found in the config, empty if it is valid.
+    """
+    errors = []
+    for section, keys in REQUIRED_KEYS.items():
+        if config.get(section) is None:
+            errors.append(f"Missing section [{section}].")
+            continue
+        errors.extend(_missing_keys(config, section, keys))
+
+    for section, keys in SECTION_KEYS.items():
+        if config.get(section) is not None:
+            errors.extend(_missing_keys(config, section, keys))
+
+    for (section, key), values in OPTION_VALUES.items():
+        value = (config.get(section) or {}).get(key)
+        if value is not None and value not in values:
+            errors.append(f"Unknown {section}.{key} '{value}', use one of {values}.")
+
+    traffic_settings = config.get(TRAFFIC_SETTINGS) or {}
+    follow = traffic_settings.get(FOLLOW, False)
+    for section, key in INPUT_FILES:
+        # A followed trace is still being written and may not exist yet.
+        if follow and (section, key) == (TRAFFIC_SETTINGS, TRACE_FILE):
+            continue
+        file_names = (config.get(section) or {}).get(key)
+        # The trace may list the FCD files of several shards.
+        if isinstance(file_names, str):
+            file_names = [file_names]
+        if file_names is not None and len(file_names) == 0:
+            errors.append(f"{section}.{key} lists no input files.")
+        for file_name in file_names or []:
+            if not (config.path / file_name).is_file():
+                errors.append(
+                    f"Input file {section}.{key} '{file_name}' does not exist."
+                )
+
+    link_settings = config.get(LINK_SETTINGS) or {}
+    for link_type in LINK_TYPES:
+        link_range = link_settings.get(link_type)
+        if link_range is not None and not _is_positive(link_range):
+            errors.append(f"The {link_type} link range must be a positive number.")
+
+    follow_timeout = traffic_settings.get(FOLLOW_TIMEOUT)
+    if follow_timeout is not None and not _is_positive(follow_timeout):
+        errors.append(
+            f"{TRAFFIC_SETTINGS}.{FOLLOW_TIMEOUT} must be a positive number of seconds."
+        )
+
+    vehicle_settings = config.get(VEHICLE_SETTINGS) or {}
+    resolution = vehicle_settings.get(RESOLUTION)
+    if resolution is not None and not _is_positive(resolution):
+        errors.append(f"{VEHICLE_SETTINGS}.{RESOLUTION} must be a positive number.")
+    queue_size = vehicle_settings.get(QUEUE_SIZE)
+    if queue_size is not None and not (
+        isinstance(queue_size, int)
+        and not isinstance(queue_size, bool)
+        and queue_size >= 0
+    ):
+        errors.append(
+            f"{VEHICLE_SETTINGS}.{QUEUE_SIZE} must be a non-negative integer."
+        )
+    if vehicle_settings.get(COLUMN_ENCODING) == DELTA_ENCODING and (
+        vehicle_settings.get(COORDINATES) != FIXED_COORDINATES
+    ):
+        errors.append(
+            f"{VEHICLE_SETTINGS}.{COLUMN_ENCODING} '{DELTA_ENCODING}' needs "
+            f"{VEHICLE_SETTINGS}.{COORDINATES} '{FIXED_COORDINATES}'."
+        )
+
+    for section in [EXECUTION_SETTINGS, LINK_SETTINGS, GEOMETRY_SETTINGS]:
+        workers = (config.get(section) or {}).get(WORKERS)
+        if workers is not None and not (isinstance(workers, int) and workers > 0):
+            errors.append(f"{section}.{WORKERS} must be a positive integer.")
+
+    edge_window = (config.get(EDGE_SETTINGS) or {}).get(EDGE_WINDOW)
+    if edge_window is not None and not (
+        isinstance(edge_window, int) and edge_window > 0
+    ):
+        errors.append(f"{EDGE_SETTINGS}.{EDGE_WINDOW} must be a positive integer.")
+
+    memory_limit = (config.get(EXECUTION_SETTINGS) or {}).get(MEMORY_LIMIT)
+    if memory_limit is not None and not (memory_limit_bytes(memory_limit) or 0) > 0:
+        errors.append(
+            f"{EXECUTION_SETTINGS}.{MEMORY_LIMIT} must be a size such as '2GiB'."
+        )
+
+    return errors
+
+
+def _missing_keys(config: Config, section: str, keys: list[str]) -> list[str]:
+    """Get the errors of the keys missing from a section."""
+    return [
+        f"Missing key '{key}' in [{section}]."
+        for key in keys
+        if key not in config.get(section)
+    ]
+
+
+def _is_positive(value: object) -> bool:
+    """Check if a config value is a positive number."""
+    return isinstance(value, int | float) and not isinstance(value, bool) and value > 0
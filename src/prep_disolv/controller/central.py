@@ -33,12 +33,21 @@ class CentralControllerPlacer:
         self.end_time: int = config.get(SIMULATION_SETTINGS)[DURATION]
         self.sumo_net: Path = self.config_path / config.get(TRAFFIC_SETTINGS)[NETWORK_FILE]
         self.controller_id_init = controller_id_init
+        self.center: tuple[float, float] | None = None
+        self.center_lat_lon: tuple[float, float] | None = None
         self.controller_file = (
             self.output_path / POSITIONS_FOLDER / "controllers.parquet"
         )
 
+    def read_controller_data(self) -> None:
+        """Place the controller at the network center."""
+        self.center = get_center(self.sumo_net)
+        self.center_lat_lon = get_lat_lon(self.center[0], self.center[1], self.sumo_net)
+
     def create_controller_data(self):
         """Create the controller data."""
+        if self.center is None:
+            self.read_controller_data()
         self._write_activation_data()
         self._write_controller_data()
 
@@ -61,8 +70,8 @@ class CentralControllerPlacer:
     def _write_controller_data(self) -> None:
         """Write the controller data to a file."""
         controller_id = self.id_init
-        centers = get_center(self.sumo_net)
-        center_lat, center_lon = get_lat_lon(centers[0], centers[1], self.sumo_net)
+        centers = self.center
+        center_lat, center_lon = self.center_lat_lon
         controller_df = pd.DataFrame(
             [
                 [
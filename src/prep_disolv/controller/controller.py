@@ -23,18 +23,29 @@ class ControllerConverter:
         self.config = config
         self.controller_file = None
         self.controller_count = 0
+        self.controller_placer: CentralControllerPlacer | None = None
 
-    def create_controllers(self, controller_id_init: int) -> int:
-        """Create the controller data."""
+    def prepare_controllers(self) -> int:
+        """Place the controllers, which does not depend on the ID offset."""
         logger.debug("Read Controller data")
         output_path = self.config.path / self.config.get(OUTPUT_SETTINGS)[OUTPUT_PATH]
         if self.config.get(CONTROLLER_SETTINGS)[PLACEMENT] == CENTER:
-            controller_placer = CentralControllerPlacer(
+            self.controller_placer = CentralControllerPlacer(
                 self.config,
                 output_path,
-                controller_id_init,
+                0,
             )
-            controller_placer.create_controller_data()
-            self.controller_file = controller_placer.get_controller_file()
+            self.controller_placer.read_controller_data()
+            self.controller_count = 1
+        return self.controller_count
+
+    def create_controllers(self, controller_id_init: int) -> int:
+        """Create the controller data."""
+        if self.controller_placer is None:
+            self.prepare_controllers()
+        if self.controller_placer is not None:
+            self.controller_placer.controller_id_init = controller_id_init
+            self.controller_placer.create_controller_data()
+            self.controller_file = self.controller_placer.get_controller_file()
             self.controller_count = 1
         return self.controller_count
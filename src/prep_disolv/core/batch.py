@@ -0,0 +1,142 @@
+from __future__ import annotations
+
+import json
+import logging
+from concurrent.futures import Future, as_completed
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+from prep_disolv.common.config import (
+    ARROW_ENGINE,
+    ENGINE,
+    EXECUTION_SETTINGS,
+    ID_MAPPING,
+    LOG_SETTINGS,
+    NETWORK_FILE,
+    TRAFFIC_SETTINGS,
+    VEHICLE_SETTINGS,
+    Config,
+    trace_files,
+)
+from prep_disolv.common.logger import setup_logging
+from prep_disolv.common.metrics import StageMetrics, run_measured
+from prep_disolv.core.core import (
+    SHARED_VEHICLE_TRACE,
+    Core,
+    convert_vehicle_trace,
+    report_vehicle_trace,
+)
+
+if TYPE_CHECKING:
+    from prep_disolv.vehicle.vehicle import VehicleConverter
+
+logger = logging.getLogger(__name__)
+
+
+def trace_key(config: Config) -> tuple[str, str, str, str, str]:
+    """Get the inputs that decide the converted vehicle data of a scenario.
+
+    The engine writes the vehicle activations, so it is part of the inputs.
+    """
+    traffic_settings = config.get(TRAFFIC_SETTINGS)
+    id_mapping = traffic_settings.get(ID_MAPPING)
+    execution_settings = config.get(EXECUTION_SETTINGS) or {}
+    return (
+        ",".join(
+            str((config.path / trace_file).resolve())
+            for trace_file in trace_files(traffic_settings)
+        ),
+        str((config.path / traffic_settings[NETWORK_FILE]).resolve()),
+        json.dumps(config.get(VEHICLE_SETTINGS), sort_keys=True),
+        "" if id_mapping is None else str((config.path / id_mapping).resolve()),
+        execution_settings.get(ENGINE, ARROW_ENGINE),
+    )
+
+
+def convert_shared_trace(config: Config) -> tuple[VehicleConverter, StageMetrics]:
+    """Convert the trace of a group of scenarios and measure the conversion."""
+    converted, metrics = run_measured(
+        SHARED_VEHICLE_TRACE, convert_vehicle_trace, (config,)
+    )
+    report_vehicle_trace(config, metrics, converted)
+    return converted, metrics
+
+
+def _prepare_variant(
+    config_file: Path,
+    converted_vehicles: VehicleConverter,
+    conversion_metrics: StageMetrics,
+) -> int:
+    """Prepare a scenario with already converted vehicle data."""
+    core = Core(str(config_file), converted_vehicles, conversion_metrics)
+    core.prepare_scenario()
+    return core.total_agent_count
+
+
+class BatchRunner:
+    def __init__(self, config_files: list[Path], workers: int = 1) -> None:
+        """Prepares many scenarios, converting each distinct trace only once.
+
+        Parameters
+        ----------
+        config_files : list[Path]
+            The config files of the scenarios.
+        workers : int
+            The number of worker processes. With one worker, the scenarios are
+            prepared one after another in this process.
+        """
+        self.config_files = config_files
+        self.workers = workers
+        self.agent_counts: dict[Path, int] = {}
+
+    def group_configs(self) -> list[list[Path]]:
+        """Group the config files by the trace, network and vehicle settings."""
+        groups: dict[tuple[str, str, str, str, str], list[Path]] = {}
+        for config_file in self.config_files:
+            key = trace_key(Config(str(config_file)))
+            groups.setdefault(key, []).append(config_file)
+        return list(groups.values())
+
+    def run(self) -> dict[Path, int]:
+        """Prepare all scenarios and return their agent counts."""
+        first_config = Config(str(self.config_files[0]))
+        setup_logging(first_config.path, first_config.get(LOG_SETTINGS))
+        groups = self.group_configs()
+        logger.info(
+            "Preparing %d scenarios with %d distinct traces",
+            len(self.config_files),
+            len(groups),
+        )
+
+        if self.workers <= 1:
+            for group in groups:
+                converted, metrics = convert_shared_trace(Config(str(group[0])))
+                for config_file in group:
+                    self._finish(
+                        config_file, _prepare_variant(config_file, converted, metrics)
+                    )
+            return self.agent_counts
+
+        from concurrent.futures import ProcessPoolExecutor
+
+        with ProcessPoolExecutor(max_workers=self.workers) as executor:
+            conversions = {
+                executor.submit(convert_shared_trace, Config(str(group[0]))): group
+                for group in groups
+            }
+            variants: dict[Future, Path] = {}
+            for future in as_completed(conversions):
+                converted, metrics = future.result()
+                for config_file in conversions[future]:
+                    variant = executor.submit(
+                        _prepare_variant, config_file, converted, metrics
+                    )
+                    variants[variant] = config_file
+            for future in as_completed(variants):
+                self._finish(variants[future], future.result())
+        return self.agent_counts
+
+    def _finish(self, config_file: Path, agent_count: int) -> None:
+        """Store the agent count of a prepared scenario."""
+        logger.info("Prepared %s with %d agents", config_file, agent_count)
+        self.agent_counts[config_file] = agent_count
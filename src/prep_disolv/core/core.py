@@ -1,25 +1,180 @@
 from __future__ import annotations
 
 import logging
+from typing import TYPE_CHECKING
 
-from prep_disolv.controller.controller import ControllerConverter
-from prep_disolv.rsu.rsu import RsuConverter
+from prep_disolv.common.columns import LINKS_FOLDER
 from prep_disolv.common.config import (
+    AGENT_MAJOR,
+    CHUNK_SIZE,
+    EDGE_SETTINGS,
+    EDGE_WINDOW,
+    EXECUTION_SETTINGS,
+    FEATURE_INPUT,
+    FEATURE_LAYERS,
+    FEATURE_SETTINGS,
+    GEOMETRY_FORMAT,
+    GEOMETRY_SETTINGS,
+    LINK_SETTINGS,
     LOG_SETTINGS,
+    MOSAIC_SETTINGS,
+    NETWORK_FILE,
+    NS3_SETTINGS,
+    OUTPUT_PATH,
+    OUTPUT_SETTINGS,
+    PERCENTILES,
+    PERFORMANCE_SETTINGS,
+    REPORT_FILE,
+    SIMULATION_SETTINGS,
+    STEP_SIZE,
+    TRACEMALLOC,
+    TRAFFIC_SETTINGS,
+    WORKERS,
     Config,
+    trace_files,
 )
 from prep_disolv.common.logger import setup_logging
-from prep_disolv.vehicle.vehicle import VehicleConverter
+from prep_disolv.common.memory import memory_budget
+from prep_disolv.common.metrics import StageMetrics, file_size
+from prep_disolv.core.scheduler import Stage, StageScheduler
+
+# The converters import pandas, pyarrow, pyproj and numpy, so they are imported
+# by the stages that use them to keep the start of the command line fast.
+if TYPE_CHECKING:
+    from prep_disolv.controller.controller import ControllerConverter
+    from prep_disolv.export.features import FeatureConverter
+    from prep_disolv.export.geometry import NetGeometryExporter
+    from prep_disolv.export.mosaic import MosaicExporter
+    from prep_disolv.export.ns3 import Ns3Exporter
+    from prep_disolv.rsu.rsu import RsuConverter
+    from prep_disolv.store.trajectories import TrajectorySorter
+    from prep_disolv.vehicle.edges import EdgeStatsAggregator
+    from prep_disolv.vehicle.vehicle import VehicleConverter
 
 logger = logging.getLogger(__name__)
 
+# Stage names.
+VEHICLE_TRACE = "vehicle_trace"
+# The trace conversion that a batch shares between the scenarios of a trace.
+SHARED_VEHICLE_TRACE = "shared_vehicle_trace"
+VEHICLES = "vehicles"
+RSU_LAYOUT = "rsu_layout"
+RSUS = "rsus"
+CONTROLLER_LAYOUT = "controller_layout"
+CONTROLLERS = "controllers"
+BASE_STATIONS = "base_stations"
+LINKS = "links"
+NS3_EXPORT = "ns3_export"
+GEOMETRY_EXPORT = "geometry_export"
+MOSAIC_EXPORT = "mosaic_export"
+FEATURE_CONVERSION = "feature_conversion"
+EDGE_STATS = "edge_stats"
+TRAJECTORIES = "trajectories"
+
+DEFAULT_REPORT_FILE = "performance.json"
+
+
+def convert_vehicle_trace(config: Config) -> VehicleConverter:
+    """Convert the vehicle trace, which runs in a worker process."""
+    from prep_disolv.vehicle.vehicle import VehicleConverter
+
+    vehicle_converter = VehicleConverter(config)
+    vehicle_converter.create_vehicles()
+    return vehicle_converter
+
+
+def report_vehicle_trace(
+    config: Config, metrics: StageMetrics, vehicle_converter: VehicleConverter
+) -> None:
+    """Count the position rows written from the trace of a scenario."""
+    import pyarrow.parquet as pq
+
+    if vehicle_converter.vehicle_file is not None:
+        position_file = pq.ParquetFile(vehicle_converter.vehicle_file)
+        metrics.rows = position_file.metadata.num_rows
+    metrics.bytes = sum(
+        file_size(config.path / trace_file)
+        for trace_file in trace_files(config.get(TRAFFIC_SETTINGS))
+    )
+    metrics.sections = vehicle_converter.sections
+
+
+def prepare_rsu_layout(config: Config) -> RsuConverter:
+    """Read the RSU locations, which runs in a worker process."""
+    from prep_disolv.rsu.rsu import RsuConverter
+
+    rsu_converter = RsuConverter(config)
+    rsu_converter.prepare_rsu()
+    return rsu_converter
+
+
+def prepare_controller_layout(config: Config) -> ControllerConverter:
+    """Place the controllers, which runs in a worker process."""
+    from prep_disolv.controller.controller import ControllerConverter
+
+    controller_converter = ControllerConverter(config)
+    controller_converter.prepare_controllers()
+    return controller_converter
+
+
+def export_net_geometry(config: Config) -> NetGeometryExporter:
+    """Export the lane and junction polygons, which runs in a worker process."""
+    from prep_disolv.export.geometry import GEOPARQUET_FORMAT, NetGeometryExporter
+
+    geometry_settings = config.get(GEOMETRY_SETTINGS)
+    geometry_exporter = NetGeometryExporter(
+        config.path / config.get(TRAFFIC_SETTINGS)[NETWORK_FILE],
+        config.path / geometry_settings[OUTPUT_PATH],
+        geometry_settings.get(GEOMETRY_FORMAT, GEOPARQUET_FORMAT),
+        int(geometry_settings.get(WORKERS, 1)),
+    )
+    geometry_exporter.export()
+    return geometry_exporter
+
+
+def convert_features(config: Config) -> FeatureConverter:
+    """Convert the OSM or GeoJSON features, which runs in a worker process."""
+    from prep_disolv.export.features import FEATURE_CHUNK_SIZE, FeatureConverter
+    from prep_disolv.export.geometry import GEOPARQUET_FORMAT
+
+    feature_settings = config.get(FEATURE_SETTINGS)
+    feature_converter = FeatureConverter(
+        config.path / feature_settings[FEATURE_INPUT],
+        config.path / feature_settings[OUTPUT_PATH],
+        feature_settings.get(GEOMETRY_FORMAT, GEOPARQUET_FORMAT),
+        feature_settings.get(FEATURE_LAYERS),
+        int(feature_settings.get(CHUNK_SIZE, FEATURE_CHUNK_SIZE)),
+    )
+    feature_converter.convert()
+    return feature_converter
+
 
 class Core:
-    def __init__(self, config_file: str):
+    def __init__(
+        self,
+        config_file: str,
+        converted_vehicles: VehicleConverter | None = None,
+        conversion_metrics: StageMetrics | None = None,
+    ):
         self.config: Config = Config(config_file)
+        # The vehicle data of another scenario with the same trace, if any, and
+        # the metrics of its conversion for the performance report.
+        self.converted_vehicles = converted_vehicles
+        self.conversion_metrics = conversion_metrics
         self.vehicle_file = None
         self.rsu_file = None
         self.controller_file = None
+        self.link_files = {}
+        self.total_agent_count = 0
+        execution_settings = self.config.get(EXECUTION_SETTINGS) or {}
+        self.performance_settings = self.config.get(PERFORMANCE_SETTINGS) or {}
+        self.scheduler = StageScheduler(
+            execution_settings.get(WORKERS, 1),
+            self.performance_settings.get(TRACEMALLOC, False),
+        )
+        self.output_path = (
+            self.config.path / self.config.get(OUTPUT_SETTINGS)[OUTPUT_PATH]
+        )
 
     def prepare_scenario(self) -> None:
         setup_logging(self.config.path, self.config.settings.get(LOG_SETTINGS))
@@ -27,51 +182,359 @@ class Core:
         self._prepare_scenario()
 
     def _prepare_scenario(self) -> None:
-        """Prepare the scenario."""
-        total_agent_count = 0
-        logger.info("Preparing the Vehicle Data")
-        vehicle_count = self._create_vehicle_data()
-        total_agent_count += vehicle_count
-        vehicle_msg = f"Number of vehicles: {vehicle_count}"
-        logger.info(vehicle_msg)
+        """Prepare the scenario.
+
+        The network based stages only need the vehicle count for their ID offsets,
+        so their parsing runs next to the trace conversion and the files are
+        written once the count is known.
+        """
+        if self.converted_vehicles is None:
+            self.scheduler.add_stage(
+                Stage(
+                    VEHICLE_TRACE,
+                    convert_vehicle_trace,
+                    (self.config,),
+                    remote=True,
+                    report=self._report_vehicle_trace,
+                )
+            )
+        else:
+            if self.conversion_metrics is not None:
+                self.scheduler.performance.add(self.conversion_metrics)
+            self.scheduler.add_stage(
+                Stage(VEHICLE_TRACE, self._reuse_vehicle_trace)
+            )
+        self.scheduler.add_stage(
+            Stage(
+                VEHICLES,
+                self._create_vehicle_data,
+                depends_on=[VEHICLE_TRACE],
+                report=self._report_rows,
+            )
+        )
+        agent_stages = [VEHICLES]
 
         if 'rsu' in self.config.settings.keys():
-            logger.info("Preparing RSU data")
-            rsu_count = self._create_rsu_data(total_agent_count)
-            total_agent_count += rsu_count
-            rsu_msg = f"Number of RSUs: {rsu_count}"
-            logger.info(rsu_msg)
+            self.scheduler.add_stage(
+                Stage(
+                    RSU_LAYOUT,
+                    prepare_rsu_layout,
+                    (self.config,),
+                    remote=True,
+                    report=self._report_rsu_layout,
+                )
+            )
+            self.scheduler.add_stage(
+                Stage(
+                    RSUS,
+                    self._create_rsu_data,
+                    depends_on=[*agent_stages, RSU_LAYOUT],
+                    report=self._report_rows,
+                )
+            )
+            agent_stages.append(RSUS)
 
         if 'controller' in self.config.settings.keys():
-            logger.info("Preparing Controller data")
-            self._create_controller_data(total_agent_count)
+            self.scheduler.add_stage(
+                Stage(
+                    CONTROLLER_LAYOUT,
+                    prepare_controller_layout,
+                    (self.config,),
+                    remote=True,
+                    report=self._report_controller_layout,
+                )
+            )
+            self.scheduler.add_stage(
+                Stage(
+                    CONTROLLERS,
+                    self._create_controller_data,
+                    depends_on=[*agent_stages, CONTROLLER_LAYOUT],
+                    report=self._report_rows,
+                )
+            )
+            agent_stages.append(CONTROLLERS)
 
         if 'base_station' in self.config.settings.keys():
-            logger.info("Preparing Base Station data")
-            self._create_base_station_data()
+            self.scheduler.add_stage(
+                Stage(BASE_STATIONS, self._create_base_station_data)
+            )
+
+        if LINK_SETTINGS in self.config.settings:
+            self.scheduler.add_stage(
+                Stage(
+                    LINKS,
+                    self._create_links_data,
+                    depends_on=list(agent_stages),
+                    report=self._report_links,
+                    owns_pool=True,
+                )
+            )
+            agent_stages.append(LINKS)
+
+        if NS3_SETTINGS in self.config.settings:
+            self.scheduler.add_stage(
+                Stage(
+                    NS3_EXPORT,
+                    self._create_ns3_export,
+                    depends_on=agent_stages,
+                    report=self._report_ns3_export,
+                )
+            )
+
+        if MOSAIC_SETTINGS in self.config.settings:
+            self.scheduler.add_stage(
+                Stage(
+                    MOSAIC_EXPORT,
+                    self._create_mosaic_export,
+                    depends_on=[
+                        stage for stage in agent_stages if stage != LINKS
+                    ],
+                    report=self._report_mosaic_export,
+                )
+            )
+
+        if self.config.get(OUTPUT_SETTINGS).get(AGENT_MAJOR, False):
+            self.scheduler.add_stage(
+                Stage(
+                    TRAJECTORIES,
+                    self._create_trajectories,
+                    depends_on=[VEHICLES],
+                    report=self._report_trajectories,
+                )
+            )
+
+        if EDGE_SETTINGS in self.config.settings:
+            self.scheduler.add_stage(
+                Stage(
+                    EDGE_STATS,
+                    self._create_edge_stats,
+                    depends_on=[VEHICLES],
+                    report=self._report_edge_stats,
+                )
+            )
+
+        if GEOMETRY_SETTINGS in self.config.settings:
+            self.scheduler.add_stage(
+                Stage(
+                    GEOMETRY_EXPORT,
+                    export_net_geometry,
+                    (self.config,),
+                    remote=True,
+                    report=self._report_geometry_export,
+                    owns_pool=True,
+                )
+            )
 
+        if FEATURE_SETTINGS in self.config.settings:
+            self.scheduler.add_stage(
+                Stage(
+                    FEATURE_CONVERSION,
+                    convert_features,
+                    (self.config,),
+                    remote=True,
+                    report=self._report_feature_conversion,
+                )
+            )
+
+        self.scheduler.run()
+        self._write_performance_report()
         logger.info("Scenario is prepared")
 
+    def _reuse_vehicle_trace(self) -> VehicleConverter:
+        """Link the vehicle data that was converted for another scenario."""
+        from prep_disolv.vehicle.vehicle import VehicleConverter
+
+        vehicle_converter = VehicleConverter(self.config)
+        vehicle_converter.reuse_vehicles(self.converted_vehicles)
+        return vehicle_converter
+
     def _create_vehicle_data(self) -> int:
         """Create the vehicle data."""
-        vehicle_converter = VehicleConverter(self.config)
-        vehicle_converter.create_vehicles()
+        logger.info("Preparing the Vehicle Data")
+        vehicle_converter = self.scheduler.results[VEHICLE_TRACE]
         self.vehicle_file = vehicle_converter.vehicle_file
+        self.total_agent_count += vehicle_converter.vehicle_count
+        vehicle_msg = f"Number of vehicles: {vehicle_converter.vehicle_count}"
+        logger.info(vehicle_msg)
         return vehicle_converter.vehicle_count
 
-    def _create_rsu_data(self, rsu_init_id: int) -> int:
+    def _create_rsu_data(self) -> int:
         """Create the RSU data."""
-        rsu_converter = RsuConverter(self.config)
-        rsu_converter.create_rsu(rsu_init_id)
+        logger.info("Preparing RSU data")
+        rsu_converter = self.scheduler.results[RSU_LAYOUT]
+        rsu_converter.create_rsu(self.total_agent_count)
         self.rsu_file = rsu_converter.rsu_file
+        self.total_agent_count += rsu_converter.rsu_count
+        rsu_msg = f"Number of RSUs: {rsu_converter.rsu_count}"
+        logger.info(rsu_msg)
         return rsu_converter.rsu_count
 
-    def _create_controller_data(self, controller_init_id) -> None:
+    def _create_controller_data(self) -> int:
         """Create the controller data."""
-        controller_converter = ControllerConverter(self.config)
-        controller_converter.create_controllers(controller_init_id)
+        logger.info("Preparing Controller data")
+        controller_converter = self.scheduler.results[CONTROLLER_LAYOUT]
+        controller_converter.create_controllers(self.total_agent_count)
         self.controller_file = controller_converter.controller_file
+        self.total_agent_count += controller_converter.controller_count
         return controller_converter.controller_count
 
     def _create_base_station_data(self) -> None:
         """Create the base station data."""
+        logger.info("Preparing Base Station data")
+
+    def _create_links_data(self) -> int:
+        """Create the link data."""
+        logger.info("Preparing Links data")
+        from prep_disolv.links.links import LinksConverter
+
+        links_converter = LinksConverter(self.config)
+        link_count = links_converter.create_links(self.vehicle_file, self.rsu_file)
+        self.link_files = links_converter.link_files
+        links_msg = f"Number of links: {link_count}"
+        logger.info(links_msg)
+        return link_count
+
+    def _create_ns3_export(self) -> Ns3Exporter:
+        """Export the scenario with ns-3 IDs."""
+        logger.info("Preparing ns-3 export")
+        from prep_disolv.export.ns3 import Ns3Exporter
+
+        ns3_exporter = Ns3Exporter(self.config)
+        ns3_exporter.export(self.vehicle_file, self.rsu_file)
+        return ns3_exporter
+
+    def _create_mosaic_export(self) -> MosaicExporter:
+        """Export the MOSAIC mapping of the scenario."""
+        logger.info("Preparing MOSAIC export")
+        from prep_disolv.export.mosaic import MosaicExporter
+
+        mosaic_exporter = MosaicExporter(self.config)
+        mosaic_exporter.export(
+            self.vehicle_file, self.rsu_file, self.controller_file
+        )
+        return mosaic_exporter
+
+    def _create_trajectories(self) -> TrajectorySorter:
+        """Write the vehicle positions sorted by agent, with an agent index."""
+        logger.info("Preparing the agent-major trajectories")
+        from prep_disolv.store.trajectories import TrajectorySorter
+
+        trajectory_sorter = TrajectorySorter(
+            self.vehicle_file, memory_budget(self.config)
+        )
+        trajectory_sorter.sort()
+        return trajectory_sorter
+
+    def _create_edge_stats(self) -> EdgeStatsAggregator:
+        """Aggregate the vehicle positions per edge and time window."""
+        logger.info("Preparing the edge statistics")
+        from prep_disolv.vehicle.edges import (
+            DEFAULT_EDGE_WINDOW,
+            EdgeStatsAggregator,
+        )
+
+        edge_settings = self.config.get(EDGE_SETTINGS)
+        edge_aggregator = EdgeStatsAggregator(
+            self.vehicle_file,
+            self.config.path / edge_settings[OUTPUT_PATH],
+            int(edge_settings.get(EDGE_WINDOW, DEFAULT_EDGE_WINDOW)),
+            edge_settings.get(PERCENTILES),
+            int(self.config.get(SIMULATION_SETTINGS)[STEP_SIZE]),
+        )
+        edge_aggregator.aggregate()
+        return edge_aggregator
+
+    def _report_vehicle_trace(
+        self, metrics: StageMetrics, vehicle_converter: VehicleConverter
+    ) -> None:
+        """Count the position rows written from the trace."""
+        report_vehicle_trace(self.config, metrics, vehicle_converter)
+
+    def _report_rsu_layout(
+        self, metrics: StageMetrics, rsu_converter: RsuConverter
+    ) -> None:
+        """Count the RSUs read from the network."""
+        metrics.rows = rsu_converter.rsu_count
+        metrics.bytes = self._network_file_size()
+
+    def _report_controller_layout(
+        self, metrics: StageMetrics, controller_converter: ControllerConverter
+    ) -> None:
+        """Count the controllers placed on the network."""
+        metrics.rows = controller_converter.controller_count
+        metrics.bytes = self._network_file_size()
+
+    def _network_file_size(self) -> int:
+        """Get the size of the network file, which the layouts parse."""
+        network_file = self.config.get(TRAFFIC_SETTINGS).get(NETWORK_FILE)
+        if network_file is None:
+            return 0
+        return file_size(self.config.path / network_file)
+
+    @staticmethod
+    def _report_rows(metrics: StageMetrics, row_count: int) -> None:
+        """Count the rows returned by the stage."""
+        metrics.rows = row_count
+
+    def _report_links(self, metrics: StageMetrics, link_count: int) -> None:
+        """Count the links and the size of the link outputs."""
+        metrics.rows = link_count
+        metrics.bytes = file_size(self.output_path / LINKS_FOLDER)
+
+    def _report_ns3_export(
+        self, metrics: StageMetrics, ns3_exporter: Ns3Exporter
+    ) -> None:
+        """Count the remapped rows and the size of the export."""
+        metrics.rows = ns3_exporter.row_count
+        metrics.bytes = file_size(ns3_exporter.export_path)
+
+    def _report_mosaic_export(
+        self, metrics: StageMetrics, mosaic_exporter: MosaicExporter
+    ) -> None:
+        """Count the mapped units and the size of the mapping."""
+        metrics.rows = sum(mosaic_exporter.counts.values())
+        metrics.bytes = file_size(mosaic_exporter.mapping_file)
+
+    def _report_trajectories(
+        self, metrics: StageMetrics, trajectory_sorter: TrajectorySorter
+    ) -> None:
+        """Count the sorted rows and the size of the sorted file and its index."""
+        metrics.rows = trajectory_sorter.row_count
+        metrics.bytes = file_size(trajectory_sorter.output_file) + file_size(
+            trajectory_sorter.index_file
+        )
+
+    def _report_edge_stats(
+        self, metrics: StageMetrics, edge_aggregator: EdgeStatsAggregator
+    ) -> None:
+        """Count the edge statistics and the size of their file."""
+        metrics.rows = edge_aggregator.row_count
+        metrics.bytes = file_size(edge_aggregator.output_file)
+
+    def _report_geometry_export(
+        self, metrics: StageMetrics, geometry_exporter: NetGeometryExporter
+    ) -> None:
+        """Count the polygons and the size of the geometry files."""
+        metrics.rows = sum(geometry_exporter.counts.values())
+        metrics.bytes = sum(
+            file_size(output_file) for output_file in geometry_exporter.output_files
+        )
+
+    def _report_feature_conversion(
+        self, metrics: StageMetrics, feature_converter: FeatureConverter
+    ) -> None:
+        """Count the features and the size of the converted files."""
+        metrics.rows = sum(feature_converter.counts.values())
+        metrics.bytes = sum(
+            file_size(output_file) for output_file in feature_converter.output_files
+        )
+
+    def _write_performance_report(self) -> None:
+        """Log the stage metrics and write them to the output folder."""
+        performance = self.scheduler.performance
+        performance.log()
+        report_file = self.output_path / self.performance_settings.get(
+            REPORT_FILE, DEFAULT_REPORT_FILE
+        )
+        performance.write(report_file)
+        logger.info("Performance report written to %s", report_file)
@@ -0,0 +1,148 @@
+from __future__ import annotations
+
+import logging
+from collections.abc import Callable
+from concurrent.futures import FIRST_COMPLETED, Future, wait
+from typing import Any
+
+from prep_disolv.common.metrics import PerformanceReport, StageMetrics, run_measured
+
+logger = logging.getLogger(__name__)
+
+
+class Stage:
+    def __init__(
+        self,
+        name: str,
+        func: Callable[..., Any],
+        args: tuple = (),
+        depends_on: list[str] | None = None,
+        remote: bool = False,
+        report: Callable[[StageMetrics, Any], None] | None = None,
+        owns_pool: bool = False,
+    ) -> None:
+        """A stage of the scenario preparation.
+
+        Parameters
+        ----------
+        name : str
+            The unique name of the stage.
+        func : Callable[..., Any]
+            The stage function, called with the args. Local stages can read the
+            results of earlier stages from the scheduler.
+        args : tuple
+            The positional arguments of the stage function.
+        depends_on : list[str] | None
+            The names of the stages that must finish first.
+        remote : bool
+            Whether the stage runs in a worker process. Remote stage functions and
+            their arguments must be picklable.
+        report : Callable[[StageMetrics, Any], None] | None
+            Fills in the rows and bytes of the stage metrics from the result.
+        owns_pool : bool
+            Whether the stage runs its own worker processes, whose CPU time is
+            counted to the stage.
+        """
+        self.name = name
+        self.func = func
+        self.args = args
+        self.depends_on = depends_on or []
+        self.remote = remote
+        self.report = report
+        self.owns_pool = owns_pool
+
+    def __repr__(self) -> str:
+        return f"Stage({self.name}, {self.depends_on}, remote={self.remote})"
+
+
+class StageScheduler:
+    def __init__(self, workers: int = 1, trace_memory: bool = False) -> None:
+        """Runs stages in dependency order, overlapping independent ones.
+
+        Parameters
+        ----------
+        workers : int
+            The number of worker processes for remote stages. With one worker, all
+            stages run one after another in this process.
+        trace_memory : bool
+            Whether to trace the Python allocations of every stage.
+        """
+        self.workers = workers
+        self.trace_memory = trace_memory
+        self.stages: dict[str, Stage] = {}
+        self.results: dict[str, Any] = {}
+        self.performance = PerformanceReport()
+
+    def add_stage(self, stage: Stage) -> None:
+        """Add a stage, its dependencies must already be added."""
+        if stage.name in self.stages:
+            msg = f"Stage {stage.name} is already scheduled."
+            logger.error(msg)
+            raise ValueError(msg)
+        for dependency in stage.depends_on:
+            if dependency not in self.stages:
+                msg = f"Stage {stage.name} depends on unknown stage {dependency}."
+                logger.error(msg)
+                raise ValueError(msg)
+        self.stages[stage.name] = stage
+
+    def run(self) -> dict[str, Any]:
+        """Run all stages and return their results by stage name."""
+        if self.workers <= 1:
+            # Stages are added after their dependencies, so this order is valid.
+            for stage in self.stages.values():
+                self._finish(stage, *self._call(stage))
+            return self.results
+
+        # Importing the process pool loads multiprocessing, which is slow to start.
+        from concurrent.futures import ProcessPoolExecutor
+
+        with ProcessPoolExecutor(max_workers=self.workers) as executor:
+            running: dict[Future, Stage] = {}
+            started: set[str] = set()
+            while len(self.results) < len(self.stages):
+                ready = [
+                    stage
+                    for stage in self.stages.values()
+                    if stage.name not in started
+                    and all(dep in self.results for dep in stage.depends_on)
+                ]
+                for stage in ready:
+                    if stage.remote:
+                        logger.info("Starting stage %s in a worker", stage.name)
+                        started.add(stage.name)
+                        future = executor.submit(
+                            run_measured,
+                            stage.name,
+                            stage.func,
+                            stage.args,
+                            self.trace_memory,
+                            stage.owns_pool,
+                        )
+                        running[future] = stage
+
+                local_stage = next((stage for stage in ready if not stage.remote), None)
+                if local_stage is not None:
+                    started.add(local_stage.name)
+                    self._finish(local_stage, *self._call(local_stage))
+                    continue
+
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    self._finish(running.pop(future), *future.result())
+        return self.results
+
+    def _call(self, stage: Stage) -> tuple[Any, StageMetrics]:
+        """Run a stage in this process."""
+        logger.info("Starting stage %s", stage.name)
+        return run_measured(
+            stage.name, stage.func, stage.args, self.trace_memory, stage.owns_pool
+        )
+
+    def _finish(self, stage: Stage, result: Any, metrics: StageMetrics) -> None:
+        """Store the result and the metrics of a finished stage."""
+        logger.info("Finished stage %s", stage.name)
+        self.results[stage.name] = result
+        if stage.report is not None:
+            stage.report(metrics, result)
+        self.performance.add(metrics)
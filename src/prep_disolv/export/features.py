@@ -0,0 +1,231 @@
+from __future__ import annotations
+
+import json
+import logging
+from collections.abc import Iterator
+from pathlib import Path
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+from pyproj import CRS
+from tqdm import tqdm
+
+from prep_disolv.export.geometry import GEOMETRY, GEOPARQUET_FORMAT, GPKG_FORMAT
+
+logger = logging.getLogger(__name__)
+
+FEATURE_CHUNK_SIZE = 65536
+BBOX = "bbox"
+BBOX_FIELDS = ["xmin", "ymin", "xmax", "ymax"]
+WKB_EXTENSIONS = (b"geoarrow.wkb", b"ogc.wkb")
+
+
+def import_geo_modules() -> tuple:
+    """Import pyogrio and shapely, which are only needed for the feature conversion."""
+    try:
+        import pyogrio
+        import shapely
+    except ImportError as error:
+        msg = "Converting features needs pyogrio and shapely, install prep-disolv[geo]."
+        logger.error(msg)
+        raise ImportError(msg) from error
+    return pyogrio, shapely
+
+
+def geometry_column(schema: pa.Schema) -> str:
+    """Find the WKB geometry column of the record batches read by pyogrio."""
+    for field in schema:
+        metadata = field.metadata or {}
+        if metadata.get(b"ARROW:extension:name") in WKB_EXTENSIONS:
+            return field.name
+    msg = f"Found no WKB geometry column in {schema.names}."
+    logger.error(msg)
+    raise ValueError(msg)
+
+
+def build_feature_schema(
+    schema: pa.Schema, geometry_name: str, geometry_type: str, crs: str | None
+) -> pa.Schema:
+    """Build the GeoParquet schema of a layer, with a bounding box per feature.
+
+    The bbox column is the GeoParquet covering of the geometry. With its row
+    group statistics, readers skip the row groups outside of a query window.
+    """
+    fields = [field for field in schema if field.name != geometry_name]
+    bbox_type = pa.struct([pa.field(name, pa.float64()) for name in BBOX_FIELDS])
+    column_metadata = {
+        "encoding": "WKB",
+        "geometry_types": [] if geometry_type == "Unknown" else [geometry_type],
+        "covering": {
+            BBOX: {name: [BBOX, name] for name in BBOX_FIELDS},
+        },
+    }
+    if crs is not None:
+        column_metadata["crs"] = CRS.from_user_input(crs).to_json_dict()
+    geo_metadata = {
+        "version": "1.1.0",
+        "primary_column": GEOMETRY,
+        "columns": {GEOMETRY: column_metadata},
+    }
+    return pa.schema(
+        [*fields, pa.field(GEOMETRY, pa.binary()), pa.field(BBOX, bbox_type)],
+        metadata={"geo": json.dumps(geo_metadata)},
+    )
+
+
+class FeatureConverter:
+    def __init__(
+        self,
+        input_file: Path,
+        output_path: Path,
+        output_format: str = GEOPARQUET_FORMAT,
+        layers: list[str] | None = None,
+        chunk_size: int = FEATURE_CHUNK_SIZE,
+    ) -> None:
+        """Converts the layers of an OSM, GeoJSON or other GDAL file chunk by chunk.
+
+        The features are read as Arrow record batches with pyogrio, so only one
+        chunk of a layer is in memory at a time. GDAL keeps the node locations
+        of OSM files in temporary files once they outgrow its cache.
+
+        Parameters
+        ----------
+        input_file : Path
+            The OSM, OSM PBF, GeoJSON or other vector file readable by GDAL.
+        output_path : Path
+            The folder of the converted layers.
+        output_format : str
+            GeoParquet files per layer, or one GeoPackage with all layers.
+        layers : list[str] | None
+            The layers to convert, all layers of the input when not given.
+        chunk_size : int
+            The number of features in a chunk.
+        """
+        self.input_file = input_file
+        self.output_path = output_path
+        self.output_format = output_format
+        self.layers = layers
+        self.chunk_size = chunk_size
+        self.counts: dict[str, int] = {}
+        self.output_files: list[Path] = []
+
+    def convert(self) -> int:
+        """Write the layers and get the number of features written."""
+        pyogrio, _ = import_geo_modules()
+        logger.info("Converting %s to %s", self.input_file, self.output_format)
+        self.output_path.mkdir(parents=True, exist_ok=True)
+        layers = self.layers
+        if layers is None:
+            layers = [name for name, _ in pyogrio.list_layers(self.input_file)]
+        if self.output_format == GPKG_FORMAT:
+            gpkg_file = self.output_path / f"{self.input_file.stem}.gpkg"
+            gpkg_file.unlink(missing_ok=True)
+            self.output_files.append(gpkg_file)
+
+        for layer in layers:
+            self.counts[layer] = self._convert_layer(layer)
+        logger.info(
+            "Converted %d features in %d layers to %s",
+            sum(self.counts.values()),
+            len(self.counts),
+            self.output_path,
+        )
+        return sum(self.counts.values())
+
+    def _convert_layer(self, layer: str) -> int:
+        """Stream the record batches of a layer to its output."""
+        pyogrio, _ = import_geo_modules()
+        progress = tqdm(
+            unit="features",
+            desc=f"Converting {layer}: ",
+            colour="green",
+            ncols=120,
+        )
+        with pyogrio.open_arrow(
+            self.input_file,
+            layer=layer,
+            batch_size=self.chunk_size,
+            use_pyarrow=True,
+        ) as (meta, reader):
+            geometry_name = geometry_column(reader.schema)
+            geometry_type = meta["geometry_type"] or "Unknown"
+            schema = build_feature_schema(
+                reader.schema, geometry_name, geometry_type, meta["crs"]
+            )
+            chunks = self._build_chunks(reader, geometry_name, schema, progress)
+            if self.output_format == GPKG_FORMAT:
+                self._write_gpkg(layer, chunks, schema, geometry_type, meta["crs"])
+            else:
+                self._write_geoparquet(layer, chunks, schema)
+        progress.close()
+        return progress.n
+
+    def _build_chunks(
+        self,
+        reader: pa.RecordBatchReader,
+        geometry_name: str,
+        schema: pa.Schema,
+        progress: tqdm,
+    ) -> Iterator[pa.RecordBatch]:
+        """Add the bounding box of every feature to the record batches."""
+        _, shapely = import_geo_modules()
+        bbox_fields = list(schema.field(BBOX).type)
+        for batch in reader:
+            geometries = batch.column(geometry_name)
+            bounds = shapely.bounds(
+                shapely.from_wkb(geometries.to_numpy(zero_copy_only=False))
+            )
+            columns = [
+                batch.column(name)
+                for name in batch.schema.names
+                if name != geometry_name
+            ]
+            bbox = pa.StructArray.from_arrays(
+                [pa.array(bounds[:, index]) for index in range(4)],
+                fields=bbox_fields,
+            )
+            progress.update(batch.num_rows)
+            yield pa.RecordBatch.from_arrays(
+                [*columns, geometries.cast(pa.binary()), bbox], schema=schema
+            )
+
+    def _write_geoparquet(
+        self, layer: str, chunks: Iterator[pa.RecordBatch], schema: pa.Schema
+    ) -> None:
+        """Write every chunk of a layer as a row group of its GeoParquet file."""
+        layer_file = self.output_path / f"{layer}.parquet"
+        self.output_files.append(layer_file)
+        with pq.ParquetWriter(layer_file, schema) as writer:
+            for chunk in chunks:
+                writer.write_batch(chunk, row_group_size=self.chunk_size)
+
+    def _write_gpkg(
+        self,
+        layer: str,
+        chunks: Iterator[pa.RecordBatch],
+        schema: pa.Schema,
+        geometry_type: str,
+        crs: str | None,
+    ) -> None:
+        """Write the chunks of a layer to the GeoPackage in one stream.
+
+        GDAL fills the R-tree spatial index of the layer as the features are
+        written. The bbox column is only kept in the GeoParquet files.
+        """
+        from pyogrio.raw import write_arrow
+
+        gpkg_file = self.output_files[0]
+        write_arrow(
+            pa.RecordBatchReader.from_batches(
+                schema.remove(schema.get_field_index(BBOX)),
+                (chunk.drop_columns([BBOX]) for chunk in chunks),
+            ),
+            gpkg_file,
+            layer=layer,
+            driver="GPKG",
+            geometry_name=GEOMETRY,
+            geometry_type=geometry_type,
+            crs=crs,
+            append=gpkg_file.exists(),
+            layer_options={"SPATIAL_INDEX": "YES"},
+        )
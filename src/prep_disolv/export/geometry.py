@@ -0,0 +1,395 @@
+from __future__ import annotations
+
+import json
+import logging
+import xml.etree.ElementTree as Et
+from collections import deque
+from collections.abc import Iterable, Iterator
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from pathlib import Path
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+from pyproj import Transformer
+
+from prep_disolv.common.utils import get_offsets, get_projection
+
+logger = logging.getLogger(__name__)
+
+GEOPARQUET_FORMAT = "geoparquet"
+GPKG_FORMAT = "gpkg"
+GEOMETRY_CHUNK_SIZE = 20000
+
+# Output layers and columns.
+LANES = "lanes"
+JUNCTIONS = "junctions"
+LANE_ID = "lane_id"
+EDGE_ID = "edge_id"
+JUNCTION_ID = "junction_id"
+JUNCTION_TYPE = "junction_type"
+WIDTH = "width"
+SPEED = "speed"
+ALLOW = "allow"
+GEOMETRY = "geometry"
+
+# SUMO defaults and the lanes that are too short to draw.
+DEFAULT_LANE_WIDTH = 3.2
+MIN_LANE_LENGTH = 1.0
+INTERNAL_FUNCTION = "internal"
+
+# The header of a little endian WKB polygon with one ring.
+WKB_POLYGON_HEADER = np.dtype(
+    [("order", "u1"), ("type", "<u4"), ("rings", "<u4"), ("points", "<u4")]
+)
+WKB_POLYGON = 3
+
+
+def build_geometry_schema(layer: str) -> pa.Schema:
+    """Build the schema of a layer, with the GeoParquet metadata."""
+    if layer == LANES:
+        fields = [
+            pa.field(LANE_ID, pa.string()),
+            pa.field(EDGE_ID, pa.string()),
+            pa.field(WIDTH, pa.float64()),
+            pa.field(SPEED, pa.float64()),
+            pa.field(ALLOW, pa.string()),
+        ]
+    else:
+        fields = [
+            pa.field(JUNCTION_ID, pa.string()),
+            pa.field(JUNCTION_TYPE, pa.string()),
+        ]
+    # Without a crs, GeoParquet coordinates are longitude and latitude.
+    geo_metadata = {
+        "version": "1.0.0",
+        "primary_column": GEOMETRY,
+        "columns": {GEOMETRY: {"encoding": "WKB", "geometry_types": ["Polygon"]}},
+    }
+    return pa.schema(
+        [*fields, pa.field(GEOMETRY, pa.binary())],
+        metadata={"geo": json.dumps(geo_metadata)},
+    )
+
+
+class ShapeChunk:
+    def __init__(self, layer: str) -> None:
+        """The lanes or junctions of a part of the network, as read from the XML."""
+        self.layer = layer
+        self.shapes: list[str] = []
+        self.widths: list[float] = []
+        self.columns: dict[str, list] = {
+            field.name: []
+            for field in build_geometry_schema(layer)
+            if field.name != GEOMETRY
+        }
+
+    def __len__(self) -> int:
+        return len(self.shapes)
+
+    def add(self, shape: str, width: float, values: list) -> None:
+        """Add a shape with its width and the values of the other columns."""
+        self.shapes.append(shape)
+        self.widths.append(width)
+        for column, value in zip(self.columns.values(), values, strict=True):
+            column.append(value)
+
+
+@lru_cache(maxsize=16)
+def _lon_lat_transformer(projection: str) -> Transformer:
+    """Get the transformer from the network projection to longitude and latitude."""
+    return Transformer.from_crs(projection, "epsg:4326", always_xy=True)
+
+
+def parse_shapes(shapes: list[str]) -> tuple[np.ndarray, np.ndarray]:
+    """Parse SUMO shapes into one array of vertices and the vertex count of each."""
+    counts = np.array([len(shape.split()) for shape in shapes], dtype=np.int64)
+    points = " ".join(shapes).split()
+    values = " ".join(points).replace(",", " ").split()
+    if len(values) == 2 * len(points):
+        return np.array(values, dtype=np.float64).reshape(-1, 2), counts
+    # Shapes with elevation have a third value per vertex, which is dropped.
+    vertices = [point.split(",")[:2] for point in points]
+    return np.array(vertices, dtype=np.float64), counts
+
+
+def lane_outlines(
+    vertices: np.ndarray, counts: np.ndarray, widths: np.ndarray
+) -> tuple[np.ndarray, np.ndarray]:
+    """Get the closed outlines of lanes from their centre lines and widths.
+
+    Every vertex moves sideways by half the lane width, perpendicular to the
+    line between its neighbours, which is what SUMO does to draw the lanes.
+
+    Returns
+    -------
+    tuple[np.ndarray, np.ndarray]
+        The vertices of the outlines and the vertex count of each outline.
+    """
+    starts = np.cumsum(counts) - counts
+    owner = np.repeat(np.arange(len(counts)), counts)
+    index = np.arange(len(vertices))
+    previous = np.maximum(index - 1, starts[owner])
+    following = np.minimum(index + 1, starts[owner] + counts[owner] - 1)
+    direction = vertices[following] - vertices[previous]
+    length = np.hypot(direction[:, 0], direction[:, 1])
+    length[length == 0] = 1.0
+    normal = np.column_stack((-direction[:, 1], direction[:, 0])) / length[:, None]
+    side = normal * (widths[owner] / 2)[:, None]
+    left, right = vertices + side, vertices - side
+
+    # The outline is the left side, the right side backwards and the first vertex.
+    outline_counts = 2 * counts + 1
+    outline_starts = np.cumsum(outline_counts) - outline_counts
+    outline_owner = np.repeat(np.arange(len(counts)), outline_counts)
+    position = np.arange(outline_counts.sum()) - outline_starts[outline_owner]
+    lane_counts, lane_starts = counts[outline_owner], starts[outline_owner]
+    on_left = position < lane_counts
+    on_right = ~on_left & (position < 2 * lane_counts)
+    source = np.where(on_left, lane_starts + position, lane_starts)
+    source[on_right] = (lane_starts + 2 * lane_counts - 1 - position)[on_right]
+    outlines = np.where(on_right[:, None], right[source], left[source])
+    return outlines, outline_counts
+
+
+def closed_rings(vertices: np.ndarray, counts: np.ndarray) -> tuple:
+    """Close the rings that do not end on their first vertex."""
+    starts = np.cumsum(counts) - counts
+    ends = starts + counts - 1
+    is_open = np.any(vertices[starts] != vertices[ends], axis=1)
+    insert_at = (ends + 1)[is_open]
+    closed = np.insert(vertices, insert_at, vertices[starts[is_open]], axis=0)
+    return closed, counts + is_open
+
+
+def polygon_wkb(rings: np.ndarray, counts: np.ndarray) -> pa.Array:
+    """Encode polygons of one closed ring each as WKB, all at once."""
+    polygon_count = len(counts)
+    header = np.zeros(polygon_count, dtype=WKB_POLYGON_HEADER)
+    header["order"] = 1
+    header["type"] = WKB_POLYGON
+    header["rings"] = 1
+    header["points"] = counts
+    header_size = WKB_POLYGON_HEADER.itemsize
+
+    offsets = np.zeros(polygon_count + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum(header_size + 16 * counts)
+    data = np.empty(offsets[-1], dtype=np.uint8)
+    data[offsets[:-1, None] + np.arange(header_size)] = header.view(np.uint8).reshape(
+        polygon_count, header_size
+    )
+    coordinate_bytes = np.ascontiguousarray(rings, dtype="<f8").view(np.uint8)
+    point_starts = np.cumsum(counts) - counts
+    data[
+        np.repeat(offsets[:-1] + header_size - 16 * point_starts, 16 * counts)
+        + np.arange(coordinate_bytes.size)
+    ] = coordinate_bytes.reshape(-1)
+    return pa.Array.from_buffers(
+        pa.binary(),
+        polygon_count,
+        [None, pa.py_buffer(offsets.astype(np.int32)), pa.py_buffer(data)],
+    )
+
+
+def build_polygons(
+    chunk: ShapeChunk, projection: str, offsets: tuple[float, float]
+) -> tuple[str, pa.Table]:
+    """Build the polygons of a chunk in longitude and latitude.
+
+    This runs in a worker process when the export has several workers.
+    """
+    vertices, counts = parse_shapes(chunk.shapes)
+    vertices -= np.array(offsets)
+    if chunk.layer == LANES:
+        rings, counts = lane_outlines(
+            vertices, counts, np.array(chunk.widths, dtype=np.float64)
+        )
+    else:
+        rings, counts = closed_rings(vertices, counts)
+    lon, lat = _lon_lat_transformer(projection).transform(rings[:, 0], rings[:, 1])
+    schema = build_geometry_schema(chunk.layer)
+    columns = [
+        pa.array(values, type=schema.field(name).type)
+        for name, values in chunk.columns.items()
+    ]
+    geometry = polygon_wkb(np.column_stack((lon, lat)), counts)
+    return chunk.layer, pa.Table.from_arrays([*columns, geometry], schema=schema)
+
+
+def iter_shape_chunks(net_file: Path, chunk_size: int) -> Iterator[ShapeChunk]:
+    """Read the lane and junction shapes of a network in chunks."""
+    chunks = {LANES: ShapeChunk(LANES), JUNCTIONS: ShapeChunk(JUNCTIONS)}
+    edge_id, edge_function = "", ""
+    root = None
+    depth = 0
+    for event, element in Et.iterparse(str(net_file), events=("start", "end")):
+        if event == "start":
+            root = element if root is None else root
+            depth += 1
+            if element.tag == "edge":
+                edge_id = element.get("id", "")
+                edge_function = element.get("function", "")
+            continue
+        depth -= 1
+
+        if element.tag == "lane":
+            is_internal = edge_function == INTERNAL_FUNCTION
+            if is_internal or float(element.get("length", 0)) > MIN_LANE_LENGTH:
+                chunks[LANES].add(
+                    element.get("shape", ""),
+                    float(element.get("width", DEFAULT_LANE_WIDTH)),
+                    [
+                        element.get("id"),
+                        edge_id,
+                        float(element.get("width", DEFAULT_LANE_WIDTH)),
+                        float(element.get("speed", 0)),
+                        element.get("allow"),
+                    ],
+                )
+        elif element.tag == "junction":
+            shape = element.get("shape", "")
+            if element.get("type") != INTERNAL_FUNCTION and len(shape.split()) > 2:
+                chunks[JUNCTIONS].add(
+                    shape, 0.0, [element.get("id"), element.get("type")]
+                )
+
+        for layer, chunk in chunks.items():
+            if len(chunk) >= chunk_size:
+                yield chunk
+                chunks[layer] = ShapeChunk(layer)
+        # The top level elements are not needed once they are read.
+        if depth == 1:
+            root.remove(element)
+
+    yield from (chunk for chunk in chunks.values() if len(chunk) > 0)
+
+
+class GeometryWriter:
+    def __init__(self, output_path: Path, geometry_format: str) -> None:
+        """Writes the layers as GeoParquet files or as one GeoPackage."""
+        self.output_path = output_path
+        self.geometry_format = geometry_format
+        self.parquet_writers: dict[str, pq.ParquetWriter] = {}
+        self.written_layers: set[str] = set()
+        self.output_files: list[Path] = []
+        if geometry_format == GPKG_FORMAT:
+            self.gpkg_file = output_path / "network.gpkg"
+            self.gpkg_file.unlink(missing_ok=True)
+            self.output_files.append(self.gpkg_file)
+
+    def write(self, layer: str, table: pa.Table) -> None:
+        """Append the polygons of a chunk to their layer."""
+        if self.geometry_format == GPKG_FORMAT:
+            self._write_gpkg(layer, table)
+            return
+        if layer not in self.parquet_writers:
+            layer_file = self.output_path / f"{layer}.parquet"
+            self.parquet_writers[layer] = pq.ParquetWriter(layer_file, table.schema)
+            self.output_files.append(layer_file)
+        self.parquet_writers[layer].write_table(table)
+
+    def _write_gpkg(self, layer: str, table: pa.Table) -> None:
+        """Append a chunk to a GeoPackage layer with pyogrio."""
+        try:
+            from pyogrio.raw import write_arrow
+        except ImportError as error:
+            msg = "Writing GeoPackage files needs pyogrio, install prep-disolv[geo]."
+            logger.error(msg)
+            raise ImportError(msg) from error
+        write_arrow(
+            table,
+            self.gpkg_file,
+            layer=layer,
+            driver="GPKG",
+            geometry_name=GEOMETRY,
+            geometry_type="Polygon",
+            crs="EPSG:4326",
+            append=layer in self.written_layers,
+        )
+        self.written_layers.add(layer)
+
+    def close(self) -> None:
+        """Close the GeoParquet files."""
+        for writer in self.parquet_writers.values():
+            writer.close()
+
+
+class NetGeometryExporter:
+    def __init__(
+        self,
+        net_file: Path,
+        output_path: Path,
+        geometry_format: str = GEOPARQUET_FORMAT,
+        workers: int = 1,
+        chunk_size: int = GEOMETRY_CHUNK_SIZE,
+    ) -> None:
+        """The constructor of the NetGeometryExporter class.
+
+        Parameters
+        ----------
+        net_file : Path
+            The SUMO network file.
+        output_path : Path
+            The folder of the lanes and junctions layers.
+        geometry_format : str
+            GeoParquet files per layer, or one GeoPackage with both layers.
+        workers : int
+            The number of worker processes that build the polygons of the chunks.
+        chunk_size : int
+            The number of lanes or junctions in a chunk.
+        """
+        self.net_file = net_file
+        self.output_path = output_path
+        self.geometry_format = geometry_format
+        self.workers = workers
+        self.chunk_size = chunk_size
+        self.counts = {LANES: 0, JUNCTIONS: 0}
+        self.output_files: list[Path] = []
+
+    def export(self) -> int:
+        """Write the lane and junction polygons and get the number of polygons."""
+        logger.info(
+            "Exporting the geometry of %s as %s", self.net_file, self.geometry_format
+        )
+        self.output_path.mkdir(parents=True, exist_ok=True)
+        writer = GeometryWriter(self.output_path, self.geometry_format)
+        chunks = iter_shape_chunks(self.net_file, self.chunk_size)
+        for layer, table in self._build_chunks(chunks):
+            writer.write(layer, table)
+            self.counts[layer] += table.num_rows
+        writer.close()
+        self.output_files = writer.output_files
+        logger.info(
+            "Exported %d lanes and %d junctions to %s",
+            self.counts[LANES],
+            self.counts[JUNCTIONS],
+            self.output_path,
+        )
+        return sum(self.counts.values())
+
+    def _build_chunks(
+        self, chunks: Iterable[ShapeChunk]
+    ) -> Iterator[tuple[str, pa.Table]]:
+        """Build the polygons of the chunks in order, in parallel if configured.
+
+        Only a few chunks per worker are in flight, so the network is never held
+        in memory as a whole.
+        """
+        projection = get_projection(self.net_file)
+        offsets = get_offsets(self.net_file)
+        if self.workers <= 1:
+            for chunk in chunks:
+                yield build_polygons(chunk, projection, offsets)
+            return
+
+        with ProcessPoolExecutor(max_workers=self.workers) as executor:
+            pending = deque()
+            for chunk in chunks:
+                pending.append(
+                    executor.submit(build_polygons, chunk, projection, offsets)
+                )
+                if len(pending) >= 2 * self.workers:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
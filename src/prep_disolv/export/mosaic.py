@@ -0,0 +1,220 @@
+from __future__ import annotations
+
+import json
+import logging
+from pathlib import Path
+from typing import TextIO
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+from prep_disolv.common.columns import AGENT_ID, LAT, LON
+from prep_disolv.common.config import (
+    CONTROLLER_APPLICATIONS,
+    MOSAIC_SETTINGS,
+    OUTPUT_PATH,
+    RSU_APPLICATIONS,
+    VEHICLE_APPLICATIONS,
+    VEHICLE_CLASS,
+    Config,
+)
+from prep_disolv.vehicle.sumo import VEH_TYPE
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_VEHICLE_TYPE = "DEFAULT_VEHTYPE"
+DEFAULT_VEHICLE_CLASS = "Car"
+DEFAULT_APPLICATIONS = {
+    VEHICLE_APPLICATIONS: ["org.pavenet.app.Vehicle"],
+    RSU_APPLICATIONS: ["org.pavenet.app.RoadSideUnit"],
+    CONTROLLER_APPLICATIONS: ["org.pavenet.app.Controller"],
+}
+RSU_NAME = "RSU"
+CONTROLLER_NAME = "Controller"
+CONTROLLER_GROUP = "CentralController"
+RSU_CHUNK_SIZE = 10000
+
+
+def read_vehicle_types(vehicle_file: Path | None) -> list[str]:
+    """Read the distinct vehicle types of the positions, one record batch at a time."""
+    if vehicle_file is None:
+        return [DEFAULT_VEHICLE_TYPE]
+    if not Path(vehicle_file).exists():
+        logger.warning(
+            "Vehicle positions %s not found, using the vehicle type %s",
+            vehicle_file,
+            DEFAULT_VEHICLE_TYPE,
+        )
+        return [DEFAULT_VEHICLE_TYPE]
+    positions = pq.ParquetFile(vehicle_file, pre_buffer=False)
+    if VEH_TYPE not in positions.schema_arrow.names:
+        return [DEFAULT_VEHICLE_TYPE]
+    vehicle_types: set[str] = set()
+    for batch in positions.iter_batches(columns=[VEH_TYPE]):
+        vehicle_types.update(pc.unique(batch.column(0)).drop_null().to_pylist())
+    return sorted(vehicle_types) or [DEFAULT_VEHICLE_TYPE]
+
+
+def read_agent_positions(position_file: Path | None) -> pa.Table:
+    """Read the first latitude and longitude of every agent, in order of appearance."""
+    schema = pa.schema(
+        [
+            pa.field(AGENT_ID, pa.int64()),
+            pa.field(LAT, pa.float64()),
+            pa.field(LON, pa.float64()),
+        ]
+    )
+    if position_file is None or not Path(position_file).exists():
+        return schema.empty_table()
+    positions = pq.read_table(position_file, columns=[AGENT_ID, LAT, LON])
+    agent_ids = positions[AGENT_ID].to_numpy()
+    _, first_index = np.unique(agent_ids, return_index=True)
+    return positions.take(np.sort(first_index)).cast(schema)
+
+
+def format_positioned_units(
+    positions: pa.Table, name: str, applications: list[str]
+) -> pa.Array:
+    """Format the JSON object of every positioned unit with vectorized kernels."""
+    if positions.num_rows == 0:
+        return pa.array([], type=pa.string())
+    if not (
+        pc.all(pc.is_finite(positions[LAT])).as_py()
+        and pc.all(pc.is_finite(positions[LON])).as_py()
+    ):
+        msg = f"Found {name} positions that are not finite numbers."
+        logger.error(msg)
+        raise ValueError(msg)
+    prefix = f'{{"name": {json.dumps(name)}, "position": {{"latitude": '
+    suffix = f'}}, "applications": {json.dumps(applications)}}}'
+    return pc.binary_join_element_wise(
+        prefix,
+        pc.cast(positions[LAT], pa.string()),
+        ', "longitude": ',
+        pc.cast(positions[LON], pa.string()),
+        suffix,
+        "",
+    )
+
+
+class MosaicJsonWriter:
+    def __init__(self, output: TextIO) -> None:
+        """Writes the sections of a JSON object one after another."""
+        self.output = output
+        self.key_count = 0
+
+    def begin(self) -> None:
+        self.output.write("{")
+
+    def write_value(self, key: str, value: object) -> None:
+        """Write a key with a value that is small enough to encode at once."""
+        self._write_key(key)
+        self.output.write(json.dumps(value, indent=4).replace("\n", "\n    "))
+
+    def write_items(self, key: str, items: list[pa.Array]) -> int:
+        """Write a key with a list of JSON encoded items, chunk by chunk."""
+        self._write_key(key)
+        self.output.write("[")
+        item_count = 0
+        for chunk in items:
+            if len(chunk) == 0:
+                continue
+            separator = ",\n        " if item_count > 0 else "\n        "
+            self.output.write(separator)
+            self.output.write(",\n        ".join(chunk.to_pylist()))
+            item_count += len(chunk)
+        self.output.write("\n    ]" if item_count > 0 else "]")
+        return item_count
+
+    def end(self) -> None:
+        self.output.write("\n}\n")
+
+    def _write_key(self, key: str) -> None:
+        self.output.write(",\n    " if self.key_count > 0 else "\n    ")
+        self.output.write(f"{json.dumps(key)}: ")
+        self.key_count += 1
+
+
+class MosaicExporter:
+    def __init__(self, config: Config) -> None:
+        """The constructor of the MosaicExporter class."""
+        mosaic_settings = config.get(MOSAIC_SETTINGS)
+        self.mapping_file = config.path / mosaic_settings[OUTPUT_PATH]
+        self.vehicle_class = mosaic_settings.get(VEHICLE_CLASS, DEFAULT_VEHICLE_CLASS)
+        self.applications = {
+            key: list(mosaic_settings.get(key, default))
+            for key, default in DEFAULT_APPLICATIONS.items()
+        }
+        self.counts = {"prototypes": 0, "servers": 0, "rsus": 0}
+
+    def export(
+        self,
+        vehicle_file: Path | None,
+        rsu_file: Path | None,
+        controller_file: Path | None,
+    ) -> int:
+        """Write the MOSAIC mapping of the vehicles, RSUs and controllers.
+
+        Parameters
+        ----------
+        vehicle_file : Path | None
+            The vehicle positions, whose types become the vehicle prototypes.
+        rsu_file : Path | None
+            The RSU positions, one MOSAIC RSU per agent.
+        controller_file : Path | None
+            The controller positions, one MOSAIC server per agent.
+
+        Returns
+        -------
+        int
+            The number of prototypes, servers and RSUs written.
+        """
+        logger.info("Writing the MOSAIC mapping to %s", self.mapping_file)
+        self.mapping_file.parent.mkdir(parents=True, exist_ok=True)
+        prototypes = [
+            {
+                "name": vehicle_type,
+                "vehicleClass": self.vehicle_class,
+                "applications": self.applications[VEHICLE_APPLICATIONS],
+            }
+            for vehicle_type in read_vehicle_types(vehicle_file)
+        ]
+        controllers = read_agent_positions(controller_file)
+        servers = [
+            {
+                "name": CONTROLLER_NAME,
+                "group": CONTROLLER_GROUP,
+                "applications": self.applications[CONTROLLER_APPLICATIONS],
+            }
+        ] * max(controllers.num_rows, 1)
+        rsus = format_positioned_units(
+            read_agent_positions(rsu_file),
+            RSU_NAME,
+            self.applications[RSU_APPLICATIONS],
+        )
+
+        with self.mapping_file.open("w", encoding="utf-8") as output:
+            writer = MosaicJsonWriter(output)
+            writer.begin()
+            writer.write_value("config", {"fixed_order": True})
+            writer.write_value("prototypes", prototypes)
+            writer.write_value("servers", servers)
+            self.counts["rsus"] = writer.write_items(
+                "rsus",
+                [
+                    rsus.slice(start, RSU_CHUNK_SIZE)
+                    for start in range(0, len(rsus), RSU_CHUNK_SIZE)
+                ],
+            )
+            writer.end()
+        self.counts["prototypes"] = len(prototypes)
+        self.counts["servers"] = len(servers)
+        logger.info(
+            "Mapped %d vehicle types, %d servers and %d RSUs",
+            len(prototypes),
+            len(servers),
+            self.counts["rsus"],
+        )
+        return sum(self.counts.values())
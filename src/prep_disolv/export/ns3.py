@@ -0,0 +1,364 @@
+from __future__ import annotations
+
+import logging
+import shutil
+from pathlib import Path
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+from prep_disolv.common.columns import (
+    ACTIVATIONS_FOLDER,
+    AGENT_ID,
+    AGENT_TYPE,
+    LINKS_FOLDER,
+    NS3_ID,
+    POSITIONS_FOLDER,
+    TARGET_ID,
+    TIME_STEP,
+)
+from prep_disolv.common.config import (
+    ARROW_ENGINE,
+    ENGINE,
+    EXECUTION_SETTINGS,
+    LINK_TYPES,
+    NS3_SETTINGS,
+    OUTPUT_PATH,
+    OUTPUT_SETTINGS,
+    POLARS_ENGINE,
+    Config,
+)
+from prep_disolv.common.coordinates import (
+    QUANTIZED_COLUMNS,
+    decode_positions,
+    decoded_schema,
+    read_resolution,
+)
+from prep_disolv.common.memory import BatchSizer, memory_budget
+from prep_disolv.links.csr import CSR_INDEX_SUFFIX, CSR_SUFFIX
+
+logger = logging.getLogger(__name__)
+
+EXPORT_BATCH_SIZE = 100000
+# A batch is held when read, when its ID columns are remapped and when written,
+# and the remapping needs a few temporary ID arrays.
+REMAP_ROW_FACTOR = 4
+VEHICLE = "vehicle"
+RSU = "rsu"
+AGENT_TYPES = {"v": VEHICLE, "r": RSU}
+ID_MAPPING_FILE = "id_mapping.parquet"
+
+
+class IdMapping:
+    def __init__(self, agent_ids: np.ndarray, ns3_ids: np.ndarray) -> None:
+        """A vectorized lookup from agent IDs to ns-3 IDs."""
+        order = np.argsort(agent_ids, kind="stable")
+        self.agent_ids = agent_ids[order]
+        self.ns3_ids = ns3_ids[order]
+
+    def __len__(self) -> int:
+        return len(self.agent_ids)
+
+    def map_ids(self, agent_ids: np.ndarray) -> np.ndarray:
+        """Map the agent IDs to ns-3 IDs.
+
+        Raises
+        ------
+        ValueError
+            If any of the agent IDs is not part of the mapping.
+        """
+        if len(agent_ids) == 0:
+            return agent_ids.astype(self.ns3_ids.dtype)
+        index = np.searchsorted(self.agent_ids, agent_ids)
+        index = np.minimum(index, max(len(self.agent_ids) - 1, 0))
+        if len(self.agent_ids) == 0 or not np.array_equal(
+            self.agent_ids[index], agent_ids
+        ):
+            msg = "Found agent IDs that are not in the ns-3 ID mapping."
+            logger.error(msg)
+            raise ValueError(msg)
+        return self.ns3_ids[index]
+
+
+def _read_unique_agent_ids(activation_file: Path) -> np.ndarray:
+    """Read the agent IDs of an activation table in the order they appear."""
+    if not activation_file.exists():
+        return np.array([], dtype=np.int64)
+    agent_ids = pq.read_table(activation_file, columns=[AGENT_ID])[AGENT_ID]
+    agent_ids = agent_ids.to_numpy().astype(np.int64)
+    _, first_index = np.unique(agent_ids, return_index=True)
+    return agent_ids[np.sort(first_index)]
+
+
+def remap_parquet(
+    input_file: Path,
+    output_file: Path,
+    column_mappings: dict[str, IdMapping],
+    batch_size: int = EXPORT_BATCH_SIZE,
+) -> int:
+    """Rewrite a parquet file in record batches with the ID columns remapped.
+
+    Quantized coordinates and velocities are written decoded, as float64.
+
+    Parameters
+    ----------
+    input_file : Path
+        The parquet file to read.
+    output_file : Path
+        The parquet file to write.
+    column_mappings : dict[str, IdMapping]
+        The mapping to apply to each ID column.
+    batch_size : int
+        The number of rows read and written at a time.
+
+    Returns
+    -------
+    int
+        The number of rows written.
+    """
+    parquet_file = pq.ParquetFile(input_file, pre_buffer=False)
+    resolution = read_resolution(parquet_file.schema_arrow)
+    schema = decoded_schema(parquet_file.schema_arrow)
+    row_count = 0
+    with pq.ParquetWriter(output_file, schema) as writer:
+        for record_batch in parquet_file.iter_batches(batch_size=batch_size):
+            batch = decode_positions(record_batch, resolution)
+            for column, id_mapping in column_mappings.items():
+                column_index = schema.get_field_index(column)
+                ns3_ids = id_mapping.map_ids(batch.column(column_index).to_numpy())
+                batch = batch.set_column(
+                    column_index,
+                    schema.field(column),
+                    pa.array(ns3_ids, type=schema.field(column).type),
+                )
+            writer.write_batch(batch)
+            row_count += batch.num_rows
+    return row_count
+
+
+def remap_parquet_polars(
+    input_file: Path,
+    output_file: Path,
+    column_mappings: dict[str, IdMapping],
+) -> int:
+    """Rewrite a parquet file with the ID columns remapped by a lazy Polars query.
+
+    The scan, the replacement and the write run on the Polars streaming engine.
+    Quantized coordinates and velocities are written decoded, as float64.
+
+    Returns
+    -------
+    int
+        The number of rows written.
+
+    Raises
+    ------
+    ValueError
+        If any of the agent IDs is not part of the mapping.
+    """
+    import polars as pl
+
+    scan = pl.scan_parquet(input_file)
+    schema = scan.collect_schema()
+    resolution = read_resolution(pq.read_schema(input_file))
+    remapped = scan.with_columns(
+        pl.col(column)
+        .replace_strict(id_mapping.agent_ids, id_mapping.ns3_ids)
+        .cast(schema[column])
+        for column, id_mapping in column_mappings.items()
+    )
+    for column in QUANTIZED_COLUMNS:
+        if column not in schema or schema[column] == pl.Float64:
+            continue
+        decoded = pl.col(column).cast(pl.Float64)
+        if resolution is not None and schema[column].is_integer():
+            decoded = decoded * resolution
+        remapped = remapped.with_columns(decoded)
+    try:
+        remapped.sink_parquet(output_file)
+    except pl.exceptions.InvalidOperationError as error:
+        msg = f"Found agent IDs that are not in the ns-3 ID mapping: {error}"
+        logger.error(msg)
+        raise ValueError(msg) from error
+    return pq.ParquetFile(output_file).metadata.num_rows
+
+
+def remap_arrow(
+    input_file: Path,
+    output_file: Path,
+    column_mappings: dict[str, IdMapping],
+) -> int:
+    """Rewrite an Arrow IPC file with the ID columns remapped.
+
+    List columns, such as the targets of compact links, have their values
+    remapped and keep their offsets. The rows of every record batch are sorted
+    again by time step and the new agent IDs, which the binary search of the
+    compact links reader relies on. The lists move with their rows, and every
+    record batch keeps its time range, so the batch index stays valid.
+
+    Returns
+    -------
+    int
+        The number of rows written.
+    """
+    row_count = 0
+    with pa.memory_map(str(input_file), "r") as source:
+        reader = pa.ipc.open_file(source)
+        schema = reader.schema
+        with pa.OSFile(str(output_file), "wb") as sink, pa.ipc.new_file(
+            sink, schema
+        ) as writer:
+            for batch_index in range(reader.num_record_batches):
+                batch = reader.get_batch(batch_index)
+                for column, id_mapping in column_mappings.items():
+                    column_index = schema.get_field_index(column)
+                    ids = batch.column(column_index)
+                    if pa.types.is_list(ids.type):
+                        ns3_ids = id_mapping.map_ids(ids.values.to_numpy())
+                        ids = pa.ListArray.from_arrays(
+                            ids.offsets, pa.array(ns3_ids, type=ids.type.value_type)
+                        )
+                    else:
+                        ns3_ids = id_mapping.map_ids(ids.to_numpy())
+                        ids = pa.array(ns3_ids, type=ids.type)
+                    batch = batch.set_column(column_index, schema.field(column), ids)
+                if TIME_STEP in schema.names and AGENT_ID in column_mappings:
+                    row_order = pc.sort_indices(
+                        batch,
+                        sort_keys=[(TIME_STEP, "ascending"), (AGENT_ID, "ascending")],
+                    )
+                    batch = batch.take(row_order)
+                writer.write_batch(batch)
+                row_count += batch.num_rows
+    return row_count
+
+
+class Ns3Exporter:
+    def __init__(self, config: Config) -> None:
+        """The constructor of the Ns3Exporter class."""
+        self.config = config
+        self.input_path = (
+            self.config.path / self.config.get(OUTPUT_SETTINGS)[OUTPUT_PATH]
+        )
+        self.export_path = self.config.path / self.config.get(NS3_SETTINGS)[OUTPUT_PATH]
+        self.mappings: dict[str, IdMapping] = {}
+        self.mapping_file = self.export_path / ID_MAPPING_FILE
+        self.row_count = 0
+        execution_settings = self.config.get(EXECUTION_SETTINGS) or {}
+        self.engine = execution_settings.get(ENGINE, ARROW_ENGINE)
+        self.memory_budget = memory_budget(self.config)
+
+    def export(self, vehicle_file: Path | None, rsu_file: Path | None) -> int:
+        """Write the scenario with dense ns-3 IDs, vehicles first and RSUs next."""
+        for folder in [ACTIVATIONS_FOLDER, POSITIONS_FOLDER, LINKS_FOLDER]:
+            (self.export_path / folder).mkdir(parents=True, exist_ok=True)
+        self._build_mappings()
+
+        self._remap(
+            self.input_path / ACTIVATIONS_FOLDER / "vehicle_activations.parquet",
+            {AGENT_ID: self.mappings[VEHICLE]},
+        )
+        self._remap(
+            self.input_path / ACTIVATIONS_FOLDER / "rsu_activations.parquet",
+            {AGENT_ID: self.mappings[RSU]},
+        )
+        if vehicle_file is not None:
+            self._remap(Path(vehicle_file), {AGENT_ID: self.mappings[VEHICLE]})
+        if rsu_file is not None:
+            self._remap(Path(rsu_file), {AGENT_ID: self.mappings[RSU]})
+        self._remap_links()
+        return self.row_count
+
+    def _build_mappings(self) -> None:
+        """Build the ns-3 IDs from the activation tables and store the mapping."""
+        activations = self.input_path / ACTIVATIONS_FOLDER
+        vehicle_ids = _read_unique_agent_ids(
+            activations / "vehicle_activations.parquet"
+        )
+        rsu_ids = _read_unique_agent_ids(activations / "rsu_activations.parquet")
+        vehicle_ns3_ids = np.arange(len(vehicle_ids), dtype=np.int64)
+        rsu_ns3_ids = np.arange(len(rsu_ids), dtype=np.int64) + len(vehicle_ids)
+        self.mappings[VEHICLE] = IdMapping(vehicle_ids, vehicle_ns3_ids)
+        self.mappings[RSU] = IdMapping(rsu_ids, rsu_ns3_ids)
+        logger.info(
+            "Mapped %d vehicles and %d RSUs to ns-3 IDs", len(vehicle_ids), len(rsu_ids)
+        )
+
+        mapping_table = pa.table(
+            {
+                AGENT_ID: np.concatenate((vehicle_ids, rsu_ids)),
+                NS3_ID: np.concatenate((vehicle_ns3_ids, rsu_ns3_ids)),
+                AGENT_TYPE: [VEHICLE] * len(vehicle_ids) + [RSU] * len(rsu_ids),
+            }
+        )
+        pq.write_table(mapping_table, self.mapping_file)
+
+    def _remap_links(self) -> None:
+        """Remap the link datasets and transition files of every link type."""
+        links_path = self.input_path / LINKS_FOLDER
+        for link_type in LINK_TYPES:
+            column_mappings = {
+                AGENT_ID: self.mappings[AGENT_TYPES[link_type[0]]],
+                TARGET_ID: self.mappings[AGENT_TYPES[link_type[-1]]],
+            }
+            link_folder = links_path / f"{link_type}_links"
+            if link_folder.is_dir():
+                (self.export_path / LINKS_FOLDER / link_folder.name).mkdir(
+                    exist_ok=True
+                )
+                for part_file in sorted(link_folder.glob("part-*")):
+                    self._remap(part_file, column_mappings)
+
+            transitions_file = links_path / f"{link_type}_transitions.parquet"
+            self._remap(transitions_file, column_mappings)
+
+    def _remap(self, input_file: Path, column_mappings: dict[str, IdMapping]) -> None:
+        """Remap a file of the scenario to the same place in the export folder."""
+        if not input_file.exists():
+            return
+        output_file = self.export_path / input_file.relative_to(self.input_path)
+        if input_file.suffix == CSR_INDEX_SUFFIX:
+            # The remapped compact links keep the time range of every record batch.
+            shutil.copyfile(input_file, output_file)
+            return
+        if input_file.suffix == CSR_SUFFIX:
+            row_count = remap_arrow(input_file, output_file, column_mappings)
+        elif self.engine == POLARS_ENGINE:
+            row_count = remap_parquet_polars(input_file, output_file, column_mappings)
+        else:
+            row_count = remap_parquet(
+                input_file,
+                output_file,
+                column_mappings,
+                self._batch_size(input_file),
+            )
+        self.row_count += row_count
+        logger.info("Remapped %d rows of %s", row_count, input_file)
+
+    def _batch_size(self, input_file: Path) -> int:
+        """Size the remap batches of a parquet file to the memory budget."""
+        batch_sizer = BatchSizer(
+            self.memory_budget,
+            EXPORT_BATCH_SIZE,
+            REMAP_ROW_FACTOR * _decoded_row_bytes(pq.ParquetFile(input_file)),
+        )
+        return batch_sizer.rows
+
+
+def _decoded_row_bytes(parquet_file: pq.ParquetFile) -> int:
+    """Estimate the bytes of a row once read, from the types and the metadata."""
+    metadata = parquet_file.metadata
+    row_bytes = 0
+    for index, field in enumerate(parquet_file.schema_arrow):
+        try:
+            row_bytes += field.type.bit_width // 8
+        except ValueError:
+            # The variable width columns take about their uncompressed size.
+            column_bytes = sum(
+                metadata.row_group(row_group).column(index).total_uncompressed_size
+                for row_group in range(metadata.num_row_groups)
+            )
+            row_bytes += column_bytes // max(metadata.num_rows, 1) + 4
+    return max(row_bytes, 1)
@@ -0,0 +1,339 @@
+from __future__ import annotations
+
+import logging
+from collections.abc import Iterator
+from pathlib import Path
+
+import numpy as np
+import pyarrow as pa
+
+from prep_disolv.common.columns import AGENT_ID, DISTANCE, TARGET_ID, TIME_STEP
+from prep_disolv.common.memory import BatchSizer
+from prep_disolv.common.streaming import iter_dataset_batches
+from prep_disolv.links.writer import build_link_schema
+
+logger = logging.getLogger(__name__)
+
+CSR_SUFFIX = ".arrow"
+# The sidecar of a compact links file with the time range of every record batch.
+CSR_INDEX_SUFFIX = ".index"
+FIRST_STEP = "first_step"
+LAST_STEP = "last_step"
+DISTANCE_RESOLUTION = "distance_resolution"
+DEFAULT_DISTANCE_RESOLUTION = 0.1
+CSR_BATCH_SIZE = 100000
+# A buffered link takes about 12 bytes, which are copied once more into the batch.
+CSR_ROW_BYTES = 24
+# The list offsets are int32, which bounds the links of a record batch.
+CSR_MAX_BATCH_LINKS = np.iinfo(np.int32).max
+
+
+def build_csr_schema(distance_type: pa.DataType, resolution: float) -> pa.Schema:
+    """Build the schema of the compact links, one row per agent and time step."""
+    return pa.schema(
+        [
+            pa.field(TIME_STEP, pa.int64()),
+            pa.field(AGENT_ID, pa.int64()),
+            pa.field(TARGET_ID, pa.list_(pa.int64())),
+            pa.field(DISTANCE, pa.list_(distance_type)),
+        ],
+        metadata={DISTANCE_RESOLUTION: str(resolution)},
+    )
+
+
+def build_csr_index_schema() -> pa.Schema:
+    """Build the schema of the batch index, one row per record batch."""
+    return pa.schema(
+        [pa.field(FIRST_STEP, pa.int64()), pa.field(LAST_STEP, pa.int64())]
+    )
+
+
+def csr_index_file(link_file: Path) -> Path:
+    """Get the batch index next to a compact links file."""
+    return link_file.with_name(f"{link_file.name}{CSR_INDEX_SUFFIX}")
+
+
+def quantized_distance_type(max_distance: float, resolution: float) -> pa.DataType:
+    """Get the smallest unsigned type that holds the quantized distances."""
+    if max_distance / resolution < np.iinfo(np.uint16).max:
+        return pa.uint16()
+    return pa.uint32()
+
+
+class CsrLinkWriter:
+    def __init__(
+        self,
+        link_file: Path,
+        max_distance: float,
+        resolution: float = DEFAULT_DISTANCE_RESOLUTION,
+        batch_size: int = CSR_BATCH_SIZE,
+        compression: str | None = None,
+        batch_sizer: BatchSizer | None = None,
+    ) -> None:
+        """Writes links as one row per agent with the targets as CSR lists.
+
+        The time step and agent are stored once per agent instead of once per link.
+        The list offsets act as the CSR offsets over the agents, and the distances
+        are quantized to the resolution. The Arrow IPC file can be memory-mapped.
+
+        Parameters
+        ----------
+        link_file : Path
+            The Arrow IPC file to write.
+        max_distance : float
+            The link range, which bounds the distances.
+        resolution : float
+            The distance step of the quantized distances in metres.
+        batch_size : int
+            The number of links buffered before a record batch is written.
+        compression : str | None
+            The optional lz4 or zstd buffer compression. Uncompressed files are
+            read zero-copy, compressed ones decompress a record batch per read.
+            The time range of every record batch goes to a small uncompressed
+            index next to the file, so readers find a batch without decoding.
+        batch_sizer : BatchSizer | None
+            Sizes every batch to the memory budget of the writer instead of the
+            fixed batch size. Either size is capped at the int32 range of the
+            list offsets.
+        """
+        self.link_file = link_file
+        self.resolution = resolution
+        self.batch_sizer = batch_sizer
+        self.batch_size = min(
+            batch_size if batch_sizer is None else batch_sizer.rows,
+            CSR_MAX_BATCH_LINKS,
+        )
+        distance_type = quantized_distance_type(max_distance, resolution)
+        self.distance_dtype = distance_type.to_pandas_dtype()
+        self.schema = build_csr_schema(distance_type, resolution)
+        self.sink = pa.OSFile(str(link_file), "wb")
+        self.writer = pa.ipc.new_file(
+            self.sink,
+            self.schema,
+            options=pa.ipc.IpcWriteOptions(compression=compression),
+        )
+        self.buffer: list[tuple] = []
+        self.buffered_rows = 0
+        self.link_count = 0
+        self.first_steps: list[int] = []
+        self.last_steps: list[int] = []
+
+    def add_links(
+        self,
+        time_step: int,
+        agent_ids: np.ndarray,
+        target_ids: np.ndarray,
+        distances: np.ndarray,
+    ) -> None:
+        """Add the links of a time step, which must be sorted by agent.
+
+        Raises
+        ------
+        ValueError
+            If the time step has more links than the offsets of a batch hold.
+        """
+        if len(agent_ids) == 0:
+            return
+        if len(agent_ids) > CSR_MAX_BATCH_LINKS:
+            msg = (
+                f"Time step {time_step} has {len(agent_ids)} links, more than a "
+                f"compact links batch holds."
+            )
+            logger.error(msg)
+            raise ValueError(msg)
+        if self.buffered_rows + len(agent_ids) > CSR_MAX_BATCH_LINKS:
+            self.flush()
+        agent_starts = np.flatnonzero(np.diff(agent_ids)) + 1
+        agent_starts = np.concatenate(([0], agent_starts))
+        link_counts = np.diff(np.concatenate((agent_starts, [len(agent_ids)])))
+        quantized = np.rint(distances / self.resolution).astype(self.distance_dtype)
+        self.buffer.append(
+            (time_step, agent_ids[agent_starts], link_counts, target_ids, quantized)
+        )
+        self.buffered_rows += len(agent_ids)
+        self.link_count += len(agent_ids)
+        if self.buffered_rows >= self.batch_size:
+            self.flush()
+
+    def flush(self) -> None:
+        """Write the buffered time steps as one record batch."""
+        if self.buffered_rows == 0:
+            return
+        time_steps = np.concatenate(
+            [np.full(len(item[1]), item[0], dtype=np.int64) for item in self.buffer]
+        )
+        link_counts = np.concatenate([item[2] for item in self.buffer])
+        offsets = np.concatenate(([0], np.cumsum(link_counts))).astype(np.int32)
+        targets = np.concatenate([item[3] for item in self.buffer])
+        distances = np.concatenate([item[4] for item in self.buffer])
+        link_batch = pa.RecordBatch.from_arrays(
+            [
+                pa.array(time_steps),
+                pa.array(np.concatenate([item[1] for item in self.buffer])),
+                pa.ListArray.from_arrays(pa.array(offsets), pa.array(targets)),
+                pa.ListArray.from_arrays(pa.array(offsets), pa.array(distances)),
+            ],
+            schema=self.schema,
+        )
+        self.writer.write_batch(link_batch)
+        self.first_steps.append(self.buffer[0][0])
+        self.last_steps.append(self.buffer[-1][0])
+        if self.batch_sizer is not None:
+            self.batch_sizer.observe(self.buffered_rows, 2 * link_batch.nbytes)
+            self.batch_size = min(self.batch_sizer.rows, CSR_MAX_BATCH_LINKS)
+        self.buffer = []
+        self.buffered_rows = 0
+
+    def close(self) -> None:
+        """Flush the remaining links, close the file and write its batch index."""
+        self.flush()
+        self.writer.close()
+        self.sink.close()
+        index = pa.Table.from_arrays(
+            [
+                pa.array(self.first_steps, pa.int64()),
+                pa.array(self.last_steps, pa.int64()),
+            ],
+            schema=build_csr_index_schema(),
+        )
+        with pa.OSFile(
+            str(csr_index_file(self.link_file)), "wb"
+        ) as sink, pa.ipc.new_file(sink, index.schema) as writer:
+            writer.write_table(index)
+
+
+class CsrLinkReader:
+    def __init__(self, links_path: Path) -> None:
+        """Reads the neighbours of an agent from memory-mapped compact links.
+
+        Parameters
+        ----------
+        links_path : Path
+            A compact links file or a dataset folder of compact part files.
+        """
+        self.links_path = links_path
+        self.part_files = (
+            sorted(links_path.glob(f"*{CSR_SUFFIX}"))
+            if links_path.is_dir()
+            else [links_path]
+        )
+        self.readers = [
+            pa.ipc.open_file(pa.memory_map(str(part_file), "r"))
+            for part_file in self.part_files
+        ]
+        self.resolution = DEFAULT_DISTANCE_RESOLUTION
+        if self.readers:
+            metadata = self.readers[0].schema.metadata or {}
+            resolution = metadata.get(DISTANCE_RESOLUTION.encode())
+            if resolution is not None:
+                self.resolution = float(resolution)
+        self._build_batch_index()
+
+    def _build_batch_index(self) -> None:
+        """Index the time range of every record batch without reading the links."""
+        first_steps, last_steps, locations = [], [], []
+        for part_index, reader in enumerate(self.readers):
+            part_first, part_last = self._read_batch_index(part_index)
+            for batch_index in range(reader.num_record_batches):
+                first_steps.append(part_first[batch_index])
+                last_steps.append(part_last[batch_index])
+                locations.append((part_index, batch_index))
+        self.first_steps = np.array(first_steps, dtype=np.int64)
+        self.last_steps = np.array(last_steps, dtype=np.int64)
+        self.locations = locations
+
+    def _read_batch_index(self, part_index: int) -> tuple[np.ndarray, np.ndarray]:
+        """Read the time range of the record batches of a part file.
+
+        A part file without a matching index, such as one written before the
+        index existed, is indexed from the time steps of its record batches.
+        """
+        reader = self.readers[part_index]
+        index_file = csr_index_file(self.part_files[part_index])
+        if index_file.exists():
+            with pa.OSFile(str(index_file)) as source:
+                index = pa.ipc.open_file(source).read_all()
+            if index.num_rows == reader.num_record_batches:
+                return index[FIRST_STEP].to_numpy(), index[LAST_STEP].to_numpy()
+            logger.warning("Ignoring the stale batch index %s", index_file)
+        first_steps, last_steps = [], []
+        for batch_index in range(reader.num_record_batches):
+            time_steps = reader.get_batch(batch_index).column(0)
+            first_steps.append(time_steps[0].as_py())
+            last_steps.append(time_steps[len(time_steps) - 1].as_py())
+        return np.array(first_steps, dtype=np.int64), np.array(
+            last_steps, dtype=np.int64
+        )
+
+    def neighbours(
+        self, time_step: int, agent_id: int
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """Get the targets and distances of an agent at a time step.
+
+        The record batch is found from the index and the agent with a binary
+        search, then only the list slice of the agent is read.
+
+        Parameters
+        ----------
+        time_step : int
+            The time step.
+        agent_id : int
+            The agent whose links are returned.
+
+        Returns
+        -------
+        tuple[np.ndarray, np.ndarray]
+            The target IDs and the decoded distances in metres.
+        """
+        no_links = np.array([], dtype=np.int64), np.array([], dtype=np.float64)
+        batch_pos = np.searchsorted(self.first_steps, time_step, side="right") - 1
+        if batch_pos < 0 or self.last_steps[batch_pos] < time_step:
+            return no_links
+
+        part_index, batch_index = self.locations[batch_pos]
+        link_batch = self.readers[part_index].get_batch(batch_index)
+        time_steps = link_batch.column(0).to_numpy()
+        step_start = np.searchsorted(time_steps, time_step, side="left")
+        step_end = np.searchsorted(time_steps, time_step, side="right")
+        agent_ids = link_batch.column(1).to_numpy()[step_start:step_end]
+        row = step_start + np.searchsorted(agent_ids, agent_id)
+        if row >= step_end or agent_ids[row - step_start] != agent_id:
+            return no_links
+
+        targets = link_batch.column(2)
+        start = targets.offsets[row].as_py()
+        length = targets.offsets[row + 1].as_py() - start
+        target_ids = targets.values.slice(start, length).to_numpy()
+        distances = link_batch.column(3).values.slice(start, length).to_numpy()
+        return target_ids, distances * self.resolution
+
+    def iter_batches(self) -> Iterator[pa.RecordBatch]:
+        """Expand the compact links to long record batches in time order."""
+        long_schema = build_link_schema()
+        for reader in self.readers:
+            for batch_index in range(reader.num_record_batches):
+                link_batch = reader.get_batch(batch_index)
+                targets = link_batch.column(2)
+                link_counts = np.diff(targets.offsets.to_numpy())
+                distances = link_batch.column(3).values.to_numpy()
+                yield pa.RecordBatch.from_arrays(
+                    [
+                        np.repeat(link_batch.column(0).to_numpy(), link_counts),
+                        np.repeat(link_batch.column(1).to_numpy(), link_counts),
+                        targets.values.to_numpy(),
+                        distances * self.resolution,
+                    ],
+                    schema=long_schema,
+                )
+
+
+def iter_link_batches(
+    links_path: Path, columns: list[str] | None = None
+) -> Iterator[pa.RecordBatch]:
+    """Read a links dataset in time order as long rows, in either format."""
+    if links_path.is_dir() and any(links_path.glob(f"*{CSR_SUFFIX}")):
+        for link_batch in CsrLinkReader(links_path).iter_batches():
+            yield link_batch if columns is None else link_batch.select(columns)
+    else:
+        yield from iter_dataset_batches(links_path, columns)
+
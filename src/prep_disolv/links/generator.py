@@ -0,0 +1,273 @@
+from __future__ import annotations
+
+import logging
+from collections.abc import Iterable
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+import pyarrow.parquet as pq
+import tqdm
+
+from prep_disolv.common.columns import (
+    AGENT_ID,
+    COORD_X,
+    COORD_Y,
+    TIME_STEP,
+)
+from prep_disolv.common.config import R2R, R2V, V2R, V2V
+from prep_disolv.common.coordinates import decode_positions, read_resolution
+from prep_disolv.common.memory import BatchSizer, MemoryBudget
+from prep_disolv.common.streaming import (
+    TimePartition,
+    iter_time_steps,
+    plan_time_partitions,
+)
+from prep_disolv.links.csr import (
+    CSR_BATCH_SIZE,
+    CSR_ROW_BYTES,
+    CSR_SUFFIX,
+    DEFAULT_DISTANCE_RESOLUTION,
+    CsrLinkWriter,
+)
+from prep_disolv.links.spatial import SpatialGrid
+from prep_disolv.links.writer import LINK_BATCH_SIZE, LINK_ROW_BYTES, LinkWriter
+
+logger = logging.getLogger(__name__)
+
+POSITION_COLUMNS = [TIME_STEP, AGENT_ID, COORD_X, COORD_Y]
+LONG_FORMAT = "long"
+CSR_FORMAT = "csr"
+
+
+class AgentPositions:
+    def __init__(self, agent_ids: np.ndarray, x: np.ndarray, y: np.ndarray) -> None:
+        """The positions of a set of agents at one time step."""
+        self.agent_ids = agent_ids
+        self.x = x
+        self.y = y
+        self.grids: dict[float, SpatialGrid] = {}
+
+    def grid(self, radius: float) -> SpatialGrid:
+        """Get the spatial grid of the agents with the radius as cell size."""
+        if radius not in self.grids:
+            self.grids[radius] = SpatialGrid(self.x, self.y, radius)
+        return self.grids[radius]
+
+
+class LinkGenerator:
+    def __init__(
+        self,
+        positions_file: Path,
+        rsu_file: Path | None,
+        link_ranges: dict[str, float],
+        links_path: Path,
+        workers: int = 1,
+        link_format: str = LONG_FORMAT,
+        distance_resolution: float = DEFAULT_DISTANCE_RESOLUTION,
+        compression: str | None = None,
+        memory_budget: MemoryBudget | None = None,
+    ) -> None:
+        """The constructor of the LinkGenerator class.
+
+        Parameters
+        ----------
+        positions_file : Path
+            The vehicle positions, sorted by time step.
+        rsu_file : Path | None
+            The RSU positions, if RSUs are part of the scenario.
+        link_ranges : dict[str, float]
+            The link range in metres for each link type to generate.
+        links_path : Path
+            The folder where the link datasets are written.
+        workers : int
+            The number of worker processes, each handling a range of time steps.
+        link_format : str
+            The long parquet format or the compact CSR format.
+        distance_resolution : float
+            The distance step in metres of the quantized CSR distances.
+        compression : str | None
+            The optional buffer compression of the CSR files.
+        memory_budget : MemoryBudget | None
+            The memory budget of the stage, shared by the writers of all workers.
+        """
+        self.positions_file = positions_file
+        self.rsu_file = rsu_file
+        self.link_ranges = link_ranges
+        self.links_path = links_path
+        self.workers = workers
+        self.link_format = link_format
+        self.distance_resolution = distance_resolution
+        self.compression = compression
+        self.writer_budget = None
+        if memory_budget is not None:
+            self.writer_budget = memory_budget.share(
+                max(self.workers, 1) * max(len(link_ranges), 1)
+            )
+        self.link_files: dict[str, Path] = {}
+        self.link_counts: dict[str, int] = {}
+        self.rsu_positions = self._read_rsu_positions()
+
+    def _read_rsu_positions(self) -> AgentPositions:
+        """Read the static RSU positions."""
+        if self.rsu_file is None or not Path(self.rsu_file).exists():
+            empty = np.array([], dtype=np.float64)
+            return AgentPositions(np.array([], dtype=np.int64), empty, empty)
+        rsu_table = pq.read_table(self.rsu_file, columns=[AGENT_ID, COORD_X, COORD_Y])
+        return AgentPositions(
+            rsu_table[AGENT_ID].to_numpy().astype(np.int64),
+            rsu_table[COORD_X].to_numpy().astype(np.float64),
+            rsu_table[COORD_Y].to_numpy().astype(np.float64),
+        )
+
+    def generate_links(self) -> None:
+        """Generate the links over time partitions of the positions file.
+
+        Every partition writes its own part file in the links dataset of each
+        link type, so the part files are ordered by time.
+        """
+        positions = pq.ParquetFile(self.positions_file)
+        partitions = plan_time_partitions(positions, self.workers)
+        for link_type in self.link_ranges:
+            link_folder = self.links_path / f"{link_type}_links"
+            link_folder.mkdir(parents=True, exist_ok=True)
+            for stale_part in link_folder.glob("part-*"):
+                stale_part.unlink()
+            self.link_files[link_type] = link_folder
+            self.link_counts[link_type] = 0
+
+        logger.info(
+            "Generating links over %d partitions with %d workers",
+            len(partitions),
+            self.workers,
+        )
+        progress_bar = tqdm.tqdm(
+            total=positions.metadata.num_rows,
+            unit="rows",
+            desc="Generating links for rows: ",
+            colour="green",
+            ncols=120,
+        )
+        if self.workers <= 1 or len(partitions) == 1:
+            results = map(self.generate_partition_links, partitions)
+            self._collect_results(results, progress_bar)
+        else:
+            with ProcessPoolExecutor(max_workers=self.workers) as executor:
+                results = executor.map(self.generate_partition_links, partitions)
+                self._collect_results(results, progress_bar)
+        progress_bar.close()
+
+    def _collect_results(
+        self, results: Iterable[tuple[int, dict[str, int]]], progress_bar: tqdm.tqdm
+    ) -> None:
+        """Add up the link counts of the finished partitions."""
+        for row_count, link_counts in results:
+            for link_type, link_count in link_counts.items():
+                self.link_counts[link_type] += link_count
+            progress_bar.update(row_count)
+
+    def generate_partition_links(
+        self, partition: TimePartition
+    ) -> tuple[int, dict[str, int]]:
+        """Generate the links of one time partition.
+
+        Parameters
+        ----------
+        partition : TimePartition
+            The time range of the positions file to process.
+
+        Returns
+        -------
+        tuple[int, dict[str, int]]
+            The number of position rows read and the link count per link type.
+        """
+        positions = pq.ParquetFile(self.positions_file, pre_buffer=False)
+        resolution = read_resolution(positions.schema_arrow)
+        writers = {
+            link_type: self._create_writer(link_type, partition)
+            for link_type in self.link_ranges
+        }
+
+        row_count = 0
+        # RSUs are static, so their links are only written by the first partition.
+        first_step = partition.index == 0
+        for time_step, step_table in iter_time_steps(
+            decode_positions(batch, resolution)
+            for batch in partition.iter_batches(positions, POSITION_COLUMNS)
+        ):
+            logger.debug("Generating links at %s", time_step)
+            vehicles = AgentPositions(
+                step_table[AGENT_ID].to_numpy(),
+                step_table[COORD_X].to_numpy(),
+                step_table[COORD_Y].to_numpy(),
+            )
+            for link_type, writer in writers.items():
+                if link_type == R2R and not first_step:
+                    continue
+                writer.add_links(time_step, *self._find_links(link_type, vehicles))
+            first_step = False
+            row_count += step_table.num_rows
+
+        link_counts = {}
+        for link_type, writer in writers.items():
+            writer.close()
+            link_counts[link_type] = writer.link_count
+        return row_count, link_counts
+
+    def _create_writer(
+        self, link_type: str, partition: TimePartition
+    ) -> LinkWriter | CsrLinkWriter:
+        """Create the writer of the part file of a link type."""
+        part_name = f"part-{partition.index:05d}"
+        if self.link_format == CSR_FORMAT:
+            return CsrLinkWriter(
+                self.link_files[link_type] / f"{part_name}{CSR_SUFFIX}",
+                self.link_ranges[link_type],
+                self.distance_resolution,
+                compression=self.compression,
+                batch_sizer=self._batch_sizer(CSR_BATCH_SIZE, CSR_ROW_BYTES),
+            )
+        return LinkWriter(
+            self.link_files[link_type] / f"{part_name}.parquet",
+            batch_sizer=self._batch_sizer(LINK_BATCH_SIZE, LINK_ROW_BYTES),
+        )
+
+    def _batch_sizer(self, default_rows: int, row_bytes: int) -> BatchSizer | None:
+        """Get the batch sizer of a writer, None without a memory budget."""
+        if self.writer_budget is None:
+            return None
+        return BatchSizer(self.writer_budget, default_rows, row_bytes)
+
+    def _find_links(
+        self, link_type: str, vehicles: AgentPositions
+    ) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Find the links of a type at the current time step."""
+        link_range = self.link_ranges[link_type]
+        if link_type == V2V:
+            agents, targets = vehicles, vehicles
+            agent_idx, target_idx, distances = vehicles.grid(link_range).query_self(
+                link_range
+            )
+        elif link_type == R2R:
+            agents, targets = self.rsu_positions, self.rsu_positions
+            agent_idx, target_idx, distances = self.rsu_positions.grid(
+                link_range
+            ).query_self(link_range)
+        elif link_type == V2R:
+            agents, targets = vehicles, self.rsu_positions
+            agent_idx, target_idx, distances = self.rsu_positions.grid(
+                link_range
+            ).query(vehicles.x, vehicles.y, link_range)
+        elif link_type == R2V:
+            agents, targets = self.rsu_positions, vehicles
+            agent_idx, target_idx, distances = vehicles.grid(link_range).query(
+                self.rsu_positions.x, self.rsu_positions.y, link_range
+            )
+        else:
+            msg = f"Unknown link type {link_type}"
+            logger.error(msg)
+            raise ValueError(msg)
+
+        agent_ids = agents.agent_ids[agent_idx]
+        order = np.lexsort((distances, agent_ids))
+        return agent_ids[order], targets.agent_ids[target_idx[order]], distances[order]
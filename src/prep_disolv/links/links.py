@@ -0,0 +1,83 @@
+from __future__ import annotations
+
+import logging
+from pathlib import Path
+
+from prep_disolv.common.columns import LINKS_FOLDER
+from prep_disolv.common.config import (
+    ARROW_ENGINE,
+    DISTANCE_RESOLUTION,
+    ENGINE,
+    EXECUTION_SETTINGS,
+    LINK_COMPRESSION,
+    LINK_FORMAT,
+    LINK_SETTINGS,
+    LINK_TYPES,
+    OUTPUT_PATH,
+    OUTPUT_SETTINGS,
+    POLARS_ENGINE,
+    TRANSITIONS,
+    WORKERS,
+    Config,
+)
+from prep_disolv.common.memory import memory_budget
+from prep_disolv.links.csr import DEFAULT_DISTANCE_RESOLUTION
+from prep_disolv.links.generator import LONG_FORMAT, LinkGenerator
+from prep_disolv.links.transitions import LazyLinkTransitions, LinkTransitions
+
+logger = logging.getLogger(__name__)
+
+
+class LinksConverter:
+    def __init__(self, config: Config) -> None:
+        """The constructor of the LinksConverter class."""
+        self.config = config
+        self.link_files: dict[str, Path] = {}
+        self.link_counts: dict[str, int] = {}
+        self.transition_files: dict[str, Path] = {}
+        execution_settings = self.config.get(EXECUTION_SETTINGS) or {}
+        self.engine = execution_settings.get(ENGINE, ARROW_ENGINE)
+
+    def create_links(self, vehicle_file: Path, rsu_file: Path | None) -> int:
+        """Create the link data for the configured link types."""
+        logger.debug("Generating links from %s", vehicle_file)
+        output_path = self.config.path / self.config.get(OUTPUT_SETTINGS)[OUTPUT_PATH]
+        link_settings = self.config.get(LINK_SETTINGS)
+        link_ranges = {
+            link_type: float(link_settings[link_type])
+            for link_type in LINK_TYPES
+            if link_type in link_settings
+        }
+        if not link_ranges:
+            logger.warning("No link types are configured, skipping links")
+            return 0
+
+        link_generator = LinkGenerator(
+            vehicle_file,
+            rsu_file,
+            link_ranges,
+            output_path / LINKS_FOLDER,
+            int(link_settings.get(WORKERS, 1)),
+            link_settings.get(LINK_FORMAT, LONG_FORMAT),
+            float(link_settings.get(DISTANCE_RESOLUTION, DEFAULT_DISTANCE_RESOLUTION)),
+            link_settings.get(LINK_COMPRESSION),
+            memory_budget(self.config),
+        )
+        link_generator.generate_links()
+        self.link_files = link_generator.link_files
+        self.link_counts = link_generator.link_counts
+        if link_settings.get(TRANSITIONS, False):
+            self._create_transitions(output_path / LINKS_FOLDER)
+        return sum(self.link_counts.values())
+
+    def _create_transitions(self, links_path: Path) -> None:
+        """Extract the nearest target transitions of every link type."""
+        for link_type, link_folder in self.link_files.items():
+            transitions_file = links_path / f"{link_type}_transitions.parquet"
+            if self.engine == POLARS_ENGINE:
+                transitions = LazyLinkTransitions(link_folder, transitions_file)
+            else:
+                transitions = LinkTransitions(link_folder, transitions_file)
+            transition_count = transitions.extract_transitions()
+            logger.info("Number of %s transitions: %d", link_type, transition_count)
+            self.transition_files[link_type] = transitions_file
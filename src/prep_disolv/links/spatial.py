@@ -0,0 +1,119 @@
+from __future__ import annotations
+
+import numpy as np
+
+# Cell coordinates are packed into a single int64 key, which is injective as long
+# as the cell indices stay within +/- 2^31.
+CELL_KEY_SHIFT = np.int64(1 << 32)
+
+
+def _cell_keys(cell_x: np.ndarray, cell_y: np.ndarray) -> np.ndarray:
+    """Pack the cell indices into sortable keys."""
+    return cell_x * CELL_KEY_SHIFT + cell_y
+
+
+class SpatialGrid:
+    def __init__(self, x: np.ndarray, y: np.ndarray, cell_size: float) -> None:
+        """A uniform grid hash over a set of points.
+
+        Parameters
+        ----------
+        x : np.ndarray
+            The x coordinates of the indexed points.
+        y : np.ndarray
+            The y coordinates of the indexed points.
+        cell_size : float
+            The edge length of a grid cell.
+        """
+        self.x = np.asarray(x, dtype=np.float64)
+        self.y = np.asarray(y, dtype=np.float64)
+        self.cell_size = float(cell_size)
+        keys = _cell_keys(self._cell_of(self.x), self._cell_of(self.y))
+        self.order = np.argsort(keys, kind="stable")
+        self.sorted_keys = keys[self.order]
+
+    def __len__(self) -> int:
+        return len(self.x)
+
+    def _cell_of(self, coord: np.ndarray) -> np.ndarray:
+        """Get the cell index of the coordinates."""
+        return np.floor(coord / self.cell_size).astype(np.int64)
+
+    def query(
+        self, query_x: np.ndarray, query_y: np.ndarray, radius: float
+    ) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Find all indexed points within the radius of the query points.
+
+        Only the cells overlapping the radius are visited, so the work grows with
+        the number of candidate pairs rather than the product of both sets.
+
+        Parameters
+        ----------
+        query_x : np.ndarray
+            The x coordinates of the query points.
+        query_y : np.ndarray
+            The y coordinates of the query points.
+        radius : float
+            The search radius.
+
+        Returns
+        -------
+        tuple[np.ndarray, np.ndarray, np.ndarray]
+            The query indices, the indexed point indices and their distances.
+        """
+        query_x = np.asarray(query_x, dtype=np.float64)
+        query_y = np.asarray(query_y, dtype=np.float64)
+        query_idx, point_idx, distances = [], [], []
+        if len(self) == 0 or len(query_x) == 0:
+            return _empty_pairs()
+
+        cell_x = self._cell_of(query_x)
+        cell_y = self._cell_of(query_y)
+        query_range = np.arange(len(query_x), dtype=np.int64)
+        reach = int(np.ceil(radius / self.cell_size))
+        for dx in range(-reach, reach + 1):
+            for dy in range(-reach, reach + 1):
+                keys = _cell_keys(cell_x + dx, cell_y + dy)
+                start = np.searchsorted(self.sorted_keys, keys, side="left")
+                end = np.searchsorted(self.sorted_keys, keys, side="right")
+                counts = end - start
+                total = int(counts.sum())
+                if total == 0:
+                    continue
+
+                candidate_query = np.repeat(query_range, counts)
+                run_offsets = np.arange(total) - np.repeat(
+                    np.cumsum(counts) - counts, counts
+                )
+                candidate_point = self.order[np.repeat(start, counts) + run_offsets]
+                candidate_dist = np.hypot(
+                    query_x[candidate_query] - self.x[candidate_point],
+                    query_y[candidate_query] - self.y[candidate_point],
+                )
+                in_range = candidate_dist <= radius
+                query_idx.append(candidate_query[in_range])
+                point_idx.append(candidate_point[in_range])
+                distances.append(candidate_dist[in_range])
+
+        if not query_idx:
+            return _empty_pairs()
+        return (
+            np.concatenate(query_idx),
+            np.concatenate(point_idx),
+            np.concatenate(distances),
+        )
+
+    def query_self(self, radius: float) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Find all pairs of distinct indexed points within the radius."""
+        query_idx, point_idx, distances = self.query(self.x, self.y, radius)
+        distinct = query_idx != point_idx
+        return query_idx[distinct], point_idx[distinct], distances[distinct]
+
+
+def _empty_pairs() -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Return an empty result of a grid query."""
+    return (
+        np.array([], dtype=np.int64),
+        np.array([], dtype=np.int64),
+        np.array([], dtype=np.float64),
+    )
@@ -0,0 +1,188 @@
+from __future__ import annotations
+
+import logging
+from pathlib import Path
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from prep_disolv.common.columns import AGENT_ID, DISTANCE, TARGET_ID, TIME_STEP
+from prep_disolv.common.streaming import iter_time_step_chunks
+from prep_disolv.links.csr import iter_link_batches
+from prep_disolv.links.writer import build_link_schema
+
+logger = logging.getLogger(__name__)
+
+NO_TARGET = -1
+
+
+class TargetState:
+    def __init__(self) -> None:
+        """The last nearest target of every agent seen so far."""
+        self.agent_ids = np.array([], dtype=np.int64)
+        self.target_ids = np.array([], dtype=np.int64)
+
+    def lookup(self, agent_ids: np.ndarray) -> np.ndarray:
+        """Get the last targets of the agents, NO_TARGET for unseen agents."""
+        if len(self.agent_ids) == 0:
+            return np.full(len(agent_ids), NO_TARGET, dtype=np.int64)
+        index = np.searchsorted(self.agent_ids, agent_ids)
+        index = np.minimum(index, len(self.agent_ids) - 1)
+        found = self.agent_ids[index] == agent_ids
+        return np.where(found, self.target_ids[index], NO_TARGET)
+
+    def update(self, agent_ids: np.ndarray, target_ids: np.ndarray) -> None:
+        """Replace the last targets of the agents, the agents must be unique."""
+        merged_agents = np.concatenate((agent_ids, self.agent_ids))
+        merged_targets = np.concatenate((target_ids, self.target_ids))
+        # np.unique keeps the first occurrence, which is the newer target.
+        self.agent_ids, first_index = np.unique(merged_agents, return_index=True)
+        self.target_ids = merged_targets[first_index]
+
+
+class LinkTransitions:
+    def __init__(self, links_path: Path, transitions_file: Path) -> None:
+        """The constructor of the LinkTransitions class.
+
+        Parameters
+        ----------
+        links_path : Path
+            The links dataset folder or file, sorted by time step.
+        transitions_file : Path
+            The output file with the rows where the nearest target changes.
+        """
+        self.links_path = links_path
+        self.transitions_file = transitions_file
+        self.transition_count = 0
+        self.state = TargetState()
+
+    def extract_transitions(self) -> int:
+        """Scan the links in time order and keep the nearest target changes.
+
+        Only the links of whole time steps and the last target of every agent are
+        held in memory, so the memory does not grow with the length of the trace.
+        """
+        logger.info("Extracting transitions from %s", self.links_path)
+        writer = pq.ParquetWriter(self.transitions_file, build_link_schema())
+        link_batches = iter_link_batches(
+            self.links_path, [TIME_STEP, AGENT_ID, TARGET_ID, DISTANCE]
+        )
+        for chunk in iter_time_step_chunks(link_batches):
+            transitions = self._find_transitions(chunk)
+            if transitions.num_rows > 0:
+                writer.write_table(transitions)
+                self.transition_count += transitions.num_rows
+        writer.close()
+        return self.transition_count
+
+    def _find_transitions(self, chunk: pa.Table) -> pa.Table:
+        """Find the nearest target changes within complete time steps."""
+        time_steps = chunk[TIME_STEP].to_numpy()
+        agent_ids = chunk[AGENT_ID].to_numpy()
+        target_ids = chunk[TARGET_ID].to_numpy()
+        distances = chunk[DISTANCE].to_numpy()
+
+        # The first row of every (time step, agent) group is the nearest target.
+        order = np.lexsort((distances, agent_ids, time_steps))
+        time_steps, agent_ids = time_steps[order], agent_ids[order]
+        target_ids, distances = target_ids[order], distances[order]
+        nearest = np.ones(len(order), dtype=bool)
+        nearest[1:] = (time_steps[1:] != time_steps[:-1]) | (
+            agent_ids[1:] != agent_ids[:-1]
+        )
+        time_steps, agent_ids = time_steps[nearest], agent_ids[nearest]
+        target_ids, distances = target_ids[nearest], distances[nearest]
+
+        # Compare every nearest target with the previous one of the same agent.
+        by_agent = np.lexsort((time_steps, agent_ids))
+        sorted_agents = agent_ids[by_agent]
+        sorted_targets = target_ids[by_agent]
+        previous_targets = np.empty_like(sorted_targets)
+        previous_targets[1:] = sorted_targets[:-1]
+        first_of_agent = np.ones(len(by_agent), dtype=bool)
+        first_of_agent[1:] = sorted_agents[1:] != sorted_agents[:-1]
+        previous_targets[first_of_agent] = self.state.lookup(
+            sorted_agents[first_of_agent]
+        )
+
+        last_of_agent = np.ones(len(by_agent), dtype=bool)
+        last_of_agent[:-1] = first_of_agent[1:]
+        self.state.update(sorted_agents[last_of_agent], sorted_targets[last_of_agent])
+
+        changed = np.empty(len(by_agent), dtype=bool)
+        changed[by_agent] = sorted_targets != previous_targets
+        return pa.Table.from_arrays(
+            [
+                time_steps[changed],
+                agent_ids[changed],
+                target_ids[changed],
+                distances[changed],
+            ],
+            schema=build_link_schema(),
+        )
+
+
+class LazyLinkTransitions:
+    def __init__(self, links_path: Path, transitions_file: Path) -> None:
+        """Extracts the same transitions as LinkTransitions with a Polars query.
+
+        Parameters
+        ----------
+        links_path : Path
+            The links dataset folder or file, sorted by time step.
+        transitions_file : Path
+            The output file with the rows where the nearest target changes.
+        """
+        self.links_path = links_path
+        self.transitions_file = transitions_file
+        self.transition_count = 0
+
+    def extract_transitions(self) -> int:
+        """Run the transitions as a lazy Polars query on every chunk of time steps.
+
+        The links are read in time order in chunks of whole time steps, and the
+        last target of every agent is carried from one chunk to the next, so the
+        memory does not grow with the length of the trace. The nearest target of
+        every agent and time step is the first row after a stable sort by
+        distance. A transition is a nearest target that differs from the
+        previous one of the same agent.
+        """
+        import polars as pl
+
+        logger.info("Extracting transitions from %s with Polars", self.links_path)
+        last_targets = pl.DataFrame(schema={AGENT_ID: pl.Int64, TARGET_ID: pl.Int64})
+        writer = pq.ParquetWriter(self.transitions_file, build_link_schema())
+        link_batches = iter_link_batches(
+            self.links_path, [TIME_STEP, AGENT_ID, TARGET_ID, DISTANCE]
+        )
+        for chunk in iter_time_step_chunks(link_batches):
+            nearest = (
+                pl.from_arrow(chunk)
+                .lazy()
+                .sort([TIME_STEP, AGENT_ID, DISTANCE], maintain_order=True)
+                .unique([TIME_STEP, AGENT_ID], keep="first", maintain_order=True)
+                .collect()
+            )
+            # The first target of an agent in the chunk follows its last one.
+            carried_target = pl.col(AGENT_ID).replace_strict(
+                last_targets[AGENT_ID],
+                last_targets[TARGET_ID],
+                default=NO_TARGET,
+                return_dtype=pl.Int64,
+            )
+            previous_target = (
+                pl.col(TARGET_ID).shift(1).over(AGENT_ID).fill_null(carried_target)
+            )
+            transitions = nearest.filter(pl.col(TARGET_ID) != previous_target)
+            if transitions.height > 0:
+                writer.write_table(transitions.to_arrow().cast(build_link_schema()))
+                self.transition_count += transitions.height
+            chunk_targets = nearest.group_by(AGENT_ID, maintain_order=True).agg(
+                pl.col(TARGET_ID).last()
+            )
+            last_targets = pl.concat([chunk_targets, last_targets]).unique(
+                AGENT_ID, keep="first"
+            )
+        writer.close()
+        return self.transition_count
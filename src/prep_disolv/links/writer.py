@@ -0,0 +1,91 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from prep_disolv.common.columns import AGENT_ID, DISTANCE, TARGET_ID, TIME_STEP
+from prep_disolv.common.memory import BatchSizer
+
+LINK_BATCH_SIZE = 100000
+# A buffered link takes 32 bytes, which are copied once more into the batch.
+LINK_ROW_BYTES = 64
+
+
+def build_link_schema() -> pa.Schema:
+    """Build the schema for the link data."""
+    return pa.schema(
+        [
+            pa.field(TIME_STEP, pa.int64()),
+            pa.field(AGENT_ID, pa.int64()),
+            pa.field(TARGET_ID, pa.int64()),
+            pa.field(DISTANCE, pa.float64()),
+        ]
+    )
+
+
+class LinkWriter:
+    def __init__(
+        self,
+        link_file: Path,
+        batch_size: int = LINK_BATCH_SIZE,
+        batch_sizer: BatchSizer | None = None,
+    ) -> None:
+        """Buffers the links of one type and writes them in batches.
+
+        A batch sizer, if given, replaces the fixed batch size and sizes every
+        batch to the memory budget of the writer.
+        """
+        self.link_file = link_file
+        self.batch_sizer = batch_sizer
+        self.batch_size = batch_size if batch_sizer is None else batch_sizer.rows
+        self.writer = pq.ParquetWriter(link_file, build_link_schema())
+        self.buffer: list[tuple[int, np.ndarray, np.ndarray, np.ndarray]] = []
+        self.buffered_rows = 0
+        self.link_count = 0
+
+    def add_links(
+        self,
+        time_step: int,
+        agent_ids: np.ndarray,
+        target_ids: np.ndarray,
+        distances: np.ndarray,
+    ) -> None:
+        """Add the links of a time step to the buffer."""
+        if len(agent_ids) == 0:
+            return
+        self.buffer.append((time_step, agent_ids, target_ids, distances))
+        self.buffered_rows += len(agent_ids)
+        self.link_count += len(agent_ids)
+        if self.buffered_rows >= self.batch_size:
+            self.flush()
+
+    def flush(self) -> None:
+        """Write the buffered links to the parquet file."""
+        if self.buffered_rows == 0:
+            return
+        time_steps = np.concatenate(
+            [np.full(len(item[1]), item[0], dtype=np.int64) for item in self.buffer]
+        )
+        link_table = pa.Table.from_arrays(
+            [
+                time_steps,
+                np.concatenate([item[1] for item in self.buffer]),
+                np.concatenate([item[2] for item in self.buffer]),
+                np.concatenate([item[3] for item in self.buffer]),
+            ],
+            schema=build_link_schema(),
+        )
+        self.writer.write_table(link_table)
+        if self.batch_sizer is not None:
+            self.batch_sizer.observe(link_table.num_rows, 2 * link_table.nbytes)
+            self.batch_size = self.batch_sizer.rows
+        self.buffer = []
+        self.buffered_rows = 0
+
+    def close(self) -> None:
+        """Flush the remaining links and close the parquet file."""
+        self.flush()
+        self.writer.close()
@@ -0,0 +1,316 @@
+from __future__ import annotations
+
+import logging
+from collections.abc import Iterable, Iterator
+from pathlib import Path
+
+import numpy as np
+import pyarrow.parquet as pq
+from tqdm import tqdm
+
+from prep_disolv.common.columns import AGENT_ID, COORD_X, COORD_Y, TIME_STEP
+from prep_disolv.common.coordinates import (
+    QUANTIZED_COLUMNS,
+    decode_positions,
+    read_resolution,
+)
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BINS = 1000
+DENSITY_BATCH_SIZE = 100000
+
+
+def column_range(parquet_file: pq.ParquetFile, column: str) -> tuple[float, float]:
+    """Get the range of a column from the row group statistics, or by reading it."""
+    metadata = parquet_file.metadata
+    column_index = parquet_file.schema_arrow.get_field_index(column)
+    # Fixed-point coordinates keep their statistics in the stored integers.
+    resolution = read_resolution(parquet_file.schema_arrow)
+    scale = resolution if resolution and column in QUANTIZED_COLUMNS else 1
+    minimums, maximums = [], []
+    for row_group in range(metadata.num_row_groups):
+        statistics = metadata.row_group(row_group).column(column_index).statistics
+        if statistics is None or not statistics.has_min_max:
+            break
+        minimums.append(statistics.min)
+        maximums.append(statistics.max)
+    else:
+        if minimums:
+            return min(minimums) * scale, max(maximums) * scale
+    logger.info("No statistics for %s, reading the column for its range", column)
+    low, high = np.inf, -np.inf
+    for batch in parquet_file.iter_batches(
+        batch_size=DENSITY_BATCH_SIZE, columns=[column]
+    ):
+        values = batch.column(0).to_numpy()
+        if len(values) > 0:
+            low, high = min(low, values.min()), max(high, values.max())
+    return low * scale, high * scale
+
+
+def read_marker_positions(position_file: Path | None) -> np.ndarray:
+    """Read the first x and y position of every agent of a small positions file."""
+    if position_file is None or not Path(position_file).exists():
+        return np.empty((0, 2))
+    positions = decode_positions(
+        pq.read_table(position_file, columns=[AGENT_ID, COORD_X, COORD_Y])
+    )
+    _, first_index = np.unique(positions[AGENT_ID].to_numpy(), return_index=True)
+    first_index = np.sort(first_index)
+    return np.column_stack(
+        [
+            positions[COORD_X].to_numpy()[first_index],
+            positions[COORD_Y].to_numpy()[first_index],
+        ]
+    )
+
+
+class DensityBinner:
+    def __init__(
+        self,
+        position_file: Path,
+        bins: int | tuple[int, int] = DEFAULT_BINS,
+        window: int | None = None,
+        bounds: tuple[float, float, float, float] | None = None,
+    ) -> None:
+        """Bins the positions of a parquet file into a 2D histogram per time window.
+
+        The positions are read one record batch at a time in the order of time,
+        and only the grid of the current time window is kept, so the memory
+        depends on the number of cells and not on the length of the trace.
+
+        Parameters
+        ----------
+        position_file : Path
+            The positions parquet file with time_step, x and y columns, sorted
+            by time step.
+        bins : int | tuple[int, int]
+            The number of cells along x and y.
+        window : int | None
+            The length of the time windows in milliseconds, the unit of the
+            time steps, or None for one grid.
+        bounds : tuple[float, float, float, float] | None
+            The x min, y min, x max and y max of the grid. The range of the
+            positions is read from the row group statistics when not given.
+        """
+        self.position_file = position_file
+        self.x_bins, self.y_bins = (bins, bins) if isinstance(bins, int) else bins
+        if self.x_bins < 1 or self.y_bins < 1:
+            msg = f"The number of bins must be positive, not {bins}."
+            logger.error(msg)
+            raise ValueError(msg)
+        if window is not None and window < 1:
+            msg = f"The time window must be positive, not {window}."
+            logger.error(msg)
+            raise ValueError(msg)
+        self.window = window
+        self.bounds = bounds
+        self.window_count = 1
+        self.max_count = 0
+
+    def iter_windows(self) -> Iterator[tuple[int, np.ndarray]]:
+        """Yield the start and the counts of every time window in the order of time.
+
+        The counts have the shape (y bins, x bins), so every grid can be drawn
+        as an image with its origin at the lower left. A window is yielded once
+        the positions pass its end, and the largest count of the yielded windows
+        is kept in max_count.
+
+        Raises
+        ------
+        ValueError
+            If there are no positions or they are not sorted by time step.
+        """
+        logger.info("Binning the positions of %s", self.position_file)
+        parquet_file = pq.ParquetFile(self.position_file, pre_buffer=False)
+        if parquet_file.metadata.num_rows == 0:
+            msg = f"There are no positions to bin in {self.position_file}."
+            logger.error(msg)
+            raise ValueError(msg)
+        if self.bounds is None:
+            x_min, x_max = column_range(parquet_file, COORD_X)
+            y_min, y_max = column_range(parquet_file, COORD_Y)
+            self.bounds = (x_min, y_min, x_max, y_max)
+        x_min, y_min, x_max, y_max = self.bounds
+        # A grid without extent still gets one cell for its positions.
+        x_scale = self.x_bins / (x_max - x_min) if x_max > x_min else 0.0
+        y_scale = self.y_bins / (y_max - y_min) if y_max > y_min else 0.0
+
+        time_min = 0
+        self.window_count = 1
+        if self.window is not None:
+            time_min, time_max = column_range(parquet_file, TIME_STEP)
+            self.window_count = int((time_max - time_min) // self.window) + 1
+        self.max_count = 0
+        cell_count = self.x_bins * self.y_bins
+        counts = np.zeros(cell_count, dtype=np.int64)
+        current_window = 0
+
+        columns = [COORD_X, COORD_Y]
+        if self.window is not None:
+            columns.append(TIME_STEP)
+        progress = tqdm(
+            total=parquet_file.metadata.num_rows,
+            unit="rows",
+            desc="Binning positions: ",
+            colour="green",
+            ncols=120,
+        )
+        resolution = read_resolution(parquet_file.schema_arrow)
+        for record_batch in parquet_file.iter_batches(
+            batch_size=DENSITY_BATCH_SIZE, columns=columns
+        ):
+            batch = decode_positions(record_batch, resolution)
+            x = batch.column(0).to_numpy()
+            y = batch.column(1).to_numpy()
+            x_index = np.floor((x - x_min) * x_scale).astype(np.int64)
+            y_index = np.floor((y - y_min) * y_scale).astype(np.int64)
+            # The upper bound belongs to the last cell.
+            x_index[x == x_max] = self.x_bins - 1
+            y_index[y == y_max] = self.y_bins - 1
+            inside = (
+                (x_index >= 0)
+                & (x_index < self.x_bins)
+                & (y_index >= 0)
+                & (y_index < self.y_bins)
+            )
+            windows = np.zeros(batch.num_rows, dtype=np.int64)
+            if self.window is not None:
+                windows = (batch.column(2).to_numpy() - time_min) // self.window
+            if len(windows) > 0 and (
+                windows[0] < current_window or np.any(np.diff(windows) < 0)
+            ):
+                msg = f"The positions of {self.position_file} are not sorted by time."
+                logger.error(msg)
+                raise ValueError(msg)
+            cells = (y_index * self.x_bins + x_index)[inside]
+            windows = windows[inside]
+            for window_index in np.unique(windows):
+                # The windows that the positions have passed are complete.
+                while current_window < window_index:
+                    window_start = self._window_start(current_window, time_min)
+                    yield window_start, self._grid(counts)
+                    counts = np.zeros(cell_count, dtype=np.int64)
+                    current_window += 1
+                first = np.searchsorted(windows, window_index, side="left")
+                last = np.searchsorted(windows, window_index, side="right")
+                window_cells = cells[first:last]
+                # Only the cells of the window are counted, not the whole grid.
+                low = window_cells.min()
+                counts[low : window_cells.max() + 1] += np.bincount(window_cells - low)
+            progress.update(batch.num_rows)
+        progress.close()
+
+        while current_window < self.window_count:
+            yield self._window_start(current_window, time_min), self._grid(counts)
+            counts = np.zeros(cell_count, dtype=np.int64)
+            current_window += 1
+
+    def _window_start(self, window_index: int, time_min: int) -> int:
+        """Get the first time step of a time window."""
+        return int(time_min + window_index * (self.window or 0))
+
+    def _grid(self, counts: np.ndarray) -> np.ndarray:
+        """Shape the counts of a window as a grid and update the largest count."""
+        self.max_count = max(self.max_count, int(counts.max()))
+        return counts.reshape(self.y_bins, self.x_bins)
+
+
+def render_density(
+    binner: DensityBinner,
+    output_file: Path,
+    rsu_positions: np.ndarray | None = None,
+    controller_positions: np.ndarray | None = None,
+) -> list[Path]:
+    """Draw every grid of the binned positions with the RSUs and controllers on top.
+
+    With time windows, a first pass over the positions finds the largest count
+    for the shared color scale, and the second pass draws every window as it is
+    binned.
+
+    Parameters
+    ----------
+    binner : DensityBinner
+        The binner of the positions.
+    output_file : Path
+        The image file. With more than one time window, every window is drawn
+        to a file with the start of the window added to the name.
+    rsu_positions : np.ndarray | None
+        The x and y positions of the RSUs.
+    controller_positions : np.ndarray | None
+        The x and y positions of the controllers.
+
+    Returns
+    -------
+    list[Path]
+        The image files.
+    """
+    try:
+        import matplotlib
+
+        matplotlib.use("Agg")
+        import matplotlib.pyplot as plt
+        from matplotlib.colors import LogNorm
+    except ImportError as error:
+        msg = "Plotting the density needs matplotlib, install prep-disolv[plot]."
+        logger.error(msg)
+        raise ImportError(msg) from error
+
+    if binner.window is None:
+        windows: Iterable[tuple[int, np.ndarray]] = list(binner.iter_windows())
+    else:
+        for _ in binner.iter_windows():
+            pass
+        windows = binner.iter_windows()
+    x_min, y_min, x_max, y_max = binner.bounds
+    # The same color scale for all windows keeps them comparable.
+    norm = LogNorm(vmin=1, vmax=max(binner.max_count, 1))
+    colormap = plt.get_cmap("viridis").copy()
+    colormap.set_bad("white")
+
+    image_files = []
+    for window_start, counts in windows:
+        image_file = output_file
+        if binner.window_count > 1:
+            image_file = output_file.with_name(
+                f"{output_file.stem}_{window_start}{output_file.suffix}"
+            )
+        figure, axes = plt.subplots(figsize=(10, 10))
+        image = axes.imshow(
+            np.ma.masked_equal(counts, 0),
+            extent=(x_min, x_max, y_min, y_max),
+            origin="lower",
+            cmap=colormap,
+            norm=norm,
+            interpolation="nearest",
+        )
+        figure.colorbar(image, ax=axes, label="positions per cell", shrink=0.8)
+        for positions, label, marker, color in (
+            (rsu_positions, "rsu", "*", "red"),
+            (controller_positions, "controller", "s", "black"),
+        ):
+            if positions is not None and len(positions) > 0:
+                axes.plot(
+                    positions[:, 0],
+                    positions[:, 1],
+                    label=label,
+                    linestyle=" ",
+                    marker=marker,
+                    markersize=10,
+                    color=color,
+                )
+        # Markers outside of the positions do not stretch the map.
+        axes.set_xlim(x_min, x_max)
+        axes.set_ylim(y_min, y_max)
+        if axes.get_legend_handles_labels()[0]:
+            axes.legend()
+        if binner.window_count > 1:
+            axes.set_title(f"time step {window_start}")
+        axes.set_xlabel(COORD_X)
+        axes.set_ylabel(COORD_Y)
+        figure.savefig(image_file, dpi=150, bbox_inches="tight")
+        plt.close(figure)
+        image_files.append(image_file)
+    logger.info("Drew %d density images to %s", len(image_files), output_file.parent)
+    return image_files
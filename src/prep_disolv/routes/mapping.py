@@ -0,0 +1,76 @@
+from __future__ import annotations
+
+import logging
+from pathlib import Path
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from prep_disolv.common.columns import AGENT_ID, ORIGINAL_ID
+
+logger = logging.getLogger(__name__)
+
+MAPPING_BATCH_SIZE = 100000
+
+
+def build_id_mapping_schema() -> pa.Schema:
+    """Build the schema of the mapping from the original to the new vehicle IDs."""
+    return pa.schema(
+        [
+            pa.field(ORIGINAL_ID, pa.string()),
+            pa.field(AGENT_ID, pa.int64()),
+        ]
+    )
+
+
+class IdMappingWriter:
+    def __init__(
+        self, mapping_file: Path, batch_size: int = MAPPING_BATCH_SIZE
+    ) -> None:
+        """Buffers the renumbered vehicle IDs and writes them in batches."""
+        self.mapping_file = mapping_file
+        self.batch_size = batch_size
+        self.writer = pq.ParquetWriter(mapping_file, build_id_mapping_schema())
+        self.original_ids: list[str] = []
+        self.agent_ids: list[int] = []
+        self.id_count = 0
+
+    def add(self, original_id: str, agent_id: int) -> None:
+        """Add the new ID of a vehicle."""
+        self.original_ids.append(original_id)
+        self.agent_ids.append(agent_id)
+        self.id_count += 1
+        if len(self.agent_ids) >= self.batch_size:
+            self.flush()
+
+    def flush(self) -> None:
+        """Write the buffered IDs to the parquet file."""
+        if not self.agent_ids:
+            return
+        mapping_table = pa.Table.from_arrays(
+            [
+                pa.array(self.original_ids, pa.string()),
+                pa.array(self.agent_ids, pa.int64()),
+            ],
+            schema=build_id_mapping_schema(),
+        )
+        self.writer.write_table(mapping_table)
+        self.original_ids = []
+        self.agent_ids = []
+
+    def close(self) -> None:
+        """Flush the remaining IDs and close the parquet file."""
+        self.flush()
+        self.writer.close()
+
+
+def read_id_mapping(mapping_file: Path) -> dict[str, int]:
+    """Read the mapping from the original to the new vehicle IDs."""
+    logger.info("Reading the vehicle ID mapping from %s", mapping_file)
+    mapping_table = pq.read_table(mapping_file, columns=[ORIGINAL_ID, AGENT_ID])
+    original_ids = mapping_table[ORIGINAL_ID].to_pylist()
+    if len(set(original_ids)) != len(original_ids):
+        msg = f"The vehicle ID mapping {mapping_file} has duplicate original IDs."
+        logger.error(msg)
+        raise ValueError(msg)
+    return dict(zip(original_ids, mapping_table[AGENT_ID].to_pylist(), strict=True))
@@ -0,0 +1,63 @@
+from __future__ import annotations
+
+import logging
+from pathlib import Path
+
+from prep_disolv.routes.mapping import IdMappingWriter
+from prep_disolv.routes.stream import VEHICLE_ID, VEHICLE_TAGS, RouteReader, RouteWriter
+
+logger = logging.getLogger(__name__)
+
+
+class RouteIdNormalizer:
+    def __init__(
+        self,
+        route_file: Path,
+        output_file: Path,
+        mapping_file: Path,
+        id_init: int = 0,
+    ) -> None:
+        """Renumbers the vehicles of a route file and stores the ID mapping.
+
+        The route file is streamed, so the memory stays constant on any file
+        size. The mapping file can be given to the FCD conversion as
+        [traffic] id_mapping, which then uses the same IDs for the vehicles.
+
+        Parameters
+        ----------
+        route_file : Path
+            The SUMO route file to renumber.
+        output_file : Path
+            The route file with the renumbered vehicles.
+        mapping_file : Path
+            The parquet file with the original and the new ID of every vehicle.
+        id_init : int
+            The ID of the first vehicle.
+        """
+        self.route_file = route_file
+        self.output_file = output_file
+        self.mapping_file = mapping_file
+        self.id_init = id_init
+
+    def normalize(self) -> int:
+        """Write the renumbered route file and get the number of vehicles."""
+        logger.info("Renumbering the vehicles in %s", self.route_file)
+        reader = RouteReader(self.route_file)
+        mapping_writer = IdMappingWriter(self.mapping_file)
+        vehicle_id = self.id_init
+        with self.output_file.open("w", encoding="utf-8") as output, RouteWriter(
+            output, reader.root
+        ) as writer:
+            for element in reader:
+                if element.tag in VEHICLE_TAGS:
+                    mapping_writer.add(element.get(VEHICLE_ID), vehicle_id)
+                    element.set(VEHICLE_ID, str(vehicle_id))
+                    vehicle_id += 1
+                writer.write(element)
+        mapping_writer.close()
+        logger.info(
+            "Renumbered %d vehicles, the mapping is in %s",
+            mapping_writer.id_count,
+            self.mapping_file,
+        )
+        return mapping_writer.id_count
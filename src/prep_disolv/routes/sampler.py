@@ -0,0 +1,162 @@
+from __future__ import annotations
+
+import hashlib
+import logging
+import xml.etree.ElementTree as Et
+from pathlib import Path
+
+from prep_disolv.routes.mapping import IdMappingWriter
+from prep_disolv.routes.stream import (
+    DEPART,
+    VEHICLE_ID,
+    VEHICLE_TAGS,
+    RouteReader,
+    RouteWriter,
+)
+
+logger = logging.getLogger(__name__)
+
+# The length of the departure buckets in seconds.
+DEFAULT_BUCKET_SIZE = 10.0
+
+
+def selection_key(seed: int, vehicle_id: str) -> int:
+    """Get the seeded hash of a vehicle ID, which orders the vehicles to sample."""
+    digest = hashlib.blake2b(
+        vehicle_id.encode(), digest_size=8, key=str(seed).encode()
+    ).digest()
+    return int.from_bytes(digest, "big")
+
+
+def departure_bucket(depart: str, bucket_size: float) -> float | str:
+    """Get the departure bucket of a vehicle, or the depart value if not a time."""
+    try:
+        return int(float(depart) / bucket_size) * bucket_size
+    except ValueError:
+        return depart
+
+
+class RouteSampler:
+    def __init__(
+        self,
+        route_file: Path,
+        output_file: Path,
+        factor: float,
+        seed: int = 0,
+        bucket_size: float = DEFAULT_BUCKET_SIZE,
+        renumber: bool = True,
+        mapping_file: Path | None = None,
+    ) -> None:
+        """Samples a share of the vehicles of every departure bucket of a route file.
+
+        The route file is read in one pass. SUMO route files are sorted by
+        departure, so only the elements of the current departure bucket are held
+        in memory. A bucket of n vehicles keeps the int(n * factor) vehicles with
+        the smallest seeded hash of their ID, so the sample only depends on the
+        seed and the vehicles, and a smaller factor keeps a subset of the
+        vehicles of a larger one.
+
+        Parameters
+        ----------
+        route_file : Path
+            The SUMO route file to sample.
+        output_file : Path
+            The route file with the sampled vehicles.
+        factor : float
+            The share of the vehicles to keep, between 0 and 1.
+        seed : int
+            The seed of the vehicle hashes.
+        bucket_size : float
+            The length of the departure buckets in seconds.
+        renumber : bool
+            Whether the sampled vehicles get the IDs 0, 1, 2... in file order.
+        mapping_file : Path | None
+            The optional parquet file with the original and the new ID of every
+            sampled vehicle, when they are renumbered.
+        """
+        if not 0 <= factor <= 1:
+            msg = f"The sampling factor must be between 0 and 1, not {factor}."
+            logger.error(msg)
+            raise ValueError(msg)
+        self.route_file = route_file
+        self.output_file = output_file
+        self.factor = factor
+        self.seed = seed
+        self.bucket_size = bucket_size
+        self.renumber = renumber
+        self.mapping_file = mapping_file
+        self.mapping_writer: IdMappingWriter | None = None
+        self.vehicle_count = 0
+        self.sampled_count = 0
+        self.bucket_count = 0
+
+    def sample(self) -> int:
+        """Write the sampled route file and get the number of sampled vehicles."""
+        logger.info("Sampling %s of the vehicles in %s", self.factor, self.route_file)
+        reader = RouteReader(self.route_file)
+        pending: list[Et.Element] = []
+        pending_bucket = None
+        closed_buckets = set()
+        if self.renumber and self.mapping_file is not None:
+            self.mapping_writer = IdMappingWriter(self.mapping_file)
+        with self.output_file.open("w", encoding="utf-8") as output, RouteWriter(
+            output, reader.root
+        ) as writer:
+            for element in reader:
+                if element.tag not in VEHICLE_TAGS:
+                    # Other elements keep their place between the vehicles.
+                    if pending:
+                        pending.append(element)
+                    else:
+                        writer.write(element)
+                    continue
+
+                bucket = departure_bucket(element.get(DEPART, ""), self.bucket_size)
+                if pending and bucket != pending_bucket:
+                    self._write_bucket(writer, pending)
+                    closed_buckets.add(pending_bucket)
+                    pending = []
+                    if bucket in closed_buckets:
+                        logger.warning(
+                            "%s is not sorted by departure, bucket %s is sampled "
+                            "in parts",
+                            self.route_file,
+                            bucket,
+                        )
+                pending_bucket = bucket
+                pending.append(element)
+            self._write_bucket(writer, pending)
+        if self.mapping_writer is not None:
+            self.mapping_writer.close()
+
+        logger.info(
+            "Sampled %d of %d vehicles over %d departure buckets",
+            self.sampled_count,
+            self.vehicle_count,
+            self.bucket_count,
+        )
+        return self.sampled_count
+
+    def _write_bucket(self, writer: RouteWriter, elements: list[Et.Element]) -> None:
+        """Write the sampled vehicles of a bucket and the elements between them."""
+        vehicles = [element for element in elements if element.tag in VEHICLE_TAGS]
+        sample_size = int(len(vehicles) * self.factor)
+        sampled = sorted(
+            vehicles,
+            key=lambda vehicle: selection_key(self.seed, vehicle.get(VEHICLE_ID, "")),
+        )[:sample_size]
+        sampled_ids = {id(vehicle) for vehicle in sampled}
+        for element in elements:
+            if element.tag in VEHICLE_TAGS:
+                if id(element) not in sampled_ids:
+                    continue
+                if self.renumber:
+                    if self.mapping_writer is not None:
+                        self.mapping_writer.add(
+                            element.get(VEHICLE_ID), self.sampled_count
+                        )
+                    element.set(VEHICLE_ID, str(self.sampled_count))
+                self.sampled_count += 1
+            writer.write(element)
+        self.vehicle_count += len(vehicles)
+        self.bucket_count += 1 if vehicles else 0
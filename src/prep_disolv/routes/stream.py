@@ -0,0 +1,113 @@
+from __future__ import annotations
+
+import logging
+import xml.etree.ElementTree as Et
+from collections.abc import Iterator
+from pathlib import Path
+from types import TracebackType
+from typing import Self, TextIO
+from xml.sax.saxutils import quoteattr
+
+logger = logging.getLogger(__name__)
+
+# The elements of a route file that define one vehicle each.
+VEHICLE_TAGS = ("vehicle", "trip")
+VEHICLE_ID = "id"
+DEPART = "depart"
+
+
+class RouteRoot:
+    def __init__(
+        self, tag: str, attrib: dict[str, str], namespaces: dict[str, str]
+    ) -> None:
+        """The root element of a route file and the namespaces it declares."""
+        self.tag = tag
+        self.attrib = attrib
+        self.namespaces = namespaces
+
+    def start_tag(self) -> str:
+        """Get the start tag of the root with its attributes and namespaces."""
+        prefixes = {uri: prefix for prefix, uri in self.namespaces.items()}
+        parts = [self.tag]
+        for prefix, uri in self.namespaces.items():
+            name = f"xmlns:{prefix}" if prefix else "xmlns"
+            parts.append(f"{name}={quoteattr(uri)}")
+        for name, value in self.attrib.items():
+            attribute = name
+            if name.startswith("{"):
+                uri, local_name = name[1:].split("}", 1)
+                attribute = f"{prefixes[uri]}:{local_name}"
+            parts.append(f"{attribute}={quoteattr(value)}")
+        return f"<{' '.join(parts)}>"
+
+
+class RouteReader:
+    def __init__(self, route_file: Path) -> None:
+        """Reads the top level elements of a route file one at a time.
+
+        Every element is dropped from the parsed tree once the next one is read,
+        so the memory does not grow with the size of the route file.
+        """
+        self.route_file = route_file
+        self.root = self._read_root()
+
+    def _read_root(self) -> RouteRoot:
+        """Read the root element and its namespaces without reading further."""
+        namespaces: dict[str, str] = {}
+        with Path(self.route_file).open("rb") as route_source:
+            for event, item in Et.iterparse(route_source, events=("start-ns", "start")):
+                if event == "start-ns":
+                    prefix, uri = item
+                    namespaces[prefix] = uri
+                    # Keep the prefixes of the input when the elements are written.
+                    Et.register_namespace(prefix, uri)
+                else:
+                    return RouteRoot(item.tag, dict(item.attrib), namespaces)
+        msg = f"Could not find the root element of {self.route_file}."
+        logger.error(msg)
+        raise ValueError(msg)
+
+    def __iter__(self) -> Iterator[Et.Element]:
+        root = None
+        depth = 0
+        for event, element in Et.iterparse(
+            str(self.route_file), events=("start", "end")
+        ):
+            if event == "start":
+                root = element if root is None else root
+                depth += 1
+                continue
+            depth -= 1
+            if depth == 1:
+                yield element
+                root.remove(element)
+
+
+class RouteWriter:
+    def __init__(self, output: TextIO, root: RouteRoot) -> None:
+        """Writes the elements of a route file to an open text file as they are read."""
+        self.output = output
+        self.output.write('<?xml version="1.0" encoding="UTF-8"?>\n\n')
+        self.output.write(f"{root.start_tag()}\n")
+        self.root_tag = root.tag
+        self.element_count = 0
+
+    def write(self, element: Et.Element) -> None:
+        """Write a top level element with the whitespace that follows it."""
+        self.output.write(Et.tostring(element, encoding="unicode"))
+        self.element_count += 1
+
+    def close(self) -> None:
+        """Close the root element, the caller closes the file."""
+        self.output.write(f"\n</{self.root_tag}>\n")
+
+    def __enter__(self) -> Self:
+        return self
+
+    def __exit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc_value: BaseException | None,
+        traceback: TracebackType | None,
+    ) -> None:
+        self.close()
@@ -27,6 +27,8 @@ class InputPlacement:
         self.end_time = config.get(SIMULATION_SETTINGS)[DURATION]
         self.rsu_file = self.output_path / POSITIONS_FOLDER / config.get(RSU_SETTINGS)[RSU_FILENAME]
         self.rsu_count = 0
+        # The given RSUs keep their own IDs as ns-3 IDs.
+        self.ns3_id_init = 0
         self.parquet_file = (
             self.output_path / POSITIONS_FOLDER / self.rsu_file
         )
@@ -40,10 +42,16 @@ class InputPlacement:
         """Get the parquet file."""
         return self.parquet_file
 
-    def create_rsu_data(self) -> None:
-        """Create the RSU data."""
+    def read_rsu_data(self) -> None:
+        """Read the given RSU data."""
+        self.rsu_data = []
         self._read_given_rsu_data()
         self.rsu_count = len(self.rsu_data)
+
+    def create_rsu_data(self) -> None:
+        """Create the RSU data."""
+        if not self.rsu_data:
+            self.read_rsu_data()
         self._write_activation_data()
 
     def _read_given_rsu_data(self) -> None:
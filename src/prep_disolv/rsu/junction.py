@@ -1,6 +1,7 @@
 from __future__ import annotations
 
 import xml.etree.ElementTree as Et
+from functools import lru_cache
 from pathlib import Path
 from pyproj import Transformer
 
@@ -15,20 +16,28 @@ from prep_disolv.common.columns import (
     COORD_X,
     COORD_Y,
 )
+from prep_disolv.common.activations import write_activations_polars
 from prep_disolv.common.utils import get_offsets, get_projection
 from prep_disolv.common.config import ID_INIT, NETWORK_FILE, START_TIME, \
-    RSU_SETTINGS, TRAFFIC_SETTINGS, SIMULATION_SETTINGS, Config, DURATION
+    RSU_SETTINGS, TRAFFIC_SETTINGS, SIMULATION_SETTINGS, Config, DURATION, \
+    ARROW_ENGINE, ENGINE, EXECUTION_SETTINGS, POLARS_ENGINE
 
 JUNCTION = "junction"
 
 
-def get_lat_lon(coord_x: str, coord_y: str, sumo_net: Path) -> tuple[float, float]:
-    """Get the latitude and longitude from the coordinates."""
+@lru_cache(maxsize=16)
+def _get_transformer(sumo_net: Path) -> Transformer:
+    """Get the transformer from the network projection to latitude and longitude."""
     from_proj = get_projection(sumo_net)
-    transformer = Transformer.from_crs(
+    return Transformer.from_crs(
         crs_from=from_proj,
         crs_to="epsg:4326",
     )
+
+
+def get_lat_lon(coord_x: str, coord_y: str, sumo_net: Path) -> tuple[float, float]:
+    """Get the latitude and longitude from the coordinates."""
+    transformer = _get_transformer(sumo_net)
     return transformer.transform(float(coord_x), float(coord_y))
 
 
@@ -80,17 +89,26 @@ class JunctionPlacement:
         self.id_init = config.get(RSU_SETTINGS)[ID_INIT]
         self.ns3_id_init = ns3_id_init
         self.sumo_net = self.config_path / config.get(TRAFFIC_SETTINGS)[NETWORK_FILE]
+        self.engine = (config.get(EXECUTION_SETTINGS) or {}).get(ENGINE, ARROW_ENGINE)
         self.rsu_count = 0
+        self.junctions: list[JunctionData] | None = None
         self.parquet_file = (
             self.output_path / POSITIONS_FOLDER / "roadside_units.parquet"
         )
 
+    def read_rsu_data(self) -> None:
+        """Read the junctions from the network, independent of the ns-3 IDs."""
+        self.junctions = self._get_junctions()
+        self.rsu_count = len(self.junctions)
+
     def create_rsu_data(self) -> None:
         """Create the RSU data."""
-        junctions = self._get_junctions()
-        self.rsu_count = len(junctions)
-        self._write_activation_data(junctions)
-        self._write_rsu_data(junctions)
+        if self.junctions is None:
+            self.read_rsu_data()
+        for ns3_id, junction in enumerate(self.junctions, start=self.ns3_id_init):
+            junction.ns3_id = ns3_id
+        self._write_activation_data(self.junctions)
+        self._write_rsu_data(self.junctions)
 
     def get_unique_rsu_count(self) -> int:
         """Get the unique RSU count."""
@@ -112,6 +130,16 @@ class JunctionPlacement:
         activation_file = (
                 self.output_path / ACTIVATIONS_FOLDER / "rsu_activations.parquet"
         )
+        if self.engine == POLARS_ENGINE:
+            write_activations_polars(
+                activation_file,
+                [junction.id for junction in activations],
+                [junction.ns3_id for junction in activations],
+                [[junction.start_times] for junction in activations],
+                [[junction.end_times] for junction in activations],
+            )
+            return
+
         activation_df = pd.DataFrame(columns=ACTIVATION_COLUMNS)
         for junction in activations:
             # replace with len(junction.start_times) if multiple times are needed
@@ -171,9 +199,7 @@ class JunctionPlacement:
                 x = float(item.attrib[COORD_X]) - offset_x
                 y = float(item.attrib[COORD_Y]) - offset_y
                 lat, lon = get_lat_lon(x, y, self.sumo_net)
-                junctions.append(
-                    JunctionData(junction_id, self.ns3_id_init, x, y, lat, lon)
-                )
+                # The ns-3 IDs are assigned once the ID offset is known.
+                junctions.append(JunctionData(junction_id, -1, x, y, lat, lon))
                 junction_count += 1
-                self.ns3_id_init += 1
         return junctions
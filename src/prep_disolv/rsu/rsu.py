@@ -17,28 +17,32 @@ class RsuConverter:
         self.config = config
         self.rsu_file = None
         self.rsu_count = 0
+        self.rsu_placement: JunctionPlacement | InputPlacement | None = None
 
-    def create_rsu(self, rsu_id_init: int) -> int:
-        """Create the RSU data."""
+    def prepare_rsu(self) -> int:
+        """Read the RSU locations, which does not depend on the ID offset."""
         output_path = self.config.path / self.config.get(OUTPUT_SETTINGS)[OUTPUT_PATH]
         if self.config.get(RSU_SETTINGS) is not None:
             rsu_placement_type = self.config.get(RSU_SETTINGS)[PLACEMENT]
             if rsu_placement_type == "junction":
-                rsu_placement = JunctionPlacement(
-                    self.config,
-                    output_path,
-                    rsu_id_init,
-                )
-                rsu_placement.create_rsu_data()
-                self.rsu_count = rsu_placement.get_unique_rsu_count()
-                self.rsu_file = rsu_placement.get_parquet_file()
-                return self.rsu_count
-
+                self.rsu_placement = JunctionPlacement(self.config, output_path, 0)
             if rsu_placement_type == "given":
-                rsu_placement = InputPlacement(self.config, output_path)
-                rsu_placement.create_rsu_data()
-                self.rsu_count = rsu_placement.get_unique_rsu_count()
-                self.rsu_file = rsu_placement.get_parquet_file()
-                return self.rsu_count
+                self.rsu_placement = InputPlacement(self.config, output_path)
+
+        if self.rsu_placement is not None:
+            self.rsu_placement.read_rsu_data()
+            self.rsu_count = self.rsu_placement.get_unique_rsu_count()
+        return self.rsu_count
+
+    def create_rsu(self, rsu_id_init: int) -> int:
+        """Create the RSU data."""
+        if self.rsu_placement is None:
+            self.prepare_rsu()
+        if self.rsu_placement is None:
+            return 0
 
-        return 0
+        self.rsu_placement.ns3_id_init = rsu_id_init
+        self.rsu_placement.create_rsu_data()
+        self.rsu_count = self.rsu_placement.get_unique_rsu_count()
+        self.rsu_file = self.rsu_placement.get_parquet_file()
+        return self.rsu_count
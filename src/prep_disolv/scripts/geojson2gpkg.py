@@ -1,17 +1,31 @@
-# This script takes geojson files as input and converts them to gpkg files.
+# Convert a GeoJSON file to a GeoPackage or GeoParquet in chunks.
+# Usage: python geojson2gpkg.py --input <file.geojson> --output <folder>
+#        [--format gpkg|geoparquet] [--chunk-size 65536]
 
 import argparse
-import geopandas as gpd
+import logging
+from pathlib import Path
+
+from prep_disolv.export.features import FEATURE_CHUNK_SIZE, FeatureConverter
+from prep_disolv.export.geometry import GEOPARQUET_FORMAT, GPKG_FORMAT
 
 if __name__ == "__main__":
     args = argparse.ArgumentParser()
     args.add_argument("--input", type=str, required=True)
     args.add_argument("--output", type=str, required=True)
+    args.add_argument(
+        "--format", choices=[GEOPARQUET_FORMAT, GPKG_FORMAT], default=GPKG_FORMAT
+    )
+    args.add_argument("--chunk-size", type=int, default=FEATURE_CHUNK_SIZE)
+    arguments = args.parse_args()
+    logging.basicConfig(level=logging.INFO)
 
-    input_file = args.parse_args().input
-    output_file = args.parse_args().output
-
-    print("Reading geojson file from", input_file)
-    gdf = gpd.read_file(input_file)
-    print("Writing gpkg file to", output_file)
-    gdf.to_file(output_file, driver="GPKG", layer="edges")
+    print("Reading geojson file from", arguments.input)
+    converter = FeatureConverter(
+        Path(arguments.input),
+        Path(arguments.output),
+        arguments.format,
+        chunk_size=arguments.chunk_size,
+    )
+    converter.convert()
+    print("Wrote", converter.counts, "to", converter.output_files)
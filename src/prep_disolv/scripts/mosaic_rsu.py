@@ -1,62 +1,42 @@
-# Generate json file with RSU positions for MOSAIC simulator.
+# Generate the MOSAIC mapping_config.json of a converted prep-disolv scenario.
+# Usage: python mosaic_rsu.py --config <config.toml> [--output <mapping_config.json>]
+# The [mosaic] section of the config sets the vehicle class and the applications.
+
 import argparse
+import logging
 from pathlib import Path
-import json
-
-import pandas as pd
-
-
-def generate_rsu_json(disolv_scenario: str, mosaic_scenario: str) -> None:
-    """Generate the json file with RSU positions."""
-    rsu_file = Path(
-        "/mnt/hdd/workspace/disolv/input/"
-        + disolv_scenario
-        + "/positions/roadside_units.parquet"
-    )
-    rsu_df = pd.read_parquet(rsu_file)
-    json_file = Path(
-        "/home/charan/intellij/eclipse-mosaic-23.1/scenarios/"
-        + mosaic_scenario
-        + "/mapping/mapping_config.json"
-    )
-
-    out_data = {
-        "config": {"fixed_order": True},
-        "prototypes": [
-            {
-                "name": "DEFAULT_VEHTYPE",
-                "vehicleClass": "Car",
-                "applications": ["org.pavenet.app.Vehicle"],
-            }
-        ],
-        "servers": [
-            {
-                "name": "Controller",
-                "group": "CentralController",
-                "applications": ["org.pavenet.app.Controller"],
-            }
-        ],
-        "rsus": [],
-    }
-
-    for index, row in rsu_df.iterrows():
-        out_data["rsus"].append(
-            {
-                "name": "RSU",
-                "position": {"latitude": row["lat"], "longitude": row["lon"]},
-                "applications": ["org.pavenet.app.RoadSideUnit"],
-            }
-        )
-
-    with open(json_file, "w") as f:
-        json.dump(out_data, f, indent=4)
 
+from prep_disolv.common.columns import POSITIONS_FOLDER
+from prep_disolv.common.config import (
+    MOSAIC_SETTINGS,
+    OUTPUT_PATH,
+    OUTPUT_SETTINGS,
+    TRAFFIC_SETTINGS,
+    Config,
+    trace_stem,
+)
+from prep_disolv.export.mosaic import MosaicExporter
 
 if __name__ == "__main__":
     args = argparse.ArgumentParser()
-    args.add_argument("--disolv", type=str, required=True)
-    args.add_argument("--mosaic", type=str, required=True)
-    d = args.parse_args().disolv
-    m = args.parse_args().mosaic
-
-    generate_rsu_json(d, m)
+    args.add_argument("--config", type=str, required=True)
+    args.add_argument("--output", type=str, default=None)
+    arguments = args.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    config = Config(arguments.config, create_folders=False)
+    mosaic_settings = config.settings.setdefault(MOSAIC_SETTINGS, {})
+    if arguments.output is not None:
+        mosaic_settings[OUTPUT_PATH] = str(Path(arguments.output).absolute())
+    mosaic_settings.setdefault(OUTPUT_PATH, "mapping/mapping_config.json")
+
+    positions = (
+        config.path / config.get(OUTPUT_SETTINGS)[OUTPUT_PATH] / POSITIONS_FOLDER
+    )
+    exporter = MosaicExporter(config)
+    exporter.export(
+        positions / f"{trace_stem(config.get(TRAFFIC_SETTINGS))}.parquet",
+        positions / "roadside_units.parquet",
+        positions / "controllers.parquet",
+    )
+    print("Wrote", exporter.counts, "to", exporter.mapping_file)
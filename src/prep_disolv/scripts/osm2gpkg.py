@@ -1,15 +1,35 @@
-# Run this with conda environment "osmnx" activated
+# Convert an OSM XML or PBF extract to a GeoPackage or GeoParquet in chunks.
+# Usage: python osm2gpkg.py --input <file.osm> --output <folder>
+#        [--format gpkg|geoparquet] [--layers points lines] [--chunk-size 65536]
+# The layers are the GDAL OSM layers: points, lines, multilinestrings,
+# multipolygons and other_relations.
 
-import osmnx as ox
+import argparse
+import logging
 from pathlib import Path
-import geopandas as gpd
 
-# Read in the OSM data
-osm_file = Path("/mnt/hdd/workspace/pavenet/raw/lehen.osm")
-osm_graph = ox.graph_from_xml(
-    osm_file, simplify=True, retain_all=True, bidirectional=False
-)
+from prep_disolv.export.features import FEATURE_CHUNK_SIZE, FeatureConverter
+from prep_disolv.export.geometry import GEOPARQUET_FORMAT, GPKG_FORMAT
 
-# Convert to GeoDataFrame
-osm_gpkg_file = Path("/mnt/hdd/workspace/pavenet/output/lehen/lehen_graph.gpkg")
-ox.save_graph_geopackage(osm_graph, filepath=osm_gpkg_file)
+if __name__ == "__main__":
+    args = argparse.ArgumentParser()
+    args.add_argument("--input", type=str, required=True)
+    args.add_argument("--output", type=str, required=True)
+    args.add_argument(
+        "--format", choices=[GEOPARQUET_FORMAT, GPKG_FORMAT], default=GPKG_FORMAT
+    )
+    args.add_argument("--layers", type=str, nargs="+", default=["points", "lines"])
+    args.add_argument("--chunk-size", type=int, default=FEATURE_CHUNK_SIZE)
+    arguments = args.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    print("Reading osm file from", arguments.input)
+    converter = FeatureConverter(
+        Path(arguments.input),
+        Path(arguments.output),
+        arguments.format,
+        arguments.layers,
+        arguments.chunk_size,
+    )
+    converter.convert()
+    print("Wrote", converter.counts, "to", converter.output_files)
@@ -1,17 +1,35 @@
-import pandas as pd
-import matplotlib.pyplot as plt
+# Draw the density of the positions with the RSUs and controllers on top.
+# Usage: python plot_rsu_fcd.py --positions <positions.parquet> --output <image.png>
+#        [--rsus <roadside_units.parquet>] [--controllers <controllers.parquet>]
+#        [--bins 1000] [--window <milliseconds>]
 
+import argparse
+import logging
+from pathlib import Path
 
-rsu_file = "/Users/charan/workspace/disolv/input/koln/positions/picked_locations_garsud.parquet"
-fcd_file = "/Users/charan/workspace/disolv/input/koln/positions/koln_fcd.parquet"
+from prep_disolv.plot.density import (
+    DEFAULT_BINS,
+    DensityBinner,
+    read_marker_positions,
+    render_density,
+)
 
-# Read the data to a dataframe
-rsu_df = pd.read_parquet(rsu_file)
-fcd_df = pd.read_parquet(fcd_file)
+if __name__ == "__main__":
+    args = argparse.ArgumentParser()
+    args.add_argument("--positions", type=str, required=True)
+    args.add_argument("--output", type=str, required=True)
+    args.add_argument("--rsus", type=str, default=None)
+    args.add_argument("--controllers", type=str, default=None)
+    args.add_argument("--bins", type=int, default=DEFAULT_BINS)
+    args.add_argument("--window", type=int, default=None)
+    arguments = args.parse_args()
+    logging.basicConfig(level=logging.INFO)
 
-# Plot the dataframe x and y
-plt.plot(rsu_df["x"], rsu_df["y"], label="rsu", linestyle=" ", marker="*", markersize=10, color="red")
-plt.plot(fcd_df["x"], fcd_df["y"], label="fcd", linestyle=" ", marker="o", markersize=0.5, color="gray")
-plt.legend()
-plt.savefig("/Users/charan/workspace/disolv/output/koln/rsu_fcd.png")
-plt.close()
\ No newline at end of file
+    binner = DensityBinner(Path(arguments.positions), arguments.bins, arguments.window)
+    image_files = render_density(
+        binner,
+        Path(arguments.output),
+        read_marker_positions(arguments.rsus),
+        read_marker_positions(arguments.controllers),
+    )
+    print("Wrote", len(image_files), "images to", Path(arguments.output).parent)
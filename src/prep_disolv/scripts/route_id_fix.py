@@ -1,24 +1,32 @@
 # Route ID fix for SUMO route files if the route IDs are not in integer format.
 # Usage: python route_id_fix.py --inputxml <input_file> --outputxml <output_file>
-
-import xml.etree.ElementTree as et
+# The original and new IDs are written to --mapping, which can be given to the
+# FCD conversion as [traffic] id_mapping.
 
 import argparse
+import logging
+from pathlib import Path
+
+from prep_disolv.routes.normalizer import RouteIdNormalizer
 
 if __name__ == "__main__":
     args = argparse.ArgumentParser()
     args.add_argument("--inputxml", type=str, required=True)
     args.add_argument("--outputxml", type=str, required=True)
+    args.add_argument("--mapping", type=str, default=None)
+    args.add_argument("--id-init", type=int, default=0)
+    arguments = args.parse_args()
+    logging.basicConfig(level=logging.INFO)
 
-    input_file = args.parse_args().inputxml
-    output_file = args.parse_args().outputxml
-
-    print("Reading XML file ", input_file)
-    tree = et.parse(input_file)
-    root = tree.getroot()
-    veh_id = 0
-    for child in root:
-        if child.tag == "vehicle":
-            child.attrib["id"] = str(veh_id)
-            veh_id += 1
-    tree.write(output_file)
+    output_file = Path(arguments.outputxml)
+    mapping_file = (
+        Path(arguments.mapping)
+        if arguments.mapping is not None
+        else output_file.with_name(output_file.name.split(".")[0] + "_ids.parquet")
+    )
+    print("Reading XML file ", arguments.inputxml)
+    normalizer = RouteIdNormalizer(
+        Path(arguments.inputxml), output_file, mapping_file, arguments.id_init
+    )
+    normalizer.normalize()
+    print("Wrote the ID mapping to", mapping_file)
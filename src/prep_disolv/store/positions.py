@@ -0,0 +1,319 @@
+from __future__ import annotations
+
+import logging
+from pathlib import Path
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+from prep_disolv.common.columns import (
+    AGENT_ID,
+    COORD_X,
+    COORD_Y,
+    POSITIONS_FOLDER,
+    TIME_STEP,
+)
+from prep_disolv.common.config import (
+    OUTPUT_PATH,
+    OUTPUT_SETTINGS,
+    PLACEMENT,
+    RSU_FILENAME,
+    RSU_SETTINGS,
+    TRAFFIC_SETTINGS,
+    Config,
+    trace_stem,
+)
+from prep_disolv.common.coordinates import (
+    QUANTIZED_COLUMNS,
+    decode_positions,
+    read_resolution,
+)
+from prep_disolv.store.trajectories import ROW_COUNT, ROW_START, agent_major_files
+
+logger = logging.getLogger(__name__)
+
+# The agents whose positions a scenario can hold.
+VEHICLE_POSITIONS = "vehicles"
+RSU_POSITIONS = "rsus"
+CONTROLLER_POSITIONS = "controllers"
+
+
+def scenario_position_file(config: Config, agents: str = VEHICLE_POSITIONS) -> Path:
+    """Get the positions file of an agent type in the output of a scenario."""
+    positions_path = (
+        config.path / config.get(OUTPUT_SETTINGS)[OUTPUT_PATH] / POSITIONS_FOLDER
+    )
+    if agents == VEHICLE_POSITIONS:
+        return positions_path / f"{trace_stem(config.get(TRAFFIC_SETTINGS))}.parquet"
+    if agents == RSU_POSITIONS:
+        rsu_settings = config.get(RSU_SETTINGS) or {}
+        if rsu_settings.get(PLACEMENT) == "given":
+            return positions_path / rsu_settings[RSU_FILENAME]
+        return positions_path / "roadside_units.parquet"
+    if agents == CONTROLLER_POSITIONS:
+        return positions_path / "controllers.parquet"
+    msg = f"Unknown agents '{agents}', use one of vehicles, rsus or controllers."
+    logger.error(msg)
+    raise ValueError(msg)
+
+
+def table_to_arrays(table: pa.Table) -> dict[str, np.ndarray]:
+    """Get the columns of a table as NumPy arrays."""
+    return {
+        name: column.to_numpy()
+        for name, column in zip(table.column_names, table.columns, strict=True)
+    }
+
+
+class PositionStore:
+    def __init__(self, position_file: Path | str) -> None:
+        """Queries a positions parquet file without reading all of it.
+
+        Every query first drops the row groups whose statistics cannot match,
+        then reads the remaining row groups one at a time with only the columns
+        that are asked for and the ones the query filters on. The positions are
+        sorted by time step, so the time queries read only the row groups of
+        their time steps. When the agent-major copy of the positions and its
+        agent index exist, the trajectories are read from the row range of the
+        agent in that copy. Quantized coordinates and velocities are decoded to
+        float64 before they are filtered or returned.
+        """
+        self.position_file = Path(position_file)
+        self.parquet_file = pq.ParquetFile(self.position_file)
+        self.schema = self.parquet_file.schema_arrow
+        self.row_group_count = self.parquet_file.metadata.num_row_groups
+        self.num_rows = self.parquet_file.metadata.num_rows
+        self.resolution = read_resolution(self.schema)
+        self.agent_major_file: pq.ParquetFile | None = None
+        self.agent_index: dict[str, np.ndarray] | None = None
+        agent_major_file, index_file = agent_major_files(self.position_file)
+        if agent_major_file.exists() and index_file.exists():
+            self._open_agent_major(agent_major_file, index_file)
+
+    def _open_agent_major(self, agent_major_file: Path, index_file: Path) -> None:
+        """Open the agent-major copy unless it is older than the positions."""
+        position_time = self.position_file.stat().st_mtime
+        parquet_file = pq.ParquetFile(agent_major_file)
+        if (
+            parquet_file.metadata.num_rows != self.num_rows
+            or agent_major_file.stat().st_mtime < position_time
+            or index_file.stat().st_mtime < position_time
+        ):
+            logger.warning(
+                "Ignoring the stale agent-major positions %s, they do not match %s",
+                agent_major_file,
+                self.position_file,
+            )
+            return
+        self.agent_major_file = parquet_file
+        self.agent_index = table_to_arrays(pq.read_table(index_file))
+
+    @classmethod
+    def from_scenario(
+        cls, config_file: str, agents: str = VEHICLE_POSITIONS
+    ) -> PositionStore:
+        """Open the positions of vehicles, RSUs or controllers of a scenario."""
+        config = Config(config_file, create_folders=False)
+        return cls(scenario_position_file(config, agents))
+
+    def at(
+        self, time_step: int, columns: list[str] | None = None, as_numpy: bool = False
+    ) -> pa.Table | dict[str, np.ndarray]:
+        """Get the positions of one time step."""
+        return self._query(
+            {TIME_STEP: (time_step, time_step)},
+            pc.field(TIME_STEP) == time_step,
+            columns,
+            as_numpy,
+        )
+
+    def window(
+        self,
+        start: int,
+        end: int,
+        columns: list[str] | None = None,
+        as_numpy: bool = False,
+    ) -> pa.Table | dict[str, np.ndarray]:
+        """Get the positions from the start time step up to the end, which is excluded."""
+        return self._query(
+            {TIME_STEP: (start, end - 1)},
+            (pc.field(TIME_STEP) >= start) & (pc.field(TIME_STEP) < end),
+            columns,
+            as_numpy,
+        )
+
+    def trajectory(
+        self, agent_id: int, columns: list[str] | None = None, as_numpy: bool = False
+    ) -> pa.Table | dict[str, np.ndarray]:
+        """Get the positions of one agent in the order of time."""
+        if self.agent_major_file is not None:
+            return self._read_agent_rows(agent_id, columns, as_numpy)
+        return self._query(
+            {AGENT_ID: (agent_id, agent_id)},
+            pc.field(AGENT_ID) == agent_id,
+            columns,
+            as_numpy,
+            sort_by=TIME_STEP,
+        )
+
+    def bbox(
+        self,
+        x_min: float,
+        y_min: float,
+        x_max: float,
+        y_max: float,
+        start: int | None = None,
+        end: int | None = None,
+        columns: list[str] | None = None,
+        as_numpy: bool = False,
+    ) -> pa.Table | dict[str, np.ndarray]:
+        """Get the positions inside a box, optionally in a window of time steps.
+
+        Parameters
+        ----------
+        x_min, y_min, x_max, y_max : float
+            The box, with its edges included.
+        start : int | None
+            The first time step, from the start of the positions if not given.
+        end : int | None
+            The time step after the last one, to the end of the positions if not
+            given.
+        columns : list[str] | None
+            The columns to read, all of them if not given.
+        as_numpy : bool
+            Whether to return NumPy arrays per column instead of a table.
+
+        Returns
+        -------
+        pa.Table | dict[str, np.ndarray]
+            The positions inside the box.
+        """
+        ranges = {COORD_X: (x_min, x_max), COORD_Y: (y_min, y_max)}
+        expression = (
+            (pc.field(COORD_X) >= x_min)
+            & (pc.field(COORD_X) <= x_max)
+            & (pc.field(COORD_Y) >= y_min)
+            & (pc.field(COORD_Y) <= y_max)
+        )
+        if start is not None or end is not None:
+            ranges[TIME_STEP] = (
+                -np.inf if start is None else start,
+                np.inf if end is None else end - 1,
+            )
+        if start is not None:
+            expression = expression & (pc.field(TIME_STEP) >= start)
+        if end is not None:
+            expression = expression & (pc.field(TIME_STEP) < end)
+        return self._query(ranges, expression, columns, as_numpy)
+
+    def row_groups(self, ranges: dict[str, tuple[float, float]]) -> list[int]:
+        """Get the row groups whose statistics overlap the ranges of the columns."""
+        column_indices = {
+            column: self.schema.get_field_index(column) for column in ranges
+        }
+        row_groups = []
+        for row_group in range(self.row_group_count):
+            metadata = self.parquet_file.metadata.row_group(row_group)
+            for column, (low, high) in ranges.items():
+                statistics = metadata.column(column_indices[column]).statistics
+                if statistics is None or not statistics.has_min_max:
+                    continue
+                scale = self._column_scale(column)
+                if statistics.max * scale < low or statistics.min * scale > high:
+                    break
+            else:
+                row_groups.append(row_group)
+        return row_groups
+
+    def _query(
+        self,
+        ranges: dict[str, tuple[float, float]],
+        expression: pc.Expression,
+        columns: list[str] | None,
+        as_numpy: bool,
+        sort_by: str | None = None,
+    ) -> pa.Table | dict[str, np.ndarray]:
+        """Read the matching rows of the row groups that can hold them."""
+        columns = self._check_columns(columns)
+        read_columns = columns + [
+            column
+            for column in [*ranges, *([sort_by] if sort_by else [])]
+            if column not in columns
+        ]
+        row_groups = self.row_groups(ranges)
+        logger.debug(
+            "Reading %d of %d row groups of %s",
+            len(row_groups),
+            self.row_group_count,
+            self.position_file,
+        )
+        tables = [
+            decode_positions(
+                self.parquet_file.read_row_group(row_group, columns=read_columns),
+                self.resolution,
+            ).filter(expression)
+            for row_group in row_groups
+        ]
+        table = (
+            pa.concat_tables(tables)
+            if tables
+            else decode_positions(
+                self.schema.empty_table().select(read_columns), self.resolution
+            )
+        )
+        if sort_by is not None:
+            table = table.sort_by(sort_by)
+        table = table.select(columns)
+        return table_to_arrays(table) if as_numpy else table
+
+    def _read_agent_rows(
+        self, agent_id: int, columns: list[str] | None, as_numpy: bool
+    ) -> pa.Table | dict[str, np.ndarray]:
+        """Read the row range of an agent from the agent-major positions."""
+        columns = self._check_columns(columns)
+        agent_ids = self.agent_index[AGENT_ID]
+        position = np.searchsorted(agent_ids, agent_id)
+        if position == len(agent_ids) or agent_ids[position] != agent_id:
+            table = decode_positions(
+                self.schema.empty_table().select(columns), self.resolution
+            )
+            return table_to_arrays(table) if as_numpy else table
+
+        row_start = int(self.agent_index[ROW_START][position])
+        row_count = int(self.agent_index[ROW_COUNT][position])
+        metadata = self.agent_major_file.metadata
+        row_group_starts = np.cumsum(
+            [0]
+            + [
+                metadata.row_group(row_group).num_rows
+                for row_group in range(metadata.num_row_groups)
+            ]
+        )
+        first = np.searchsorted(row_group_starts, row_start, side="right") - 1
+        last = (
+            np.searchsorted(row_group_starts, row_start + row_count - 1, side="right")
+            - 1
+        )
+        table = self.agent_major_file.read_row_groups(
+            list(range(first, last + 1)), columns=columns
+        ).slice(row_start - row_group_starts[first], row_count)
+        table = decode_positions(table, self.resolution)
+        return table_to_arrays(table) if as_numpy else table
+
+    def _column_scale(self, column: str) -> float:
+        """Get the factor from the stored values of a column to the decoded ones."""
+        if self.resolution is not None and column in QUANTIZED_COLUMNS:
+            return self.resolution
+        return 1
+
+    def _check_columns(self, columns: list[str] | None) -> list[str]:
+        """Get the columns to read, all of them if not given."""
+        columns = self.schema.names if columns is None else list(columns)
+        unknown = [column for column in columns if column not in self.schema.names]
+        if unknown:
+            msg = f"Unknown columns {unknown} in {self.position_file}."
+            logger.error(msg)
+            raise ValueError(msg)
+        return columns
@@ -0,0 +1,290 @@
+from __future__ import annotations
+
+import logging
+import tempfile
+from collections.abc import Iterator
+from pathlib import Path
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+from tqdm import tqdm
+
+from prep_disolv.common.columns import AGENT_ID, TIME_STEP
+from prep_disolv.common.memory import BatchSizer, MemoryBudget
+
+logger = logging.getLogger(__name__)
+
+SORT_KEYS = [(AGENT_ID, "ascending"), (TIME_STEP, "ascending")]
+# The rows of a sorted run without a memory budget.
+SORT_RUN_ROWS = 1000000
+# Sorting a run holds the rows, the sort indices and the sorted copy.
+SORT_ROW_FACTOR = 3
+SORT_ROW_BYTES = 400
+MIN_MERGE_ROWS = 1000
+# The merge reads the runs one small row group at a time.
+RUN_ROW_GROUP_SIZE = 10000
+TRAJECTORY_ROW_GROUP_SIZE = 65536
+
+# Index columns.
+ROW_START = "row_start"
+ROW_COUNT = "row_count"
+
+
+def agent_major_files(position_file: Path) -> tuple[Path, Path]:
+    """Get the agent-major positions file and its agent index next to a positions file."""
+    position_file = Path(position_file)
+    return (
+        position_file.with_name(f"{position_file.stem}_by_agent.parquet"),
+        position_file.with_name(f"{position_file.stem}_by_agent_index.parquet"),
+    )
+
+
+def remove_agent_major_files(position_file: Path) -> None:
+    """Remove the agent-major copy of a positions file that is written again."""
+    for sidecar in agent_major_files(position_file):
+        sidecar.unlink(missing_ok=True)
+
+
+def build_agent_index_schema() -> pa.Schema:
+    """Build the schema of the rows of every agent in the agent-major file."""
+    return pa.schema(
+        [
+            pa.field(AGENT_ID, pa.int64()),
+            pa.field(ROW_START, pa.int64()),
+            pa.field(ROW_COUNT, pa.int64()),
+        ]
+    )
+
+
+def sorted_prefix_length(table: pa.Table, agent_id: int, time_step: int) -> int:
+    """Get the number of rows of a sorted table up to and including a key."""
+    agent_ids = table[AGENT_ID].to_numpy()
+    first = np.searchsorted(agent_ids, agent_id, side="left")
+    last = np.searchsorted(agent_ids, agent_id, side="right")
+    time_steps = table[TIME_STEP].slice(first, last - first).to_numpy()
+    return int(first + np.searchsorted(time_steps, time_step, side="right"))
+
+
+class AgentIndexBuilder:
+    def __init__(self) -> None:
+        """Collects the row range of every agent as the sorted rows are written."""
+        self.agent_ids: list[np.ndarray] = []
+        self.row_starts: list[np.ndarray] = []
+        self.last_agent_id: int | None = None
+        self.row_count = 0
+
+    def add(self, agent_ids: np.ndarray) -> None:
+        """Add the agent IDs of the next sorted rows."""
+        if len(agent_ids) == 0:
+            return
+        starts = np.flatnonzero(np.diff(agent_ids, prepend=agent_ids[0] - 1))
+        # An agent that continues from the previous rows keeps its start.
+        if self.last_agent_id == agent_ids[0]:
+            starts = starts[1:]
+        self.agent_ids.append(agent_ids[starts])
+        self.row_starts.append(starts + self.row_count)
+        self.last_agent_id = int(agent_ids[-1])
+        self.row_count += len(agent_ids)
+
+    def to_table(self) -> pa.Table:
+        """Get the agent IDs with the start and the number of their rows."""
+        agent_ids = np.concatenate([np.empty(0, np.int64), *self.agent_ids])
+        row_starts = np.concatenate([np.empty(0, np.int64), *self.row_starts])
+        row_counts = np.diff(np.append(row_starts, self.row_count))
+        return pa.Table.from_arrays(
+            [
+                pa.array(agent_ids, pa.int64()),
+                pa.array(row_starts, pa.int64()),
+                pa.array(row_counts, pa.int64()),
+            ],
+            schema=build_agent_index_schema(),
+        )
+
+
+class TrajectorySorter:
+    def __init__(
+        self,
+        position_file: Path,
+        memory_budget: MemoryBudget | None = None,
+        run_rows: int = SORT_RUN_ROWS,
+    ) -> None:
+        """Writes the positions sorted by agent and time step, with an agent index.
+
+        The positions are sorted with an external merge sort. Runs that fit the
+        memory budget are sorted and written to temporary files next to the
+        output, then all runs are merged in one pass that reads a slice of every
+        run at a time. When the budget cannot hold a useful slice of every run,
+        groups of runs are first merged into longer runs.
+
+        Parameters
+        ----------
+        position_file : Path
+            The time-major positions file.
+        memory_budget : MemoryBudget | None
+            The memory the sorted runs and the merge buffers may use.
+        run_rows : int
+            The rows of a sorted run without a memory budget.
+        """
+        self.position_file = Path(position_file)
+        self.output_file, self.index_file = agent_major_files(self.position_file)
+        self.batch_sizer = BatchSizer(memory_budget, run_rows, SORT_ROW_BYTES)
+        self.run_count = 0
+        self.merge_passes = 0
+        self.row_count = 0
+        self.agent_count = 0
+
+    def sort(self) -> int:
+        """Write the agent-major positions and the index and get the row count."""
+        logger.info("Sorting %s by agent and time step", self.position_file)
+        parquet_file = pq.ParquetFile(self.position_file, pre_buffer=False)
+        self._observe_row_bytes(parquet_file)
+        with tempfile.TemporaryDirectory(
+            prefix="sort_", dir=self.output_file.parent
+        ) as run_folder:
+            run_files = self._write_runs(parquet_file, Path(run_folder))
+            run_files = self._reduce_runs(
+                run_files, Path(run_folder), parquet_file.schema_arrow
+            )
+            index = AgentIndexBuilder()
+            with pq.ParquetWriter(
+                self.output_file, parquet_file.schema_arrow
+            ) as writer:
+                for table in self._row_groups(self._merge_runs(run_files)):
+                    writer.write_table(table, row_group_size=TRAJECTORY_ROW_GROUP_SIZE)
+                    index.add(table[AGENT_ID].to_numpy())
+        index_table = index.to_table()
+        pq.write_table(index_table, self.index_file)
+        self.row_count = index.row_count
+        self.agent_count = index_table.num_rows
+        logger.info(
+            "Wrote %d positions of %d agents from %d sorted runs to %s",
+            self.row_count,
+            self.agent_count,
+            self.run_count,
+            self.output_file,
+        )
+        return self.row_count
+
+    def _observe_row_bytes(self, parquet_file: pq.ParquetFile) -> None:
+        """Size the runs from the decoded bytes of the first row group."""
+        if parquet_file.metadata.num_row_groups == 0:
+            return
+        sample = parquet_file.read_row_group(0)
+        self.batch_sizer.observe(sample.num_rows, sample.nbytes * SORT_ROW_FACTOR)
+
+    def _write_runs(self, parquet_file: pq.ParquetFile, run_folder: Path) -> list[Path]:
+        """Sort the positions in runs that fit the budget and write every run."""
+        run_rows = self.batch_sizer.rows
+        run_files = []
+        progress = tqdm(
+            total=parquet_file.metadata.num_rows,
+            unit="rows",
+            desc="Sorting runs: ",
+            colour="green",
+            ncols=120,
+        )
+        for batch in parquet_file.iter_batches(batch_size=run_rows):
+            run_file = run_folder / f"run_{len(run_files)}.parquet"
+            pq.write_table(
+                pa.Table.from_batches([batch]).sort_by(SORT_KEYS),
+                run_file,
+                row_group_size=RUN_ROW_GROUP_SIZE,
+            )
+            run_files.append(run_file)
+            progress.update(batch.num_rows)
+        progress.close()
+        self.run_count = len(run_files)
+        return run_files
+
+    def _reduce_runs(
+        self, run_files: list[Path], run_folder: Path, schema: pa.Schema
+    ) -> list[Path]:
+        """Merge groups of runs until a slice of every run fits the budget.
+
+        A group holds as many runs as slices of the smallest merge size fit the
+        budget, and at least two.
+        """
+        fan_in = max(self.batch_sizer.rows // MIN_MERGE_ROWS, 2)
+        while len(run_files) > fan_in:
+            logger.info(
+                "Merging %d runs in groups of %d to fit the memory budget",
+                len(run_files),
+                fan_in,
+            )
+            merged_files = []
+            for first in range(0, len(run_files), fan_in):
+                group = run_files[first : first + fan_in]
+                if len(group) == 1:
+                    merged_files.extend(group)
+                    continue
+                merged_name = f"merge_{self.merge_passes}_{len(merged_files)}"
+                merged_file = run_folder / f"{merged_name}.parquet"
+                with pq.ParquetWriter(merged_file, schema) as writer:
+                    for table in self._merge_runs(group):
+                        writer.write_table(table, row_group_size=RUN_ROW_GROUP_SIZE)
+                for run_file in group:
+                    run_file.unlink()
+                merged_files.append(merged_file)
+            run_files = merged_files
+            self.merge_passes += 1
+        return run_files
+
+    def _merge_runs(self, run_files: list[Path]) -> Iterator[pa.Table]:
+        """Merge the sorted runs into sorted slices.
+
+        Every run contributes the rows up to the smallest last key of the slices
+        in memory, so the merged rows are final and at least one slice is used
+        up in every step. The slices of all runs together fit the budget.
+        """
+        merge_rows = max(self.batch_sizer.rows // max(len(run_files), 1), 1)
+        readers = [
+            pq.ParquetFile(run_file, pre_buffer=False).iter_batches(
+                batch_size=merge_rows
+            )
+            for run_file in run_files
+        ]
+        slices = {}
+        for run, reader in enumerate(readers):
+            batch = next(reader, None)
+            if batch is not None:
+                slices[run] = pa.Table.from_batches([batch])
+
+        while slices:
+            bound = min(
+                (table[AGENT_ID][-1].as_py(), table[TIME_STEP][-1].as_py())
+                for table in slices.values()
+            )
+            merged = []
+            for run in list(slices):
+                table = slices[run]
+                length = sorted_prefix_length(table, *bound)
+                merged.append(table.slice(0, length))
+                if length < table.num_rows:
+                    slices[run] = table.slice(length)
+                    continue
+                batch = next(readers[run], None)
+                if batch is None:
+                    del slices[run]
+                else:
+                    slices[run] = pa.Table.from_batches([batch])
+            yield pa.concat_tables(merged).sort_by(SORT_KEYS)
+
+    def _row_groups(self, tables: Iterator[pa.Table]) -> Iterator[pa.Table]:
+        """Regroup the merged slices into tables of the row group size."""
+        pending = []
+        pending_rows = 0
+        for table in tables:
+            pending.append(table)
+            pending_rows += table.num_rows
+            if pending_rows < TRAJECTORY_ROW_GROUP_SIZE:
+                continue
+            rows = pa.concat_tables(pending)
+            full_rows = (
+                pending_rows // TRAJECTORY_ROW_GROUP_SIZE * TRAJECTORY_ROW_GROUP_SIZE
+            )
+            yield rows.slice(0, full_rows)
+            pending = [rows.slice(full_rows)]
+            pending_rows -= full_rows
+        if pending_rows > 0:
+            yield pa.concat_tables(pending)
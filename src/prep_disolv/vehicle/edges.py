@@ -0,0 +1,222 @@
+from __future__ import annotations
+
+import logging
+from pathlib import Path
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+from tqdm import tqdm
+
+from prep_disolv.common.columns import AGENT_ID, TIME_STEP
+from prep_disolv.common.coordinates import decode_positions, read_resolution
+from prep_disolv.vehicle.sumo import ROAD_DATA, VELOCITY
+
+logger = logging.getLogger(__name__)
+
+# The window length in time steps, which are milliseconds.
+DEFAULT_EDGE_WINDOW = 60000
+DEFAULT_STEP_SIZE = 100
+DEFAULT_PERCENTILES = [50, 85]
+EDGE_BATCH_SIZE = 100000
+
+# Output columns.
+WINDOW_START = "window_start"
+EDGE_ID = "edge_id"
+VEHICLE_COUNT = "vehicle_count"
+SAMPLES = "samples"
+MEAN_SPEED = "mean_speed"
+OCCUPANCY = "occupancy"
+
+
+def speed_column(percentile: float) -> str:
+    """Get the name of the column of a speed percentile."""
+    return f"speed_p{percentile:g}"
+
+
+def build_edge_stats_schema(percentiles: list[float]) -> pa.Schema:
+    """Build the schema of the edge statistics."""
+    return pa.schema(
+        [
+            pa.field(WINDOW_START, pa.int64()),
+            pa.field(EDGE_ID, pa.string()),
+            pa.field(VEHICLE_COUNT, pa.int64()),
+            pa.field(SAMPLES, pa.int64()),
+            pa.field(MEAN_SPEED, pa.float64()),
+            *[
+                pa.field(speed_column(percentile), pa.float64())
+                for percentile in percentiles
+            ],
+            pa.field(OCCUPANCY, pa.float64()),
+        ]
+    )
+
+
+def lane_edges(lanes: pa.Array) -> pa.Array:
+    """Get the edge of every SUMO lane, whose ID is the edge ID and the lane index."""
+    return pc.replace_substring_regex(lanes, pattern="_[0-9]+$", replacement="")
+
+
+def group_percentiles(
+    values: np.ndarray, starts: np.ndarray, counts: np.ndarray, percentile: float
+) -> np.ndarray:
+    """Get a percentile of every group of sorted values, as np.percentile does."""
+    positions = starts + (counts - 1) * (percentile / 100)
+    lower = np.floor(positions).astype(np.int64)
+    upper = np.ceil(positions).astype(np.int64)
+    return values[lower] + (values[upper] - values[lower]) * (positions - lower)
+
+
+class EdgeStatsAggregator:
+    def __init__(
+        self,
+        position_file: Path,
+        output_file: Path,
+        window: int = DEFAULT_EDGE_WINDOW,
+        percentiles: list[float] | None = None,
+        step_size: int = DEFAULT_STEP_SIZE,
+    ) -> None:
+        """Aggregates the vehicle positions per edge and time window.
+
+        The positions are read in record batches. The rows of a window are kept
+        until the positions move past its end, so the memory depends on the
+        number of positions in a window and not on the length of the trace.
+
+        Parameters
+        ----------
+        position_file : Path
+            The vehicle positions with the road_data lane of every position.
+        output_file : Path
+            The parquet file with one row per edge and window.
+        window : int
+            The length of the time windows in time steps.
+        percentiles : list[float] | None
+            The speed percentiles to compute, the median and the 85th by default.
+        step_size : int
+            The simulation step in time steps. The occupancy is the mean number
+            of vehicles on an edge per simulation step of the window.
+        """
+        if window < 1:
+            msg = f"The edge statistics window must be positive, not {window}."
+            logger.error(msg)
+            raise ValueError(msg)
+        if step_size < 1:
+            msg = f"The simulation step must be positive, not {step_size}."
+            logger.error(msg)
+            raise ValueError(msg)
+        self.percentiles = (
+            DEFAULT_PERCENTILES if percentiles is None else list(percentiles)
+        )
+        if not all(0 <= percentile <= 100 for percentile in self.percentiles):
+            msg = f"The speed percentiles must be between 0 and 100: {percentiles}."
+            logger.error(msg)
+            raise ValueError(msg)
+        self.position_file = position_file
+        self.output_file = output_file
+        self.window = window
+        self.step_size = step_size
+        self.schema = build_edge_stats_schema(self.percentiles)
+        self.pending: dict[int, list[pa.Table]] = {}
+        self.window_count = 0
+        self.row_count = 0
+
+    def aggregate(self) -> int:
+        """Write the statistics of every edge and window and get the row count."""
+        logger.info("Aggregating the edge statistics of %s", self.position_file)
+        self.output_file.parent.mkdir(parents=True, exist_ok=True)
+        parquet_file = pq.ParquetFile(self.position_file, pre_buffer=False)
+        resolution = read_resolution(parquet_file.schema_arrow)
+        progress = tqdm(
+            total=parquet_file.metadata.num_rows,
+            unit="rows",
+            desc="Aggregating edges: ",
+            colour="green",
+            ncols=120,
+        )
+        with pq.ParquetWriter(
+            self.output_file, self.schema, compression="zstd"
+        ) as writer:
+            for record_batch in parquet_file.iter_batches(
+                batch_size=EDGE_BATCH_SIZE,
+                columns=[TIME_STEP, AGENT_ID, VELOCITY, ROAD_DATA],
+            ):
+                batch = decode_positions(record_batch, resolution)
+                windows = pc.divide(batch.column(TIME_STEP), self.window)
+                positions = pa.table(
+                    {
+                        EDGE_ID: lane_edges(batch.column(ROAD_DATA)),
+                        TIME_STEP: batch.column(TIME_STEP),
+                        AGENT_ID: batch.column(AGENT_ID),
+                        VELOCITY: batch.column(VELOCITY),
+                    }
+                )
+                for window_index in pc.unique(windows).to_pylist():
+                    self.pending.setdefault(window_index, []).append(
+                        positions.filter(pc.equal(windows, window_index))
+                    )
+                # The positions are sorted by time, so earlier windows are done.
+                current_window = pc.min(windows).as_py()
+                for window_index in sorted(self.pending):
+                    if window_index < current_window:
+                        self._write_window(writer, window_index)
+                progress.update(batch.num_rows)
+            for window_index in sorted(self.pending):
+                self._write_window(writer, window_index)
+        progress.close()
+        logger.info(
+            "Wrote %d edge statistics over %d windows to %s",
+            self.row_count,
+            self.window_count,
+            self.output_file,
+        )
+        return self.row_count
+
+    def _write_window(self, writer: pq.ParquetWriter, window_index: int) -> None:
+        """Aggregate the positions of a window per edge and write them."""
+        positions = pa.concat_tables(self.pending.pop(window_index))
+        edges = positions[EDGE_ID].combine_chunks().dictionary_encode()
+        edge_codes = edges.indices.to_numpy()
+        speeds = positions[VELOCITY].to_numpy()
+        order = np.lexsort((speeds, edge_codes))
+        sorted_codes = edge_codes[order]
+        sorted_speeds = speeds[order]
+        starts = np.flatnonzero(np.diff(sorted_codes, prepend=-1))
+        counts = np.diff(np.append(starts, len(sorted_codes)))
+        speed_sums = np.add.reduceat(sorted_speeds, starts)
+
+        # Every vehicle is counted once per edge, however long it stays there.
+        vehicle_counts = (
+            pa.table({EDGE_ID: edge_codes, AGENT_ID: positions[AGENT_ID]})
+            .group_by(EDGE_ID)
+            .aggregate([(AGENT_ID, "count_distinct")])
+        )
+        vehicle_count = np.zeros(len(edges.dictionary), dtype=np.int64)
+        vehicle_count[vehicle_counts[EDGE_ID].to_numpy()] = vehicle_counts[
+            f"{AGENT_ID}_count_distinct"
+        ].to_numpy()
+        # The occupancy is the mean number of vehicles on the edge per simulation
+        # step of the window, also of the steps without any vehicle.
+        time_steps = max(self.window // self.step_size, 1)
+
+        group_codes = sorted_codes[starts]
+        window_stats = pa.Table.from_arrays(
+            [
+                pa.array(np.full(len(starts), window_index * self.window), pa.int64()),
+                edges.dictionary.take(pa.array(group_codes)),
+                pa.array(vehicle_count[group_codes]),
+                pa.array(counts, pa.int64()),
+                pa.array(speed_sums / counts),
+                *[
+                    pa.array(
+                        group_percentiles(sorted_speeds, starts, counts, percentile)
+                    )
+                    for percentile in self.percentiles
+                ],
+                pa.array(counts / time_steps),
+            ],
+            schema=self.schema,
+        )
+        writer.write_table(window_stats)
+        self.window_count += 1
+        self.row_count += window_stats.num_rows
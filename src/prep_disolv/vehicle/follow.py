@@ -0,0 +1,76 @@
+from __future__ import annotations
+
+import logging
+import stat
+import time
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+# The seconds between two reads at the end of a growing file.
+FOLLOW_POLL_INTERVAL = 0.1
+# The seconds without new data after which the writer is taken as gone.
+DEFAULT_FOLLOW_TIMEOUT = 30.0
+
+
+class FollowReader:
+    def __init__(
+        self,
+        path: Path,
+        timeout: float = DEFAULT_FOLLOW_TIMEOUT,
+        poll_interval: float = FOLLOW_POLL_INTERVAL,
+    ) -> None:
+        """Reads a file that another process is still writing, such as a live FCD.
+
+        At the end of a regular file, the reader waits for the writer to append
+        more data until the writer has been silent for the timeout. A named pipe
+        ends when its writer closes it.
+
+        Parameters
+        ----------
+        path : Path
+            The growing file or the named pipe, which may not exist yet.
+        timeout : float
+            The seconds to wait for the file to appear and for new data.
+        poll_interval : float
+            The seconds between two reads at the end of the file.
+        """
+        self.path = Path(path)
+        self.timeout = timeout
+        self.poll_interval = poll_interval
+        self.timed_out = False
+        self._wait_for_file()
+        self.is_pipe = stat.S_ISFIFO(self.path.stat().st_mode)
+        # Opening a named pipe blocks until its writer opens it as well.
+        self.file = self.path.open("rb")
+
+    def read(self, size: int = -1) -> bytes:
+        """Read the next data, waiting for the writer at the end of the file."""
+        last_data = time.monotonic()
+        while True:
+            data = self.file.read(size)
+            if data or self.is_pipe:
+                return data
+            if time.monotonic() - last_data > self.timeout:
+                logger.warning(
+                    "No new data in %s for %.1f s, stopping", self.path, self.timeout
+                )
+                self.timed_out = True
+                return b""
+            time.sleep(self.poll_interval)
+
+    def close(self) -> None:
+        """Close the file."""
+        self.file.close()
+
+    def _wait_for_file(self) -> None:
+        """Wait for the writer to create the file."""
+        start = time.monotonic()
+        while not self.path.exists():
+            if time.monotonic() - start > self.timeout:
+                msg = (
+                    f"The followed file {self.path} did not appear in {self.timeout} s."
+                )
+                logger.error(msg)
+                raise ValueError(msg)
+            time.sleep(self.poll_interval)
@@ -1,20 +1,31 @@
 from __future__ import annotations
 
+import heapq
 import logging
+import time
 import xml.etree.ElementTree as Et
+from collections.abc import Iterator
+from contextlib import suppress
+from functools import partial
 from pathlib import Path
 from xml.etree.ElementTree import iterparse
 
-import numpy as np
-import pandas as pd
 import pyarrow as pa
 import pyarrow.parquet as pq
 import tqdm
 
 from prep_disolv.common.columns import POSITIONS_FOLDER
+from prep_disolv.common.coordinates import CoordinateEncoding, DEFAULT_RESOLUTION
+from prep_disolv.common.memory import BatchSizer, memory_budget
+from prep_disolv.common.metrics import SectionTimer
+from prep_disolv.common.pipeline import WriterThread, batches_in_memory, default_queue_size
 from prep_disolv.common.utils import get_offsets
-from prep_disolv.common.config import NETWORK_FILE, TRACE_FILE, Config, \
-    TRAFFIC_SETTINGS, SIMULATION_SETTINGS, DURATION, VEHICLE_SETTINGS, ID_INIT, STEP_SIZE
+from prep_disolv.common.config import NETWORK_FILE, Config, trace_files, trace_stem, \
+    TRAFFIC_SETTINGS, SIMULATION_SETTINGS, DURATION, VEHICLE_SETTINGS, ID_INIT, STEP_SIZE, \
+    ARROW_ENGINE, ENGINE, EXECUTION_SETTINGS, ID_MAPPING, COORDINATES, RESOLUTION, \
+    COLUMN_ENCODING, FLOAT64_COORDINATES, PLAIN_ENCODING, FOLLOW, FOLLOW_TIMEOUT, QUEUE_SIZE
+from prep_disolv.routes.mapping import read_id_mapping
+from prep_disolv.vehicle.follow import DEFAULT_FOLLOW_TIMEOUT, FollowReader
 from prep_disolv.vehicle.veh_activations import VehicleActivation
 
 logger = logging.getLogger(__name__)
@@ -28,27 +39,52 @@ VELOCITY = "velocity"
 ROAD_DATA = "road_data"
 VEH_TYPE = "veh_type"
 
+# Timed sections of the conversion.
+XML_PARSING = "xml_parsing"
+ACTIVATIONS = "activations"
+ARROW_CONVERSION = "arrow_conversion"
+PARQUET_ENCODING = "parquet_encoding"
+# The parser waiting for the writer thread, or writing itself without one.
+WRITER_WAIT = "writer_wait"
+
+# The rows of a batch without a memory limit.
+FCD_BATCH_SIZE = 10000
+# The buffered rows are Python objects, which take about five times their size
+# in Arrow, and the Arrow copy of a batch exists while it is written.
+FCD_ROW_FACTOR = 6
+FCD_ROW_BYTES = 400
+# Larger batches are split, the link workers partition the positions by row group.
+FCD_ROW_GROUP_SIZE = 100000
+
 
 class FCDDataArrays:
     def __init__(self) -> None:
-        self.array_size = 0
-        self.time_step = np.array([], dtype=np.int64)
-        self.agent_id = np.array([], dtype=np.int64)
-        self.x = np.array([], dtype=np.float64)
-        self.y = np.array([], dtype=np.float64)
-        self.velocity = np.array([], dtype=np.float64)
-        self.road_data = np.array([], dtype=np.bytes_)
-        self.veh_type = np.array([], dtype=str)
+        self.reset()
 
     def reset(self) -> None:
         self.array_size = 0
-        self.time_step = np.array([], dtype=np.int64)
-        self.agent_id = np.array([], dtype=np.int64)
-        self.x = np.array([], dtype=np.float64)
-        self.y = np.array([], dtype=np.float64)
-        self.velocity = np.array([], dtype=np.float64)
-        self.road_data = np.array([], dtype=np.bytes_)
-        self.veh_type = np.array([], dtype=str)
+        self.time_step: list[int] = []
+        self.agent_id: list[int] = []
+        self.x: list[float] = []
+        self.y: list[float] = []
+        self.velocity: list[float] = []
+        self.road_data: list[str] = []
+        self.veh_type: list[str] = []
+
+    def to_table(self, encoding: CoordinateEncoding) -> pa.Table:
+        """Convert the buffered rows to a table with the FCD schema."""
+        return pa.Table.from_arrays(
+            [
+                pa.array(self.time_step, pa.int64()),
+                pa.array(self.agent_id, pa.int64()),
+                encoding.encode(COORD_X, self.x),
+                encoding.encode(COORD_Y, self.y),
+                encoding.encode(VELOCITY, self.velocity),
+                pa.array(self.road_data, pa.string()),
+                pa.array(self.veh_type, pa.string()),
+            ],
+            schema=_build_fcd_schema(encoding),
+        )
 
 
 class SumoConverter:
@@ -60,8 +96,22 @@ class SumoConverter:
         """The constructor of the SumoConverter class."""
         self.output_path = output_path
         self.config_path = config.path
-        self.activation = VehicleActivation(output_path)
-        self.fcd_file = self.config_path / config.get(TRAFFIC_SETTINGS)[TRACE_FILE]
+        execution_settings = config.get(EXECUTION_SETTINGS) or {}
+        self.activation = VehicleActivation(
+            output_path, execution_settings.get(ENGINE, ARROW_ENGINE)
+        )
+        self.fcd_files = [
+            self.config_path / trace_file
+            for trace_file in trace_files(config.get(TRAFFIC_SETTINGS))
+        ]
+        self.positions_name = trace_stem(config.get(TRAFFIC_SETTINGS))
+        # Following a trace that SUMO is still writing, with the time to wait for data.
+        traffic_settings = config.get(TRAFFIC_SETTINGS)
+        self.follow_timeout = None
+        if traffic_settings.get(FOLLOW, False):
+            self.follow_timeout = float(
+                traffic_settings.get(FOLLOW_TIMEOUT, DEFAULT_FOLLOW_TIMEOUT)
+            )
         self.net_file = self.config_path / config.get(TRAFFIC_SETTINGS)[NETWORK_FILE]
         offsets = get_offsets(self.net_file)
         self.offset_x, self.offset_y = offsets[0], offsets[1]
@@ -70,14 +120,32 @@ class SumoConverter:
         self.step_size = config.get(SIMULATION_SETTINGS)[STEP_SIZE]
         self.parquet_file: Path = output_path
         self.time_offset = -1
-        self.vehicle_id_init = config.get(VEHICLE_SETTINGS)[ID_INIT]
-        self.vehicle_id_pool = {}
+        vehicle_settings = config.get(VEHICLE_SETTINGS)
+        self.vehicle_id_init = vehicle_settings[ID_INIT]
+        self.coordinate_encoding = CoordinateEncoding(
+            vehicle_settings.get(COORDINATES, FLOAT64_COORDINATES),
+            float(vehicle_settings.get(RESOLUTION, DEFAULT_RESOLUTION)),
+            vehicle_settings.get(COLUMN_ENCODING, PLAIN_ENCODING),
+        )
+        # The pool is keyed by the shard and the SUMO ID of a vehicle.
+        self.vehicle_id_pool: dict[tuple[int, str], int] = {}
+        id_mapping = config.get(TRAFFIC_SETTINGS).get(ID_MAPPING)
+        if id_mapping is not None:
+            self._load_id_mapping(self.config_path / id_mapping)
+        self.timer = SectionTimer()
+        # Every batch held by the parser and the writer thread shares the budget.
+        self.queue_size = int(vehicle_settings.get(QUEUE_SIZE, default_queue_size()))
+        budget = memory_budget(config)
+        if budget is not None:
+            budget = budget.share(batches_in_memory(self.queue_size))
+        self.batch_sizer = BatchSizer(budget, FCD_BATCH_SIZE, FCD_ROW_BYTES)
 
     def fcd_to_parquet(self) -> None:
         """Convert the FCD output from SUMO to a parquet file."""
-        logger.info("Converting %s to parquet", self.fcd_file)
-        file_name = self.fcd_file.stem
-        parquet_file = self.output_path / POSITIONS_FOLDER / f"{file_name}.parquet"
+        logger.info("Converting %s to parquet", ", ".join(map(str, self.fcd_files)))
+        parquet_file = (
+            self.output_path / POSITIONS_FOLDER / f"{self.positions_name}.parquet"
+        )
         self.parquet_file = parquet_file
         logger.info("Writing to %s", parquet_file)
         self._convert_fcd_to_parquet()
@@ -90,22 +158,50 @@ class SumoConverter:
         """Get the parquet file."""
         return self.parquet_file
 
-    def get_vehicle_id_from_pool(self, vehicle_id_str: str) -> int:
-        """Return a vehicle ID from the map."""
-        try:
-            vehicle_id = int(vehicle_id_str)
-        except ValueError:
-            if vehicle_id_str in self.vehicle_id_pool.keys():
-                vehicle_id = self.vehicle_id_pool[vehicle_id_str]
-            else:
-                vehicle_id = self.vehicle_id_init
-                self.vehicle_id_pool[vehicle_id_str] = vehicle_id
-                self.vehicle_id_init = self.vehicle_id_init + 1
+    def _load_id_mapping(self, mapping_file: Path) -> None:
+        """Fill the vehicle ID pool from the mapping of a renumbered route file.
+
+        The mapping names the vehicles of the first shard of a sharded trace.
+        """
+        self.vehicle_id_pool = {
+            (0, original_id): vehicle_id
+            for original_id, vehicle_id in read_id_mapping(mapping_file).items()
+        }
+        if self.vehicle_id_pool:
+            # Vehicles missing from the mapping get IDs after the mapped ones.
+            self.vehicle_id_init = max(
+                self.vehicle_id_init, max(self.vehicle_id_pool.values()) + 1
+            )
+
+    def get_vehicle_id_from_pool(self, vehicle_id_str: str, shard: int = 0) -> int:
+        """Return a vehicle ID from the map.
+
+        Numeric SUMO IDs of a single trace are kept. The shards of a sharded trace
+        may reuse the SUMO IDs of each other, numeric ones too, so every vehicle of
+        a sharded trace is numbered through the pool per shard.
+        """
+        vehicle_id = self.vehicle_id_pool.get((shard, vehicle_id_str))
+        if vehicle_id is not None:
+            return vehicle_id
+        if len(self.fcd_files) == 1:
+            with suppress(ValueError):
+                return int(vehicle_id_str)
+        vehicle_id = self.vehicle_id_init
+        self.vehicle_id_pool[(shard, vehicle_id_str)] = vehicle_id
+        self.vehicle_id_init = self.vehicle_id_init + 1
         return vehicle_id
 
     def _convert_fcd_to_parquet(self) -> None:
-        """Convert the FCD output from SUMO to a parquet file."""
-        output_writer = _get_output_writer(self.parquet_file)
+        """Convert the FCD output from SUMO to a parquet file.
+
+        The parser converts every full batch to Arrow and hands it to a writer
+        thread through a bounded queue, which compresses and writes the batch
+        while the parser reads on.
+        """
+        output_writer = _get_output_writer(self.parquet_file, self.coordinate_encoding)
+        batch_writer = WriterThread(
+            partial(self._write_batch, output_writer), self.queue_size
+        )
         fcd_arrays: FCDDataArrays = FCDDataArrays()
 
         progress_bar = tqdm.tqdm(
@@ -115,82 +211,206 @@ class SumoConverter:
             colour="green",
             ncols=120,
         )
-        vehicle_fcd_iter = iterparse(self.fcd_file, events=("start", "end"))
-        for event, veh_ele in vehicle_fcd_iter:
-            if event == "end" and veh_ele.tag == "timestep":
-                timestamp = int(round(float(veh_ele.attrib["time"]), 1) * 10) * 100
+        conversion_start = time.perf_counter()
+        if self.follow_timeout is not None:
+            self.activation.follow_updates()
+        parsed = False
+        try:
+            for timestamp, shard, veh_ele, step_closed in merge_time_steps(
+                self.fcd_files, self.follow_timeout
+            ):
                 if self.time_offset == -1:
                     self.time_offset = timestamp
-                timestamp = timestamp - self.time_offset
-                logger.debug("Processing timestep %s", timestamp)
+                time_step = timestamp - self.time_offset
+                logger.debug("Processing timestep %s", time_step)
 
                 for vehicle_ele in veh_ele:
-                    fcd_arrays.time_step = np.append(fcd_arrays.time_step, timestamp)
-                    vehicle_id = self.get_vehicle_id_from_pool(vehicle_ele.attrib["id"])
-                    self.activation.update_activation(timestamp, vehicle_id)
-                    fcd_arrays = self._read_vehicle_data(vehicle_ele, fcd_arrays, vehicle_id)
-
-                    if fcd_arrays.array_size == 10000:
-                        logger.debug("Writing fcd data to parquet at %s", timestamp)
-                        fcd_data_df = pd.DataFrame(fcd_arrays.__dict__)
-                        fcd_data_df = fcd_data_df.drop(columns=["array_size"])
-                        output_writer.write_table(pa.Table.from_pandas(fcd_data_df))
-                        fcd_arrays.reset()
-
-                self.activation.time_step_complete(timestamp)
-                progress_bar.update(1)
-
-        if fcd_arrays.array_size > 0:
-            fcd_data_df = pd.DataFrame(fcd_arrays.__dict__)
-            fcd_data_df = fcd_data_df.drop(columns=["array_size"])
-            output_writer.write_table(pa.Table.from_pandas(fcd_data_df))
-            fcd_arrays.reset()
-
-        output_writer.close()
+                    fcd_arrays.time_step.append(time_step)
+                    vehicle_id = self.get_vehicle_id_from_pool(
+                        vehicle_ele.attrib["id"], shard
+                    )
+                    activation_start = time.perf_counter()
+                    self.activation.update_activation(time_step, vehicle_id)
+                    self.timer.add(ACTIVATIONS, time.perf_counter() - activation_start)
+                    fcd_arrays = self._read_vehicle_data(
+                        vehicle_ele, fcd_arrays, vehicle_id
+                    )
+
+                    if fcd_arrays.array_size >= self.batch_sizer.rows:
+                        logger.debug("Writing fcd data to parquet at %s", time_step)
+                        fcd_arrays = self._queue_batch(batch_writer, fcd_arrays)
+                # The shards of a time step follow each other in the merged steps.
+                if step_closed:
+                    fcd_arrays = self._complete_time_step(
+                        time_step, progress_bar, batch_writer, fcd_arrays
+                    )
+
+            if fcd_arrays.array_size > 0:
+                fcd_arrays = self._queue_batch(batch_writer, fcd_arrays)
+            parsed = True
+        finally:
+            try:
+                # A failed parse raises its own error and not the one of the writer.
+                with self.timer.time(WRITER_WAIT):
+                    batch_writer.close(raise_error=parsed)
+            finally:
+                with self.timer.time(WRITER_WAIT), self.timer.time(PARQUET_ENCODING):
+                    output_writer.close()
+
         progress_bar.close()
+        # Parsing is what remains of the conversion time after the other sections.
+        conversion_time = time.perf_counter() - conversion_start
+        self.timer.add(
+            XML_PARSING,
+            conversion_time
+            - self.timer.sections.get(ACTIVATIONS, 0.0)
+            - self.timer.sections.get(ARROW_CONVERSION, 0.0)
+            - self.timer.sections.get(WRITER_WAIT, 0.0),
+        )
         self.unique_vehicle_count = len(self.activation.activation_data)
-        self.activation.write_activation_data()
+        with self.timer.time(ACTIVATIONS):
+            self.activation.close_updates()
+            self.activation.write_activation_data()
+
+    def _complete_time_step(
+        self,
+        timestamp: int,
+        progress_bar: tqdm.tqdm,
+        batch_writer: WriterThread,
+        fcd_arrays: FCDDataArrays,
+    ) -> FCDDataArrays:
+        """End the activations of the vehicles missing from a finished time step.
+
+        The time step completes when its closing tag is read in every shard.
+        When following a trace, the rows of the time step are written as a row
+        group and the activation updates are streamed right away.
+        """
+        if self.follow_timeout is not None and fcd_arrays.array_size > 0:
+            fcd_arrays = self._queue_batch(batch_writer, fcd_arrays)
+        with self.timer.time(ACTIVATIONS):
+            self.activation.time_step_complete(timestamp)
+        progress_bar.update(1)
+        return fcd_arrays
+
+    def _queue_batch(
+        self, batch_writer: WriterThread, fcd_arrays: FCDDataArrays
+    ) -> FCDDataArrays:
+        """Convert the buffered rows to Arrow, hand them to the writer and start anew.
+
+        Building Arrow arrays from Python objects needs the GIL, so it stays on
+        the parser thread, and the writer thread only compresses and writes.
+        """
+        with self.timer.time(ARROW_CONVERSION):
+            fcd_table = fcd_arrays.to_table(self.coordinate_encoding)
+        with self.timer.time(WRITER_WAIT):
+            batch_writer.put(fcd_table)
+        return FCDDataArrays()
 
     def _read_vehicle_data(
         self, vehicle_ele: Et.Element, fcd_arrays: FCDDataArrays, vehicle_id: int
     ) -> FCDDataArrays:
         """Read the vehicle data from XML element and add it to FCD arrays."""
-        fcd_arrays.agent_id = np.append(
-            fcd_arrays.agent_id, vehicle_id
-        )
-        fcd_arrays.x = np.append(
-            fcd_arrays.x, float(vehicle_ele.attrib["x"]) - self.offset_x
-        )
-        fcd_arrays.y = np.append(
-            fcd_arrays.y, float(vehicle_ele.attrib["y"]) - self.offset_y
+        fcd_arrays.agent_id.append(vehicle_id)
+        fcd_arrays.x.append(float(vehicle_ele.attrib["x"]) - self.offset_x)
+        fcd_arrays.y.append(float(vehicle_ele.attrib["y"]) - self.offset_y)
+        fcd_arrays.velocity.append(float(vehicle_ele.attrib["speed"]))
+        fcd_arrays.veh_type.append(vehicle_ele.attrib["type"])
+        fcd_arrays.road_data.append(vehicle_ele.attrib["lane"])
+        fcd_arrays.array_size += 1
+        return fcd_arrays
+
+    def _write_batch(self, output_writer: pq.ParquetWriter, fcd_table: pa.Table) -> None:
+        """Write a batch as a row group and size the next batch."""
+        with self.timer.time(PARQUET_ENCODING):
+            output_writer.write_table(fcd_table, row_group_size=FCD_ROW_GROUP_SIZE)
+        self.batch_sizer.observe(
+            fcd_table.num_rows, fcd_table.nbytes * FCD_ROW_FACTOR
         )
-        fcd_arrays.velocity = np.append(
-            fcd_arrays.velocity, float(vehicle_ele.attrib["speed"])
+
+
+def iter_time_steps(
+    fcd_file: Path, shard: int = 0, follow_timeout: float | None = None
+) -> Iterator[tuple[int, int, Et.Element]]:
+    """Yield the time in milliseconds, the shard and the element of every time step.
+
+    The element of a time step is cleared once the next one is asked for, so only
+    the current time step of the FCD file is kept in memory. With a follow
+    timeout, the FCD file is read as SUMO writes it, until its root element
+    closes or no data arrives within the timeout.
+    """
+    source = (
+        fcd_file if follow_timeout is None else FollowReader(fcd_file, follow_timeout)
+    )
+    root = None
+    try:
+        for event, veh_ele in iterparse(source, events=("start", "end")):
+            if root is None:
+                root = veh_ele
+            if event == "end" and veh_ele.tag == "timestep":
+                timestamp = int(round(float(veh_ele.attrib["time"]), 1) * 10) * 100
+                yield timestamp, shard, veh_ele
+                veh_ele.clear()
+            elif event == "end" and veh_ele is root:
+                # A followed file is not read past its end.
+                return
+    except Et.ParseError:
+        if follow_timeout is None or not source.timed_out:
+            raise
+        logger.warning(
+            "The trace %s ended without closing, stopping at the last time step",
+            fcd_file,
         )
+    finally:
+        if follow_timeout is not None:
+            source.close()
 
-        fcd_arrays.veh_type = np.append(fcd_arrays.veh_type, vehicle_ele.attrib["type"])
-        road_data = vehicle_ele.attrib["lane"]
-        fcd_arrays.road_data = np.append(fcd_arrays.road_data, road_data)
-        fcd_arrays.array_size += 1
-        return fcd_arrays
 
+def merge_time_steps(
+    fcd_files: list[Path], follow_timeout: float | None = None
+) -> Iterator[tuple[int, int, Et.Element, bool]]:
+    """Merge the time steps of the shards of a trace in the order of time.
+
+    The k-way merge holds one time step per shard, the shards are never read as
+    a whole. The time steps of a time in several shards follow each other in
+    the order of the shards. The last value tells whether the time step is
+    closed, which is when no other shard holds the same time, so a time step is
+    complete as soon as its last closing tag is read.
+    """
+    heads = []
+    for shard, fcd_file in enumerate(fcd_files):
+        shard_steps = iter_time_steps(fcd_file, shard, follow_timeout)
+        first_step = next(shard_steps, None)
+        if first_step is not None:
+            heads.append((*first_step, shard_steps))
+    heapq.heapify(heads)
+    while heads:
+        timestamp, shard, veh_ele, shard_steps = heapq.heappop(heads)
+        yield timestamp, shard, veh_ele, not heads or heads[0][0] != timestamp
+        # The next time step of the shard is read once this one is processed.
+        next_step = next(shard_steps, None)
+        if next_step is not None:
+            heapq.heappush(heads, (*next_step, shard_steps))
 
-def _get_output_writer(parquet_file: Path) -> pq.ParquetWriter:
+
+def _get_output_writer(
+    parquet_file: Path, encoding: CoordinateEncoding
+) -> pq.ParquetWriter:
     """Get the output writer for the parquet file."""
-    schema = _build_fcd_schema()
-    return pq.ParquetWriter(parquet_file, schema)
+    schema = _build_fcd_schema(encoding)
+    return pq.ParquetWriter(parquet_file, schema, **encoding.writer_options(schema))
 
 
-def _build_fcd_schema() -> pa.Schema:
-    """Build the schema for the FCD data."""
+def _build_fcd_schema(encoding: CoordinateEncoding) -> pa.Schema:
+    """Build the schema for the FCD data, with the stored type of the coordinates."""
     return pa.schema(
         [
             pa.field(TIME_STEP, pa.int64()),
             pa.field(AGENT_ID, pa.int64()),
-            pa.field(COORD_X, pa.float64()),
-            pa.field(COORD_Y, pa.float64()),
-            pa.field(VELOCITY, pa.float64()),
+            pa.field(COORD_X, encoding.field_type),
+            pa.field(COORD_Y, encoding.field_type),
+            pa.field(VELOCITY, encoding.field_type),
             pa.field(ROAD_DATA, pa.string()),
             pa.field(VEH_TYPE, pa.string()),
-        ]
+        ],
+        metadata=encoding.schema_metadata(),
     )
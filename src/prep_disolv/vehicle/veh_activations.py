@@ -4,8 +4,23 @@ from pathlib import Path
 
 import numpy as np
 import pandas as pd
+import pyarrow as pa
 
-from prep_disolv.common.columns import ACTIVATIONS_FOLDER, ACTIVATION_COLUMNS
+from prep_disolv.common.activations import write_activations_polars
+from prep_disolv.common.columns import ACTIVATIONS_FOLDER, ACTIVATION_COLUMNS, \
+    ACTIVATION_UPDATE_COLUMNS
+from prep_disolv.common.config import ARROW_ENGINE, POLARS_ENGINE
+
+
+def build_activation_update_schema() -> pa.Schema:
+    """Build the schema of the vehicles that start or stop at a time step."""
+    return pa.schema(
+        [
+            pa.field(ACTIVATION_UPDATE_COLUMNS[0], pa.int64()),
+            pa.field(ACTIVATION_UPDATE_COLUMNS[1], pa.int64()),
+            pa.field(ACTIVATION_UPDATE_COLUMNS[2], pa.bool_()),
+        ]
+    )
 
 
 class ActivationData:
@@ -35,13 +50,34 @@ class ActivationData:
 
 
 class VehicleActivation:
-    def __init__(self, output_path: Path):
+    def __init__(self, output_path: Path, engine: str = ARROW_ENGINE):
         self.output_path = output_path
+        self.engine = engine
         self.activation_data: dict[int, ActivationData] = {}
         self.active_vehicles: set = set()
         self.activation_file = (
             self.output_path / ACTIVATIONS_FOLDER / "vehicle_activations.parquet"
         )
+        self.update_file = (
+            self.output_path / ACTIVATIONS_FOLDER / "vehicle_activation_updates.arrows"
+        )
+        self.updates: list[tuple[int, int, bool]] | None = None
+        self.update_sink: pa.OSFile | None = None
+        self.update_writer: pa.ipc.RecordBatchStreamWriter | None = None
+
+    def follow_updates(self) -> None:
+        """Stream the vehicles that start or stop as every time step completes.
+
+        The updates are written to an Arrow IPC stream, which readers can read
+        while it grows. The updates of a time step are written once its closing
+        tag is read. A vehicle starts at the first time step of an activation
+        interval and stops at its last one.
+        """
+        self.updates = []
+        self.update_sink = pa.OSFile(str(self.update_file), "wb")
+        self.update_writer = pa.ipc.new_stream(
+            self.update_sink, build_activation_update_schema()
+        )
 
     def update_activation(self, timestamp: int, vehicle_id: int) -> None:
         self.active_vehicles.add(vehicle_id)
@@ -49,14 +85,65 @@ class VehicleActivation:
             self.activation_data[vehicle_id] = ActivationData(vehicle_id)
         if self.activation_data[vehicle_id].trace_disrupted:
             self.activation_data[vehicle_id].start_new_trace(timestamp)
+            if self.updates is not None:
+                self.updates.append((timestamp, vehicle_id, True))
         self.activation_data[vehicle_id].add_end_time(timestamp)
 
     def time_step_complete(self, time_stamp: int) -> None:
         for vehicle_id in self.active_vehicles:
-            if self.activation_data[vehicle_id].end_times[-1] < time_stamp:
-                self.activation_data[vehicle_id].disrupt_trace()
+            activation_data = self.activation_data[vehicle_id]
+            if activation_data.end_times[-1] < time_stamp:
+                if self.updates is not None and not activation_data.trace_disrupted:
+                    self.updates.append(
+                        (activation_data.end_times[-1], vehicle_id, False)
+                    )
+                activation_data.disrupt_trace()
+        if self.updates is not None:
+            self._write_updates()
+
+    def close_updates(self) -> None:
+        """Stop the vehicles that are still active and close the update stream."""
+        if self.update_writer is None:
+            return
+        for vehicle_id in self.active_vehicles:
+            activation_data = self.activation_data[vehicle_id]
+            if not activation_data.trace_disrupted:
+                self.updates.append((activation_data.end_times[-1], vehicle_id, False))
+        self._write_updates()
+        self.update_writer.close()
+        self.update_sink.close()
+        self.update_writer = None
+        self.updates = None
+
+    def _write_updates(self) -> None:
+        """Write the buffered updates as a record batch of the stream."""
+        if not self.updates:
+            return
+        time_steps, vehicle_ids, active = zip(*self.updates, strict=True)
+        self.update_writer.write_batch(
+            pa.RecordBatch.from_arrays(
+                [
+                    pa.array(time_steps, pa.int64()),
+                    pa.array(vehicle_ids, pa.int64()),
+                    pa.array(active, pa.bool_()),
+                ],
+                schema=build_activation_update_schema(),
+            )
+        )
+        self.updates = []
 
     def write_activation_data(self) -> None:
+        if self.engine == POLARS_ENGINE:
+            activations = self.activation_data.values()
+            write_activations_polars(
+                self.activation_file,
+                [activation.id for activation in activations],
+                [activation.ns3_id for activation in activations],
+                [activation.start_times for activation in activations],
+                [activation.end_times for activation in activations],
+            )
+            return
+
         activation_df = pd.DataFrame(columns=ACTIVATION_COLUMNS)
         for vehicle_id in self.activation_data:
             activation_data = self.activation_data[vehicle_id]
@@ -1,13 +1,18 @@
 from __future__ import annotations
 
 import logging
+from pathlib import Path
 
+from prep_disolv.common.columns import ACTIVATIONS_FOLDER, POSITIONS_FOLDER
 from prep_disolv.common.config import *
+from prep_disolv.common.utils import link_or_copy
+from prep_disolv.store.trajectories import remove_agent_major_files
 from prep_disolv.vehicle.sumo import SumoConverter
 
 logger = logging.getLogger(__name__)
 
 SUMO = "sumo"
+VEHICLE_ACTIVATION_FILE = "vehicle_activations.parquet"
 
 
 class VehicleConverter:
@@ -16,6 +21,7 @@ class VehicleConverter:
         self.config = config
         self.vehicle_file = None
         self.vehicle_count = 0
+        self.sections: dict[str, float] = {}
 
     def create_vehicles(self) -> int:
         """Create the vehicle data."""
@@ -29,4 +35,31 @@ class VehicleConverter:
             sumo_converter.fcd_to_parquet()
             self.vehicle_count = sumo_converter.get_unique_vehicle_count()
             self.vehicle_file = sumo_converter.get_parquet_file()
+            # The agent-major copy of earlier positions no longer matches them.
+            remove_agent_major_files(self.vehicle_file)
+            self.sections = sumo_converter.timer.sections
+        return self.vehicle_count
+
+    def reuse_vehicles(self, converted: VehicleConverter) -> int:
+        """Reuse the vehicle data converted for another scenario with the same trace.
+
+        The positions and activations are linked into the output folder of this
+        scenario instead of converting the trace again.
+        """
+        logger.info("Reusing the vehicle data of %s", converted.config.config_file)
+        output_path = self.config.path / self.config.get(OUTPUT_SETTINGS)[OUTPUT_PATH]
+        converted_path = (
+            converted.config.path / converted.config.get(OUTPUT_SETTINGS)[OUTPUT_PATH]
+        )
+        link_or_copy(
+            converted_path / ACTIVATIONS_FOLDER / VEHICLE_ACTIVATION_FILE,
+            output_path / ACTIVATIONS_FOLDER / VEHICLE_ACTIVATION_FILE,
+        )
+        if converted.vehicle_file is not None:
+            self.vehicle_file = (
+                output_path / POSITIONS_FOLDER / Path(converted.vehicle_file).name
+            )
+            link_or_copy(Path(converted.vehicle_file), self.vehicle_file)
+            remove_agent_major_files(self.vehicle_file)
+        self.vehicle_count = converted.vehicle_count
         return self.vehicle_count
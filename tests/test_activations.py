@@ -0,0 +1,42 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from prep_disolv.common.columns import ACTIVATION_COLUMNS
+from prep_disolv.common.config import ARROW_ENGINE, POLARS_ENGINE
+from prep_disolv.vehicle.veh_activations import VehicleActivation
+
+# The vehicles present at every time step, with two of them leaving and returning.
+TIME_STEPS = {
+    0: [100003, 100001],
+    100: [100003, 100001, 100002],
+    200: [100001, 100002],
+    300: [100002],
+    400: [100003, 100002, 100001],
+    500: [100003],
+}
+
+
+def write_activations(output_path: Path, engine: str) -> pa.Table:
+    """Track the vehicles of the time steps and read the written activations."""
+    (output_path / "activations").mkdir(parents=True)
+    activation = VehicleActivation(output_path, engine)
+    for time_step, vehicle_ids in TIME_STEPS.items():
+        for vehicle_id in vehicle_ids:
+            activation.update_activation(time_step, vehicle_id)
+        activation.time_step_complete(time_step)
+    activation.write_activation_data()
+    return pq.read_table(activation.activation_file)
+
+
+def test_engines_write_the_same_activations(tmp_path: Path) -> None:
+    arrow_table = write_activations(tmp_path / "arrow", ARROW_ENGINE)
+    polars_table = write_activations(tmp_path / "polars", POLARS_ENGINE)
+
+    assert arrow_table.column_names == ACTIVATION_COLUMNS
+    assert arrow_table.schema.remove_metadata() == polars_table.schema.remove_metadata()
+    assert arrow_table.to_pylist() == polars_table.to_pylist()
+    assert arrow_table.num_rows == 5
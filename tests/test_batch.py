@@ -0,0 +1,115 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+import pytest
+
+from prep_disolv.common.config import expand_config_files
+from prep_disolv.common.metrics import StageMetrics
+from prep_disolv.core import batch
+from prep_disolv.core.batch import BatchRunner
+from prep_disolv.core.core import SHARED_VEHICLE_TRACE
+
+CONFIG = """[traffic]
+network = "{network}"
+trace = {trace}
+
+[vehicles]
+simulator = "sumo"
+id_init = {id_init}
+
+[output]
+output_path = "{output}"
+"""
+
+
+def write_config(
+    config_file: Path,
+    trace: str = '"scenario.fcd.xml"',
+    network: str = "scenario.net.xml",
+    id_init: int = 100000,
+) -> Path:
+    """Write the config of a scenario variant with its own output folder."""
+    config_file.write_text(
+        CONFIG.format(
+            network=network, trace=trace, id_init=id_init, output=config_file.stem
+        )
+    )
+    return config_file
+
+
+def test_variants_share_the_trace_conversion(tmp_path: Path) -> None:
+    shared = [write_config(tmp_path / f"variant_{index}.toml") for index in range(3)]
+    (tmp_path / "other").mkdir()
+    # The same trace and network, given relative to another folder.
+    moved = write_config(
+        tmp_path / "other" / "moved.toml",
+        '"../scenario.fcd.xml"',
+        "../scenario.net.xml",
+    )
+    other_vehicles = write_config(tmp_path / "ids.toml", id_init=500000)
+    other_network = write_config(tmp_path / "net.toml", network="other.net.xml")
+    sharded = write_config(
+        tmp_path / "shards.toml", '["scenario.fcd.xml", "second.fcd.xml"]'
+    )
+    # The engine writes the vehicle activations of the shared conversion.
+    other_engine = write_config(tmp_path / "engine.toml")
+    with other_engine.open("a") as config:
+        config.write('\n[execution]\nengine = "polars"\n')
+
+    groups = BatchRunner(
+        [*shared, moved, other_vehicles, other_network, sharded, other_engine]
+    ).group_configs()
+
+    assert groups == [
+        [*shared, moved],
+        [other_vehicles],
+        [other_network],
+        [sharded],
+        [other_engine],
+    ]
+
+
+def test_shared_conversion_is_measured_for_every_variant(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    variants = [write_config(tmp_path / f"variant_{index}.toml") for index in range(2)]
+    converted = object()
+    reported: list[tuple[Path, StageMetrics]] = []
+
+    def report(_config: object, metrics: StageMetrics, _converter: object) -> None:
+        metrics.rows = 42
+
+    def prepare(config_file: Path, vehicles: object, metrics: StageMetrics) -> int:
+        assert vehicles is converted
+        reported.append((config_file, metrics))
+        return 1
+
+    monkeypatch.setattr(batch, "setup_logging", lambda *_: None)
+    monkeypatch.setattr(batch, "convert_vehicle_trace", lambda _config: converted)
+    monkeypatch.setattr(batch, "report_vehicle_trace", report)
+    monkeypatch.setattr(batch, "_prepare_variant", prepare)
+
+    agent_counts = BatchRunner(variants).run()
+
+    assert agent_counts == dict.fromkeys(variants, 1)
+    assert [config_file for config_file, _ in reported] == variants
+    for _, metrics in reported:
+        assert metrics.name == SHARED_VEHICLE_TRACE
+        assert metrics.rows == 42
+        assert metrics.wall_time > 0
+
+
+def test_config_patterns_expand_in_order(tmp_path: Path) -> None:
+    for name in ["b.toml", "a.toml", "c.txt"]:
+        (tmp_path / name).write_text("")
+
+    config_files = expand_config_files(
+        [str(tmp_path / "b.toml"), str(tmp_path / "*.toml")]
+    )
+
+    assert config_files == [tmp_path / "b.toml", tmp_path / "a.toml"]
+    with pytest.raises(ValueError, match="No config files match"):
+        expand_config_files([str(tmp_path / "*.json")])
+    with pytest.raises(ValueError, match="does not exist"):
+        expand_config_files([str(tmp_path / "missing.toml")])
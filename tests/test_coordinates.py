@@ -0,0 +1,135 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+
+from prep_disolv.common.columns import AGENT_ID, COORD_X, COORD_Y, TIME_STEP, VELOCITY
+from prep_disolv.common.config import (
+    BYTE_STREAM_SPLIT_ENCODING,
+    DELTA_ENCODING,
+    FIXED_COORDINATES,
+    FLOAT32_COORDINATES,
+    FLOAT64_COORDINATES,
+    PLAIN_ENCODING,
+)
+from prep_disolv.common.coordinates import (
+    COORDINATE_RESOLUTION,
+    QUANTIZED_COLUMNS,
+    CoordinateEncoding,
+    decode_positions,
+    decoded_schema,
+    read_resolution,
+)
+
+ENCODINGS = [
+    (FLOAT64_COORDINATES, PLAIN_ENCODING, 0.0),
+    (FLOAT32_COORDINATES, PLAIN_ENCODING, 1e-3),
+    (FLOAT32_COORDINATES, BYTE_STREAM_SPLIT_ENCODING, 1e-3),
+    (FIXED_COORDINATES, PLAIN_ENCODING, 0.005),
+    (FIXED_COORDINATES, BYTE_STREAM_SPLIT_ENCODING, 0.005),
+    (FIXED_COORDINATES, DELTA_ENCODING, 0.005),
+]
+
+
+def write_positions(
+    position_file: Path, encoding: CoordinateEncoding
+) -> dict[str, np.ndarray]:
+    """Write random positions with the encoding and get the original values."""
+    rng = np.random.default_rng(4)
+    values = {
+        COORD_X: rng.uniform(-2000, 20000, 500),
+        COORD_Y: rng.uniform(0, 15000, 500),
+        VELOCITY: rng.uniform(0, 40, 500),
+    }
+    fields = [pa.field(TIME_STEP, pa.int64()), pa.field(AGENT_ID, pa.int64())]
+    fields += [pa.field(column, encoding.field_type) for column in values]
+    schema = pa.schema(fields, metadata=encoding.schema_metadata())
+    table = pa.Table.from_arrays(
+        [
+            pa.array(np.arange(500) // 10 * 100),
+            pa.array(np.arange(500) % 10),
+            *(
+                encoding.encode(column, column_values)
+                for column, column_values in values.items()
+            ),
+        ],
+        schema=schema,
+    )
+    pq.write_table(table, position_file, **encoding.writer_options(schema))
+    return values
+
+
+@pytest.mark.parametrize(("coordinates", "encoding", "tolerance"), ENCODINGS)
+def test_positions_are_decoded_to_float64(
+    tmp_path: Path, coordinates: str, encoding: str, tolerance: float
+) -> None:
+    coordinate_encoding = CoordinateEncoding(coordinates, 0.01, encoding)
+    values = write_positions(tmp_path / "positions.parquet", coordinate_encoding)
+
+    stored = pq.read_table(tmp_path / "positions.parquet")
+    positions = decode_positions(stored)
+
+    assert stored.schema.field(COORD_X).type == coordinate_encoding.field_type
+    for column in QUANTIZED_COLUMNS:
+        assert positions.schema.field(column).type == pa.float64()
+        assert np.abs(positions[column].to_numpy() - values[column]).max() <= (
+            tolerance + 1e-9
+        )
+    assert positions.schema == decoded_schema(stored.schema)
+    assert COORDINATE_RESOLUTION.encode() not in decoded_schema(stored.schema).metadata
+    # Record batches and a subset of the columns are decoded the same way.
+    batch = next(
+        pq.ParquetFile(tmp_path / "positions.parquet").iter_batches(columns=[COORD_Y])
+    )
+    assert (
+        decode_positions(batch, read_resolution(stored.schema)).column(0).to_pylist()
+        == positions[COORD_Y].to_pylist()
+    )
+
+
+@pytest.mark.parametrize(
+    ("encoding", "parquet_encoding"),
+    [
+        (BYTE_STREAM_SPLIT_ENCODING, "BYTE_STREAM_SPLIT"),
+        (DELTA_ENCODING, "DELTA_BINARY_PACKED"),
+    ],
+)
+def test_columns_are_written_with_the_encoding(
+    tmp_path: Path, encoding: str, parquet_encoding: str
+) -> None:
+    write_positions(
+        tmp_path / "positions.parquet",
+        CoordinateEncoding(FIXED_COORDINATES, 0.01, encoding),
+    )
+
+    metadata = pq.ParquetFile(tmp_path / "positions.parquet").metadata
+    for index, name in enumerate(metadata.schema.names):
+        encodings = metadata.row_group(0).column(index).encodings
+        assert (parquet_encoding in encodings) == (name in QUANTIZED_COLUMNS)
+
+
+def test_fixed_point_overflow_is_rejected() -> None:
+    encoding = CoordinateEncoding(FIXED_COORDINATES, 0.0001)
+
+    with pytest.raises(ValueError, match="coarser resolution"):
+        encoding.encode(COORD_X, [0.0, 300000.0])
+
+
+@pytest.mark.parametrize(
+    ("coordinates", "resolution", "encoding", "message"),
+    [
+        ("float16", 0.01, PLAIN_ENCODING, "Unknown coordinates"),
+        (FIXED_COORDINATES, 0.01, "gzip", "Unknown encoding"),
+        (FLOAT32_COORDINATES, 0.01, DELTA_ENCODING, "needs fixed-point"),
+        (FIXED_COORDINATES, 0.0, PLAIN_ENCODING, "must be positive"),
+    ],
+)
+def test_encoding_settings_are_checked(
+    coordinates: str, resolution: float, encoding: str, message: str
+) -> None:
+    with pytest.raises(ValueError, match=message):
+        CoordinateEncoding(coordinates, resolution, encoding)
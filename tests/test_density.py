@@ -0,0 +1,99 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+import pytest
+
+from prep_disolv.common.columns import AGENT_ID, COORD_X, COORD_Y, TIME_STEP
+from prep_disolv.plot.density import DensityBinner
+
+STEP_SIZE = 100
+
+
+def write_positions(position_file: Path, time_steps: int = 50) -> pa.Table:
+    """Write 30 random positions per time step of 100 ms."""
+    rng = np.random.default_rng(3)
+    rows = 30 * time_steps
+    positions = pa.table(
+        {
+            TIME_STEP: np.repeat(np.arange(time_steps) * STEP_SIZE, 30),
+            AGENT_ID: np.tile(np.arange(30), time_steps),
+            COORD_X: rng.uniform(0, 200, rows),
+            COORD_Y: rng.uniform(-50, 50, rows),
+        }
+    )
+    pq.write_table(positions, position_file, row_group_size=200)
+    return positions
+
+
+@pytest.mark.parametrize("window", [None, 1000, 700])
+def test_density_matches_a_histogram(tmp_path: Path, window: int | None) -> None:
+    positions = write_positions(tmp_path / "positions.parquet")
+    bounds = (0.0, -50.0, 200.0, 50.0)
+    binner = DensityBinner(tmp_path / "positions.parquet", (20, 10), window, bounds)
+
+    window_starts, grids = zip(*binner.iter_windows(), strict=True)
+
+    time_steps = positions[TIME_STEP].to_numpy()
+    windows = np.zeros_like(time_steps) if window is None else time_steps // window
+    assert binner.window_count == windows.max() + 1
+    assert list(window_starts) == [
+        index * (window or 0) for index in range(windows.max() + 1)
+    ]
+    for index, grid in enumerate(grids):
+        in_window = windows == index
+        expected, _, _ = np.histogram2d(
+            positions[COORD_Y].to_numpy()[in_window],
+            positions[COORD_X].to_numpy()[in_window],
+            bins=(10, 20),
+            range=((-50, 50), (0, 200)),
+        )
+        assert grid.shape == (10, 20)
+        assert np.array_equal(grid, expected)
+    assert binner.max_count == max(grid.max() for grid in grids)
+
+
+def test_window_is_in_milliseconds(tmp_path: Path) -> None:
+    write_positions(tmp_path / "positions.parquet", time_steps=100)
+    binner = DensityBinner(tmp_path / "positions.parquet", 10, 2000)
+
+    grids = [grid for _, grid in binner.iter_windows()]
+
+    # 10 s of positions make five windows of 2 s, not one per 2000 time steps.
+    assert [grid.sum() for grid in grids] == [600] * 5
+    assert binner.bounds[0] >= 0
+    assert binner.bounds[2] <= 200
+
+
+def test_windows_are_yielded_as_the_positions_pass_them(tmp_path: Path) -> None:
+    positions = write_positions(tmp_path / "positions.parquet", time_steps=20)
+    # A gap in the trace still gets its empty window.
+    positions = positions.filter(
+        pc.invert(pc.is_in(positions[TIME_STEP], pa.array([500, 600, 700, 800])))
+    )
+    pq.write_table(positions, tmp_path / "positions.parquet", row_group_size=50)
+    windows = DensityBinner(tmp_path / "positions.parquet", 10, 500).iter_windows()
+
+    # The first window is complete before the file is read to its end.
+    assert next(windows)[1].sum() == 150
+    assert [grid.sum() for _, grid in windows] == [30, 150, 150]
+
+
+def test_unsorted_positions_are_rejected(tmp_path: Path) -> None:
+    positions = write_positions(tmp_path / "positions.parquet", time_steps=10)
+    pq.write_table(
+        positions.take(np.arange(positions.num_rows)[::-1]),
+        tmp_path / "positions.parquet",
+    )
+
+    with pytest.raises(ValueError, match="not sorted by time"):
+        list(DensityBinner(tmp_path / "positions.parquet", 10, 200).iter_windows())
+
+
+def test_window_must_be_positive(tmp_path: Path) -> None:
+    with pytest.raises(ValueError, match="must be positive"):
+        DensityBinner(tmp_path / "positions.parquet", window=0)
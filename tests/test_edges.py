@@ -0,0 +1,115 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+
+from prep_disolv.common.columns import AGENT_ID, TIME_STEP
+from prep_disolv.vehicle.edges import (
+    EDGE_ID,
+    MEAN_SPEED,
+    OCCUPANCY,
+    SAMPLES,
+    VEHICLE_COUNT,
+    WINDOW_START,
+    EdgeStatsAggregator,
+    group_percentiles,
+    speed_column,
+)
+from prep_disolv.vehicle.sumo import ROAD_DATA, VELOCITY
+
+LANES = ["a_0", "a_1", "b_0", ":j0_0_0", "edge_with_10_lanes_12"]
+
+
+def write_positions(position_file: Path, time_steps: int = 40) -> pa.Table:
+    """Write 25 random vehicles on five lanes per time step of 100 ms."""
+    rng = np.random.default_rng(8)
+    rows = 25 * time_steps
+    positions = pa.table(
+        {
+            TIME_STEP: np.repeat(np.arange(time_steps) * 100, 25),
+            AGENT_ID: np.tile(np.arange(25), time_steps),
+            VELOCITY: rng.uniform(0, 30, rows),
+            ROAD_DATA: pa.array(rng.choice(LANES, rows)),
+        }
+    )
+    pq.write_table(positions, position_file, row_group_size=70)
+    return positions
+
+
+def test_group_percentiles_match_numpy() -> None:
+    rng = np.random.default_rng(2)
+    groups = [np.sort(rng.uniform(0, 10, size)) for size in [1, 2, 7, 30]]
+    counts = np.array([len(group) for group in groups])
+    starts = np.cumsum(counts) - counts
+
+    for percentile in [0, 50, 85, 100]:
+        expected = [np.percentile(group, percentile) for group in groups]
+        assert group_percentiles(
+            np.concatenate(groups), starts, counts, percentile
+        ) == pytest.approx(expected)
+
+
+def test_edge_statistics_match_brute_force(tmp_path: Path) -> None:
+    positions = write_positions(tmp_path / "positions.parquet").to_pandas()
+    window = 1000
+
+    row_count = EdgeStatsAggregator(
+        tmp_path / "positions.parquet",
+        tmp_path / "edges.parquet",
+        window,
+        [10, 50, 85],
+    ).aggregate()
+
+    stats = pq.read_table(tmp_path / "edges.parquet").to_pylist()
+    assert row_count == len(stats)
+    positions[EDGE_ID] = positions[ROAD_DATA].str.replace(r"_[0-9]+$", "", regex=True)
+    positions[WINDOW_START] = positions[TIME_STEP] // window * window
+    groups = positions.groupby([WINDOW_START, EDGE_ID])
+    assert len(stats) == len(groups)
+    for row in stats:
+        group = groups.get_group((row[WINDOW_START], row[EDGE_ID]))
+        speeds = group[VELOCITY].to_numpy()
+        assert row[SAMPLES] == len(group)
+        assert row[VEHICLE_COUNT] == group[AGENT_ID].nunique()
+        assert row[MEAN_SPEED] == pytest.approx(speeds.mean())
+        for percentile in [10, 50, 85]:
+            assert row[speed_column(percentile)] == pytest.approx(
+                np.percentile(speeds, percentile)
+            )
+        assert row[OCCUPANCY] == pytest.approx(len(group) / (window // 100))
+    # The windows are written in order.
+    window_starts = [row[WINDOW_START] for row in stats]
+    assert window_starts == sorted(window_starts)
+    assert set(window_starts) == {0, 1000, 2000, 3000}
+
+
+def test_occupancy_counts_the_steps_without_vehicles(tmp_path: Path) -> None:
+    # One vehicle on a at 2 of the 10 steps of the first window, none in between.
+    positions = pa.table(
+        {
+            TIME_STEP: [0, 100, 1000],
+            AGENT_ID: [1, 1, 1],
+            VELOCITY: [10.0, 12.0, 14.0],
+            ROAD_DATA: ["a_0", "a_0", "a_0"],
+        }
+    )
+    pq.write_table(positions, tmp_path / "positions.parquet")
+
+    EdgeStatsAggregator(
+        tmp_path / "positions.parquet", tmp_path / "edges.parquet", 1000
+    ).aggregate()
+
+    stats = pq.read_table(tmp_path / "edges.parquet")
+    assert stats[WINDOW_START].to_pylist() == [0, 1000]
+    assert stats[OCCUPANCY].to_pylist() == pytest.approx([0.2, 0.1])
+
+
+def test_percentiles_are_checked(tmp_path: Path) -> None:
+    with pytest.raises(ValueError, match="between 0 and 100"):
+        EdgeStatsAggregator(
+            tmp_path / "in.parquet", tmp_path / "out.parquet", 10, [101]
+        )
@@ -0,0 +1,103 @@
+from __future__ import annotations
+
+import json
+from pathlib import Path
+
+import pyarrow.parquet as pq
+import pytest
+
+from prep_disolv.export.features import BBOX, FeatureConverter
+from prep_disolv.export.geometry import GEOMETRY, GEOPARQUET_FORMAT, GPKG_FORMAT
+
+shapely = pytest.importorskip("shapely")
+pyogrio = pytest.importorskip("pyogrio")
+
+# The start and end of five road segments.
+ROADS = [
+    ((0.0, 0.0), (1.0, 2.0)),
+    ((2.0, 1.0), (3.0, 0.5)),
+    ((-1.0, 4.0), (0.5, 3.0)),
+    ((5.0, 5.0), (6.0, 7.0)),
+    ((8.0, -2.0), (7.5, -1.0)),
+]
+
+
+def write_roads(geojson_file: Path) -> None:
+    """Write the road segments as GeoJSON line strings with a name."""
+    features = [
+        {
+            "type": "Feature",
+            "properties": {"name": f"road {index}"},
+            "geometry": {"type": "LineString", "coordinates": [start, end]},
+        }
+        for index, (start, end) in enumerate(ROADS)
+    ]
+    geojson_file.write_text(
+        json.dumps({"type": "FeatureCollection", "features": features})
+    )
+
+
+def test_geojson_to_geoparquet_writes_a_row_group_per_chunk(tmp_path: Path) -> None:
+    write_roads(tmp_path / "roads.geojson")
+    converter = FeatureConverter(
+        tmp_path / "roads.geojson", tmp_path / "out", GEOPARQUET_FORMAT, chunk_size=2
+    )
+
+    written = converter.convert()
+
+    assert written == len(ROADS)
+    assert converter.counts == {"roads": len(ROADS)}
+    layer_file = tmp_path / "out" / "roads.parquet"
+    assert converter.output_files == [layer_file]
+    parquet_file = pq.ParquetFile(layer_file)
+    assert [
+        parquet_file.metadata.row_group(index).num_rows
+        for index in range(parquet_file.metadata.num_row_groups)
+    ] == [2, 2, 1]
+
+    features = parquet_file.read()
+    assert features["name"].to_pylist() == [f"road {i}" for i in range(len(ROADS))]
+    geometries = shapely.from_wkb(features[GEOMETRY].to_numpy(zero_copy_only=False))
+    assert [
+        [tuple(point) for point in shapely.get_coordinates(geometry)]
+        for geometry in geometries
+    ] == [list(road) for road in ROADS]
+    assert features[BBOX].to_pylist() == [
+        {
+            "xmin": min(start[0], end[0]),
+            "ymin": min(start[1], end[1]),
+            "xmax": max(start[0], end[0]),
+            "ymax": max(start[1], end[1]),
+        }
+        for start, end in ROADS
+    ]
+    geo_metadata = json.loads(parquet_file.schema_arrow.metadata[b"geo"])
+    column_metadata = geo_metadata["columns"][GEOMETRY]
+    assert column_metadata["geometry_types"] == ["LineString"]
+    assert column_metadata["covering"][BBOX]["xmin"] == [BBOX, "xmin"]
+
+
+def test_geojson_to_gpkg_keeps_the_features(tmp_path: Path) -> None:
+    write_roads(tmp_path / "roads.geojson")
+    converter = FeatureConverter(
+        tmp_path / "roads.geojson", tmp_path / "out", GPKG_FORMAT, chunk_size=2
+    )
+
+    written = converter.convert()
+
+    gpkg_file = tmp_path / "out" / "roads.gpkg"
+    assert written == len(ROADS)
+    assert converter.output_files == [gpkg_file]
+    assert [name for name, _ in pyogrio.list_layers(gpkg_file)] == ["roads"]
+    meta, features = pyogrio.read_arrow(gpkg_file, layer="roads")
+    assert features["name"].to_pylist() == [f"road {i}" for i in range(len(ROADS))]
+    assert BBOX not in features.column_names
+    geometries = shapely.from_wkb(
+        features[meta["geometry_name"] or "wkb_geometry"].to_numpy(
+            zero_copy_only=False
+        )
+    )
+    assert [
+        [tuple(point) for point in shapely.get_coordinates(geometry)]
+        for geometry in geometries
+    ] == [list(road) for road in ROADS]
@@ -0,0 +1,114 @@
+from __future__ import annotations
+
+import threading
+import time
+from pathlib import Path
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from prep_disolv.common.config import Config
+from prep_disolv.vehicle.sumo import SumoConverter
+
+NETWORK = """<net version="1.16">
+<location netOffset="0.00,0.00" convBoundary="0.00,0.00,100.00,100.00" origBoundary="0,0,1,1" projParameter="!"/>
+</net>
+"""
+
+CONFIG = """[simulation]
+duration = 6
+step_size = 1
+
+[traffic]
+network = "live.net.xml"
+trace = "live.fcd.xml"
+follow = true
+follow_timeout = 10
+
+[vehicles]
+simulator = "sumo"
+id_init = 100000
+
+[output]
+output_path = "out"
+"""
+
+
+def fcd_time_step(time_step: int, vehicles: list[str]) -> str:
+    """Format a time step of a SUMO FCD file."""
+    rows = "".join(
+        f'    <vehicle id="{vehicle}" x="{10 + time_step}.00" y="20.00" angle="0" '
+        f'type="car" speed="5.00" pos="1" lane="e1_0" slope="0"/>\n'
+        for vehicle in vehicles
+    )
+    return f'  <timestep time="{time_step:.2f}">\n{rows}  </timestep>\n'
+
+
+def read_first_updates(update_file: Path) -> int:
+    """Count the rows of the first batch of a growing activation update stream."""
+    if not update_file.exists():
+        return 0
+    try:
+        with pa.OSFile(str(update_file)) as source:
+            return pa.ipc.open_stream(source).read_next_batch().num_rows
+    except (pa.ArrowInvalid, StopIteration):
+        return 0
+
+
+def write_trace(fcd_file: Path, update_file: Path, results: dict) -> None:
+    """Append time steps to the FCD file like a running SUMO."""
+    with fcd_file.open("a") as fcd:
+        fcd.write("<fcd-export>\n")
+        fcd.write(fcd_time_step(0, ["veh0", "veh1"]))
+        fcd.flush()
+        # A closed time step is converted before the next one is written.
+        deadline = time.monotonic() + 10
+        while read_first_updates(update_file) == 0 and time.monotonic() < deadline:
+            time.sleep(0.05)
+        results["live_updates"] = read_first_updates(update_file)
+        for time_step in range(1, 3):
+            fcd.write(fcd_time_step(time_step, ["veh0", "veh1"]))
+            fcd.flush()
+            time.sleep(0.05)
+        for time_step in range(3, 6):
+            fcd.write(fcd_time_step(time_step, ["veh1"]))
+            fcd.flush()
+            time.sleep(0.05)
+        fcd.write("</fcd-export>\n")
+
+
+def test_follow_growing_trace(tmp_path: Path) -> None:
+    (tmp_path / "live.net.xml").write_text(NETWORK)
+    (tmp_path / "config.toml").write_text(CONFIG)
+    fcd_file = tmp_path / "live.fcd.xml"
+    config = Config(str(tmp_path / "config.toml"))
+    converter = SumoConverter(config, tmp_path / "out")
+
+    results: dict = {}
+    writer = threading.Thread(
+        target=write_trace,
+        args=(fcd_file, converter.activation.update_file, results),
+    )
+    writer.start()
+    converter.fcd_to_parquet()
+    writer.join()
+
+    assert results["live_updates"] == 2
+    positions = pq.ParquetFile(converter.get_parquet_file())
+    assert positions.metadata.num_rows == 9
+    assert positions.metadata.num_row_groups == 6
+    assert converter.get_unique_vehicle_count() == 2
+
+    with pa.OSFile(str(converter.activation.update_file)) as source:
+        updates = pa.ipc.open_stream(source).read_all()
+    assert sorted(
+        zip(
+            *(updates.column(name).to_pylist() for name in updates.column_names),
+            strict=True,
+        )
+    ) == [
+        (0, 100000, True),
+        (0, 100001, True),
+        (2000, 100000, False),
+        (5000, 100001, False),
+    ]
@@ -0,0 +1,127 @@
+from __future__ import annotations
+
+import json
+from pathlib import Path
+
+import numpy as np
+import pyarrow.parquet as pq
+import pytest
+from pyproj import Transformer
+
+from prep_disolv.export.geometry import (
+    GEOMETRY,
+    JUNCTION_ID,
+    JUNCTIONS,
+    LANE_ID,
+    LANES,
+    NetGeometryExporter,
+    closed_rings,
+    lane_outlines,
+    parse_shapes,
+    polygon_wkb,
+)
+
+shapely = pytest.importorskip("shapely")
+
+PROJECTION = "+proj=utm +zone=32 +ellps=WGS84 +datum=WGS84 +units=m +no_defs"
+OFFSETS = (-500000.0, -5500000.0)
+
+
+def write_network(net_file: Path) -> None:
+    """Write a network with three lanes, an internal lane and two junctions."""
+    net_file.write_text(
+        '<?xml version="1.0" encoding="UTF-8"?>\n'
+        "<net>\n"
+        f'    <location netOffset="{OFFSETS[0]:.2f},{OFFSETS[1]:.2f}" '
+        f'projParameter="{PROJECTION}"/>\n'
+        '    <edge id=":j1_0" function="internal">\n'
+        '        <lane id=":j1_0_0" length="0.5" speed="5" shape="100,0 100.5,0"/>\n'
+        "    </edge>\n"
+        '    <edge id="a">\n'
+        '        <lane id="a_0" length="100" speed="13.9" width="2" '
+        'shape="0,0 100,0"/>\n'
+        '        <lane id="a_1" length="100" speed="13.9" allow="bus" '
+        'shape="0,3.2 50,3.2,1.5 100,3.2"/>\n'
+        '        <lane id="a_2" length="0.5" speed="13.9" shape="0,6 0.5,6"/>\n'
+        "    </edge>\n"
+        '    <edge id="b">\n'
+        '        <lane id="b_0" length="100" speed="8.3" shape="100,0 100,100"/>\n'
+        "    </edge>\n"
+        '    <junction id="j0" type="priority" shape="-2,-2 2,-2 2,2 -2,2"/>\n'
+        '    <junction id="j1" type="traffic_light" '
+        'shape="98,-2 102,-2 102,2 98,2 98,-2"/>\n'
+        '    <junction id=":j1_w0" type="internal" shape="99,0 101,0 100,1"/>\n'
+        '    <junction id="j2" type="dead_end" shape="100,100 101,100"/>\n'
+        "</net>\n"
+    )
+
+
+def test_polygon_wkb_matches_shapely() -> None:
+    rings = np.array(
+        [[0, 0], [4, 0], [4, 3], [0, 0], [1, 1], [2, 1], [2, 2], [1, 2], [1, 1]],
+        dtype=np.float64,
+    )
+    counts = np.array([4, 5])
+
+    polygons = shapely.from_wkb(polygon_wkb(rings, counts).to_numpy(False))
+
+    assert polygons[0].equals(shapely.Polygon(rings[:4]))
+    assert polygons[1].equals(shapely.Polygon(rings[4:]))
+    assert polygons[0].area == pytest.approx(6.0)
+
+
+def test_shapes_become_closed_rings() -> None:
+    vertices, counts = parse_shapes(["0,0 1,0 1,1", "0,0,5 2,0,5 2,2,5 0,0,5"])
+    assert counts.tolist() == [3, 4]
+    assert vertices[4].tolist() == [2.0, 0.0]
+
+    rings, ring_counts = closed_rings(vertices, counts)
+
+    assert ring_counts.tolist() == [4, 4]
+    assert rings[3].tolist() == rings[0].tolist()
+
+
+def test_straight_lane_outline_is_a_rectangle() -> None:
+    vertices = np.array([[0, 0], [5, 0], [10, 0]], dtype=np.float64)
+
+    outline, counts = lane_outlines(vertices, np.array([3]), np.array([2.0]))
+
+    assert counts.tolist() == [7]
+    polygon = shapely.Polygon(outline)
+    assert polygon.is_valid
+    assert polygon.bounds == (0.0, -1.0, 10.0, 1.0)
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_network_is_exported_as_geoparquet(tmp_path: Path, workers: int) -> None:
+    write_network(tmp_path / "scenario.net.xml")
+
+    count = NetGeometryExporter(
+        tmp_path / "scenario.net.xml",
+        tmp_path / "geometry",
+        workers=workers,
+        chunk_size=2,
+    ).export()
+
+    lanes = pq.read_table(tmp_path / "geometry" / f"{LANES}.parquet")
+    junctions = pq.read_table(tmp_path / "geometry" / f"{JUNCTIONS}.parquet")
+    assert count == 6
+    # The short lane is dropped, the internal lane and junction are not drawn.
+    assert lanes[LANE_ID].to_pylist() == [":j1_0_0", "a_0", "a_1", "b_0"]
+    assert lanes["allow"].to_pylist() == [None, None, "bus", None]
+    assert junctions[JUNCTION_ID].to_pylist() == ["j0", "j1"]
+    metadata = json.loads(lanes.schema.metadata[b"geo"])
+    assert metadata["primary_column"] == GEOMETRY
+
+    # The polygons are in longitude and latitude around the projected shapes.
+    to_net = Transformer.from_crs("epsg:4326", PROJECTION, always_xy=True)
+    for table in [lanes, junctions]:
+        for polygon in shapely.from_wkb(table[GEOMETRY].to_numpy(False)):
+            assert polygon.is_valid
+            x, y = to_net.transform(*polygon.exterior.xy)
+            assert np.min(np.asarray(x) + OFFSETS[0]) > -2.5
+            assert np.max(np.asarray(y) + OFFSETS[1]) < 101.5
+    lane = shapely.from_wkb(lanes[GEOMETRY][1].as_py())
+    x, y = to_net.transform(*lane.exterior.xy)
+    assert np.asarray(x) + OFFSETS[0] == pytest.approx([0, 100, 100, 0, 0], abs=1e-6)
+    assert np.asarray(y) + OFFSETS[1] == pytest.approx([1, 1, -1, -1, 1], abs=1e-6)
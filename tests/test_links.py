@@ -0,0 +1,234 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+import pytest
+
+from prep_disolv.common.columns import AGENT_ID, COORD_X, COORD_Y, TIME_STEP
+from prep_disolv.common.config import V2V
+from prep_disolv.common.streaming import plan_time_partitions
+from prep_disolv.links import csr
+from prep_disolv.links.csr import (
+    FIRST_STEP,
+    LAST_STEP,
+    CsrLinkReader,
+    CsrLinkWriter,
+    build_csr_index_schema,
+    csr_index_file,
+    iter_link_batches,
+)
+from prep_disolv.links.generator import CSR_FORMAT, LinkGenerator
+from prep_disolv.links.spatial import SpatialGrid
+from prep_disolv.links.writer import build_link_schema
+
+LINK_RANGE = 50.0
+
+
+def write_positions(position_file: Path, seed: int = 7) -> pa.Table:
+    """Write random positions of 40 vehicles over 20 time steps."""
+    rng = np.random.default_rng(seed)
+    time_steps = np.repeat(np.arange(20, dtype=np.int64) * 100, 40)
+    positions = pa.table(
+        {
+            TIME_STEP: time_steps,
+            AGENT_ID: np.tile(np.arange(100000, 100040, dtype=np.int64), 20),
+            COORD_X: rng.uniform(0, 400, len(time_steps)),
+            COORD_Y: rng.uniform(0, 400, len(time_steps)),
+        }
+    )
+    pq.write_table(positions, position_file, row_group_size=100)
+    return positions
+
+
+def brute_force_links(positions: pa.Table, link_range: float) -> set[tuple]:
+    """Find the links of every time step by comparing all vehicle pairs."""
+    links = set()
+    for time_step in np.unique(positions[TIME_STEP].to_numpy()):
+        step = positions.filter(pc.equal(positions[TIME_STEP], time_step))
+        agent_ids = step[AGENT_ID].to_numpy()
+        x = step[COORD_X].to_numpy()
+        y = step[COORD_Y].to_numpy()
+        distances = np.hypot(x[:, None] - x[None, :], y[:, None] - y[None, :])
+        for agent, target in zip(*np.nonzero(distances <= link_range), strict=True):
+            if agent != target:
+                links.add(
+                    (
+                        int(time_step),
+                        int(agent_ids[agent]),
+                        int(agent_ids[target]),
+                        round(float(distances[agent, target]), 6),
+                    )
+                )
+    return links
+
+
+def read_links(link_folder: Path) -> set[tuple]:
+    """Read the links of a long links dataset."""
+    links = pq.read_table(link_folder, schema=build_link_schema())
+    return {
+        (time_step, agent, target, round(distance, 6))
+        for time_step, agent, target, distance in zip(
+            *(column.to_pylist() for column in links.columns), strict=True
+        )
+    }
+
+
+def test_grid_matches_brute_force() -> None:
+    rng = np.random.default_rng(3)
+    x, y = rng.uniform(-100, 100, 300), rng.uniform(-100, 100, 300)
+    query_x, query_y = rng.uniform(-100, 100, 50), rng.uniform(-100, 100, 50)
+    # A cell smaller than the radius makes the query visit several cell rings.
+    query_idx, point_idx, distances = SpatialGrid(x, y, 7.5).query(
+        query_x, query_y, 20.0
+    )
+
+    expected = np.hypot(query_x[:, None] - x[None, :], query_y[:, None] - y[None, :])
+    assert set(zip(query_idx.tolist(), point_idx.tolist(), strict=True)) == set(
+        zip(*(index.tolist() for index in np.nonzero(expected <= 20.0)), strict=True)
+    )
+    np.testing.assert_allclose(distances, expected[query_idx, point_idx])
+
+
+def test_v2v_links_match_brute_force(tmp_path: Path) -> None:
+    positions = write_positions(tmp_path / "positions.parquet")
+    generator = LinkGenerator(
+        tmp_path / "positions.parquet", None, {V2V: LINK_RANGE}, tmp_path / "links"
+    )
+    generator.generate_links()
+
+    expected = brute_force_links(positions, LINK_RANGE)
+    assert len(expected) > 0
+    assert read_links(generator.link_files[V2V]) == expected
+    assert generator.link_counts[V2V] == len(expected)
+
+
+def test_time_partitions_cover_every_step_once(tmp_path: Path) -> None:
+    positions = write_positions(tmp_path / "positions.parquet")
+    parquet_file = pq.ParquetFile(tmp_path / "positions.parquet")
+    # Row groups of 100 rows split the 40 vehicles of a time step.
+    partitions = plan_time_partitions(parquet_file, 4)
+    assert len(partitions) == 4
+
+    rows = [
+        pa.Table.from_batches(
+            list(partition.iter_batches(parquet_file, [TIME_STEP, AGENT_ID]))
+        )
+        for partition in partitions
+    ]
+    assert sum(table.num_rows for table in rows) == positions.num_rows
+    step_sets = [set(table[TIME_STEP].to_pylist()) for table in rows]
+    for index, steps in enumerate(step_sets):
+        assert all(steps.isdisjoint(other) for other in step_sets[index + 1 :])
+        # Every time step of a partition is complete.
+        _, step_rows = np.unique(rows[index][TIME_STEP].to_numpy(), return_counts=True)
+        assert (step_rows == 40).all()
+
+
+def test_partitioned_links_match_brute_force(tmp_path: Path) -> None:
+    positions = write_positions(tmp_path / "positions.parquet")
+    generator = LinkGenerator(
+        tmp_path / "positions.parquet",
+        None,
+        {V2V: LINK_RANGE},
+        tmp_path / "links",
+        workers=3,
+    )
+    generator.generate_links()
+
+    assert len(list(generator.link_files[V2V].glob("part-*"))) == 3
+    assert read_links(generator.link_files[V2V]) == brute_force_links(
+        positions, LINK_RANGE
+    )
+
+
+def test_csr_links_match_brute_force(tmp_path: Path) -> None:
+    positions = write_positions(tmp_path / "positions.parquet")
+    generator = LinkGenerator(
+        tmp_path / "positions.parquet",
+        None,
+        {V2V: LINK_RANGE},
+        tmp_path / "links",
+        workers=2,
+        link_format=CSR_FORMAT,
+        distance_resolution=0.01,
+        compression="zstd",
+    )
+    generator.generate_links()
+    expected = brute_force_links(positions, LINK_RANGE)
+
+    long_links = pa.Table.from_batches(
+        list(iter_link_batches(generator.link_files[V2V]))
+    )
+    assert long_links.num_rows == len(expected)
+    reader = CsrLinkReader(generator.link_files[V2V])
+    for time_step, agent_id, target_id, distance in list(expected)[:200]:
+        target_ids, distances = reader.neighbours(time_step, agent_id)
+        assert target_id in target_ids
+        assert distances[target_ids.tolist().index(target_id)] == pytest.approx(
+            distance, abs=0.005
+        )
+    assert len(reader.neighbours(1900, 99)[0]) == 0
+    assert len(reader.neighbours(5000, 100000)[0]) == 0
+
+
+def test_csr_batches_stay_in_the_offset_range(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(csr, "CSR_MAX_BATCH_LINKS", 10)
+    link_file = tmp_path / "part-00000.arrow"
+    writer = CsrLinkWriter(link_file, LINK_RANGE, batch_size=10**12)
+    assert writer.batch_size == 10
+    for time_step in range(0, 500, 100):
+        writer.add_links(
+            time_step,
+            np.array([1, 1, 2, 3]),
+            np.array([2, 3, 1, 1]),
+            np.array([1.0, 2.0, 1.0, 2.0]),
+        )
+    with pytest.raises(ValueError, match="more than a compact links batch holds"):
+        writer.add_links(500, np.ones(11), np.ones(11), np.ones(11))
+    writer.close()
+
+    batches = pa.ipc.open_file(pa.memory_map(str(link_file))).read_all().to_batches()
+    # A time step that would overflow the batch starts the next one.
+    assert [len(batch.column(2).values) for batch in batches] == [8, 8, 4]
+    target_ids, _ = CsrLinkReader(link_file).neighbours(400, 1)
+    assert target_ids.tolist() == [2, 3]
+
+
+def test_csr_batch_index_matches_batches(tmp_path: Path) -> None:
+    link_file = tmp_path / "part-00000.arrow"
+    # A small batch size spreads the time steps over many record batches.
+    writer = CsrLinkWriter(link_file, LINK_RANGE, batch_size=10, compression="zstd")
+    for time_step in range(0, 2000, 100):
+        writer.add_links(
+            time_step,
+            np.array([1, 1, 2, 3, 3, 3]),
+            np.array([2, 3, 1, 1, 2, 4]),
+            np.array([1.0, 2.0, 1.0, 2.0, 3.0, 4.0]) + time_step / 1000,
+        )
+    writer.close()
+
+    index = pa.ipc.open_file(pa.OSFile(str(csr_index_file(link_file)))).read_all()
+    batches = pa.ipc.open_file(pa.memory_map(str(link_file))).read_all().to_batches()
+    assert index[FIRST_STEP].to_pylist() == [
+        batch[TIME_STEP][0].as_py() for batch in batches
+    ]
+    assert index[LAST_STEP].to_pylist() == [
+        batch[TIME_STEP][-1].as_py() for batch in batches
+    ]
+
+    target_ids, distances = CsrLinkReader(link_file).neighbours(1500, 3)
+    assert target_ids.tolist() == [1, 2, 4]
+    np.testing.assert_allclose(distances, [3.5, 4.5, 5.5])
+
+    # A stale index is ignored and the batches are indexed from the file.
+    pa.ipc.new_file(
+        pa.OSFile(str(csr_index_file(link_file)), "wb"), build_csr_index_schema()
+    ).close()
+    target_ids, _ = CsrLinkReader(link_file).neighbours(1500, 3)
+    assert target_ids.tolist() == [1, 2, 4]
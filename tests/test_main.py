@@ -0,0 +1,46 @@
+from __future__ import annotations
+
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+MAIN = Path(__file__).parents[1] / "src" / "__main__.py"
+
+
+def run_main(*args: str) -> subprocess.CompletedProcess:
+    """Run the command line of prep-disolv in a new process."""
+    return subprocess.run(
+        [sys.executable, str(MAIN), *args],
+        capture_output=True,
+        check=False,
+        text=True,
+        env={**os.environ, "PYTHONPATH": os.pathsep.join(sys.path)},
+    )
+
+
+def test_validate_reports_a_missing_config(tmp_path: Path) -> None:
+    result = run_main("--validate", "-c", str(tmp_path / "nope.toml"))
+
+    assert result.returncode == 1
+    assert "Traceback" not in result.stderr
+    assert f"{tmp_path / 'nope.toml'}: Could not read the config" in result.stdout
+
+
+def test_validate_reports_a_broken_config(tmp_path: Path) -> None:
+    (tmp_path / "broken.toml").write_text("[traffic\n")
+
+    result = run_main("--validate", "-b", str(tmp_path / "*.toml"))
+
+    assert result.returncode == 1
+    assert "Traceback" not in result.stderr
+    assert "broken.toml: Could not read the config" in result.stdout
+
+
+def test_empty_batch_pattern_is_reported(tmp_path: Path) -> None:
+    for args in [["--validate"], []]:
+        result = run_main(*args, "-b", str(tmp_path / "*.toml"))
+
+        assert result.returncode == 1
+        assert "Traceback" not in result.stderr
+        assert "No config files match" in result.stdout
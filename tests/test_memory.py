@@ -0,0 +1,75 @@
+from __future__ import annotations
+
+import logging
+
+import pytest
+
+from prep_disolv.common.memory import (
+    BatchSizer,
+    MemoryBudget,
+    memory_limit_bytes,
+    parse_memory_limit,
+)
+from prep_disolv.common.metrics import current_rss_bytes, peak_rss_bytes
+
+
+def used_bytes() -> int:
+    """Get the memory the test process holds."""
+    return current_rss_bytes() or peak_rss_bytes()
+
+
+def test_memory_limits_are_parsed() -> None:
+    assert memory_limit_bytes(4096) == 4096
+    assert memory_limit_bytes("512MB") == 512 * 10**6
+    assert memory_limit_bytes(" 1.5 GiB ") == int(1.5 * 2**30)
+    assert memory_limit_bytes("2 parsecs") is None
+    assert memory_limit_bytes(True) is None
+    with pytest.raises(ValueError, match="Could not read the memory limit"):
+        parse_memory_limit(0)
+
+
+def test_budget_is_what_the_process_leaves() -> None:
+    limit = used_bytes() + 400 * 2**20
+    budget = MemoryBudget(limit).share(4)
+
+    assert budget.shares == 4
+    assert 0 < budget.buffer_bytes <= 100 * 2**20
+    sizer = BatchSizer(budget, 100000, 100)
+    assert sizer.rows == budget.buffer_bytes // 100
+    sizer.observe(1000, 1000 * 400)
+    assert sizer.rows == budget.buffer_bytes // 400
+    # Narrower rows let the batches grow again, up to what the rows need.
+    for _ in range(30):
+        sizer.observe(1000, 1000 * 50)
+    assert sizer.rows == budget.buffer_bytes // 50
+
+
+def test_budget_never_exceeds_the_limit(caplog: pytest.LogCaptureFixture) -> None:
+    with pytest.raises(ValueError, match="leaves nothing of the memory limit"):
+        MemoryBudget(used_bytes() // 2)
+
+    limit = used_bytes() + used_bytes() // 20
+    with caplog.at_level(logging.WARNING):
+        budget = MemoryBudget(limit)
+    # The small rest of the limit is used, not a fixed share of it.
+    assert budget.buffer_bytes < limit // 10
+    assert "are left to the batches" in caplog.text
+
+
+def test_small_budget_wins_over_the_smallest_batch(
+    caplog: pytest.LogCaptureFixture,
+) -> None:
+    budget = MemoryBudget(used_bytes() + 2 * 2**20)
+    # Rows of 10 kB, so 1000 rows would take 10 MB of the at most 2 MiB.
+    sizer = BatchSizer(budget, 100000, 10000, min_rows=1000)
+    assert sizer.row_bytes * sizer.min_rows > budget.buffer_bytes
+
+    with caplog.at_level(logging.WARNING):
+        rows = sizer.rows
+
+    assert 0 < rows < sizer.min_rows
+    assert rows * sizer.row_bytes <= budget.buffer_bytes
+    assert "which makes small row groups" in caplog.text
+    # Rows wider than the whole budget are still written one at a time.
+    sizer.observe(10, 10 * 2**30)
+    assert sizer.rows == 1
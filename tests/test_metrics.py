@@ -0,0 +1,69 @@
+from __future__ import annotations
+
+import subprocess
+import sys
+import threading
+
+import numpy as np
+import pytest
+
+from prep_disolv.common.metrics import (
+    PROCESS_PEAK,
+    STAGE_PEAK,
+    reset_peak_rss,
+    run_measured,
+)
+
+ALLOCATED_BYTES = 200 * 2**20
+
+
+def allocate() -> int:
+    """Touch every page of a large buffer, so it becomes resident."""
+    return int(np.ones(ALLOCATED_BYTES, dtype=np.uint8).sum())
+
+
+def allocate_in_thread() -> None:
+    """Allocate the buffer in a thread that exits before the stage ends."""
+    thread = threading.Thread(target=allocate)
+    thread.start()
+    thread.join()
+
+
+def burn_cpu_in_child() -> None:
+    """Spend CPU time in a child process."""
+    subprocess.run(
+        [sys.executable, "-c", "sum(range(20_000_000))"], check=True
+    )
+
+
+def test_peak_rss_is_measured_per_stage() -> None:
+    _, large = run_measured("large", allocate, ())
+    _, small = run_measured("small", sum, ([1, 2],))
+
+    if not reset_peak_rss():
+        assert small.peak_rss_scope == PROCESS_PEAK
+        pytest.skip("The peak resident set size cannot be reset here.")
+    assert large.peak_rss_scope == small.peak_rss_scope == STAGE_PEAK
+    # Freed pages of earlier tests may already be resident.
+    assert large.peak_rss - large.start_rss >= ALLOCATED_BYTES // 2
+    # The later stage does not report the peak of the earlier one.
+    assert small.peak_rss < large.peak_rss - ALLOCATED_BYTES // 2
+
+
+def test_stage_peak_excludes_exited_threads() -> None:
+    _, large = run_measured("large", allocate_in_thread, ())
+    _, small = run_measured("small", sum, ([1, 2],))
+
+    if small.peak_rss_scope != STAGE_PEAK:
+        pytest.skip("The peak resident set size cannot be reset here.")
+    assert large.peak_rss - large.start_rss >= ALLOCATED_BYTES // 2
+    # An exited thread keeps its peak in ru_maxrss, but not in the stage peak.
+    assert small.peak_rss < large.peak_rss - ALLOCATED_BYTES // 2
+
+
+def test_child_cpu_counts_only_for_stages_with_a_pool() -> None:
+    _, own = run_measured("own", burn_cpu_in_child, ())
+    _, pool = run_measured("pool", burn_cpu_in_child, (), count_children=True)
+
+    assert own.cpu_time < pool.cpu_time
+    assert pool.cpu_time >= 0.1
@@ -0,0 +1,166 @@
+from __future__ import annotations
+
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+
+from prep_disolv.common.columns import AGENT_ID, LAT, LON, TIME_STEP
+from prep_disolv.common.config import TRAFFIC_SETTINGS, Config, trace_stem
+from prep_disolv.export.mosaic import (
+    CONTROLLER_NAME,
+    DEFAULT_VEHICLE_TYPE,
+    RSU_NAME,
+    MosaicExporter,
+)
+from prep_disolv.vehicle.sumo import VEH_TYPE
+
+SCRIPT = Path(__file__).parents[1] / "src" / "prep_disolv" / "scripts" / "mosaic_rsu.py"
+
+
+def write_config(scenario_path: Path, mosaic_settings: str = "") -> Config:
+    """Write a scenario with a MOSAIC export and open its config."""
+    (scenario_path / "config.toml").write_text(
+        '[traffic]\ntrace = "scenario.fcd.xml"\n\n'
+        '[output]\noutput_path = "out"\n\n'
+        f'[mosaic]\noutput_path = "mapping/mapping_config.json"\n{mosaic_settings}\n'
+    )
+    return Config(str(scenario_path / "config.toml"))
+
+
+def write_agents(
+    position_file: Path, rows: list[tuple[int, int, float, float]]
+) -> None:
+    """Write the time step, ID, latitude and longitude of agents."""
+    time_steps, agent_ids, lats, lons = zip(*rows, strict=True)
+    pq.write_table(
+        pa.table(
+            {
+                TIME_STEP: pa.array(time_steps, pa.int64()),
+                AGENT_ID: pa.array(agent_ids, pa.int64()),
+                LAT: pa.array(lats, pa.float64()),
+                LON: pa.array(lons, pa.float64()),
+            }
+        ),
+        position_file,
+    )
+
+
+def vehicle_file(config: Config, positions: Path) -> Path:
+    """Get the vehicle positions converted from the trace of the config."""
+    return positions / f"{trace_stem(config.get(TRAFFIC_SETTINGS))}.parquet"
+
+
+def write_scenario(config: Config, positions: Path) -> None:
+    """Write the positions of two vehicle types, three RSUs and two controllers."""
+    positions.mkdir(parents=True, exist_ok=True)
+    pq.write_table(
+        pa.table(
+            {
+                TIME_STEP: [0, 0, 100, 100],
+                AGENT_ID: [10, 11, 10, 12],
+                VEH_TYPE: ["car", "bus", "car", None],
+            }
+        ),
+        vehicle_file(config, positions),
+    )
+    # Every RSU moves after the first time step, so only its first position counts.
+    write_agents(
+        positions / "roadside_units.parquet",
+        [
+            (0, 7, 51.5, 7.25),
+            (0, 3, 51.75, 7.5),
+            (100, 7, 52.0, 8.0),
+            (100, 5, 51.125, 7.0),
+            (200, 3, 53.0, 9.0),
+        ],
+    )
+    write_agents(
+        positions / "controllers.parquet",
+        [(0, 1, 50.0, 6.0), (0, 0, 50.5, 6.5), (100, 1, 49.0, 5.0)],
+    )
+
+
+def test_mapping_lists_the_first_position_of_every_rsu(tmp_path: Path) -> None:
+    config = write_config(
+        tmp_path, 'vehicle_class = "ElectricVehicle"\nrsu_applications = ["app.Rsu"]'
+    )
+    positions = tmp_path / "out" / "positions"
+    write_scenario(config, positions)
+    exporter = MosaicExporter(config)
+
+    written = exporter.export(
+        vehicle_file(config, positions),
+        positions / "roadside_units.parquet",
+        positions / "controllers.parquet",
+    )
+
+    mapping = json.loads(exporter.mapping_file.read_text(encoding="utf-8"))
+    assert exporter.counts == {"prototypes": 2, "servers": 2, "rsus": 3}
+    assert written == 7
+    assert mapping["config"] == {"fixed_order": True}
+    assert [prototype["name"] for prototype in mapping["prototypes"]] == [
+        "bus",
+        "car",
+    ]
+    assert {prototype["vehicleClass"] for prototype in mapping["prototypes"]} == {
+        "ElectricVehicle"
+    }
+    assert [server["name"] for server in mapping["servers"]] == [CONTROLLER_NAME] * 2
+    assert mapping["rsus"] == [
+        {
+            "name": RSU_NAME,
+            "position": {"latitude": lat, "longitude": lon},
+            "applications": ["app.Rsu"],
+        }
+        for lat, lon in [(51.5, 7.25), (51.75, 7.5), (51.125, 7.0)]
+    ]
+
+
+def test_mapping_without_positions_uses_the_defaults(
+    tmp_path: Path, caplog: pytest.LogCaptureFixture
+) -> None:
+    exporter = MosaicExporter(write_config(tmp_path))
+
+    written = exporter.export(
+        tmp_path / "vehicles.parquet", tmp_path / "missing.parquet", None
+    )
+
+    mapping = json.loads(exporter.mapping_file.read_text(encoding="utf-8"))
+    assert written == 2
+    assert [prototype["name"] for prototype in mapping["prototypes"]] == [
+        DEFAULT_VEHICLE_TYPE
+    ]
+    assert len(mapping["servers"]) == 1
+    assert mapping["rsus"] == []
+    assert "vehicles.parquet not found" in caplog.text
+
+
+def test_script_writes_the_mapping_of_a_scenario(tmp_path: Path) -> None:
+    write_scenario(write_config(tmp_path), tmp_path / "out" / "positions")
+
+    result = subprocess.run(
+        [
+            sys.executable,
+            str(SCRIPT),
+            "--config",
+            str(tmp_path / "config.toml"),
+            "--output",
+            str(tmp_path / "mapping.json"),
+        ],
+        capture_output=True,
+        check=False,
+        text=True,
+        env={**os.environ, "PYTHONPATH": os.pathsep.join(sys.path)},
+    )
+
+    assert result.returncode == 0, result.stderr
+    mapping = json.loads((tmp_path / "mapping.json").read_text(encoding="utf-8"))
+    assert len(mapping["prototypes"]) == 2
+    assert len(mapping["servers"]) == 2
+    assert len(mapping["rsus"]) == 3
@@ -0,0 +1,168 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+
+from prep_disolv.common.columns import (
+    AGENT_ID,
+    COORD_X,
+    COORD_Y,
+    NS3_ID,
+    TARGET_ID,
+    TIME_STEP,
+    VELOCITY,
+)
+from prep_disolv.common.config import FIXED_COORDINATES, V2V, Config
+from prep_disolv.common.coordinates import CoordinateEncoding
+from prep_disolv.export.ns3 import IdMapping, Ns3Exporter, remap_parquet
+from prep_disolv.links.csr import CsrLinkReader, iter_link_batches
+from prep_disolv.links.generator import CSR_FORMAT, LinkGenerator
+from prep_disolv.links.writer import build_link_schema
+
+CONFIG = """[output]
+output_path = "out"
+
+[ns3]
+output_path = "ns3"
+
+[execution]
+engine = "{engine}"
+"""
+
+VEHICLE_IDS = [100007, 100003, 100005]
+RSU_IDS = [200001, 200000]
+
+
+def write_scenario(output_path: Path) -> None:
+    """Write the activations, fixed-point positions and v2r links of a scenario."""
+    for folder in ["activations", "positions", "links/v2r_links"]:
+        (output_path / folder).mkdir(parents=True)
+    for name, agent_ids in [("vehicle", VEHICLE_IDS), ("rsu", RSU_IDS)]:
+        pq.write_table(
+            pa.table({AGENT_ID: agent_ids, NS3_ID: range(len(agent_ids))}),
+            output_path / "activations" / f"{name}_activations.parquet",
+        )
+
+    encoding = CoordinateEncoding(FIXED_COORDINATES)
+    agent_ids = VEHICLE_IDS * 4
+    values = np.linspace(0.0, 100.0, len(agent_ids))
+    positions = pa.Table.from_arrays(
+        [
+            pa.array(np.repeat(np.arange(4) * 100, 3), pa.int64()),
+            pa.array(agent_ids, pa.int64()),
+            encoding.encode(COORD_X, values),
+            encoding.encode(COORD_Y, values / 2),
+            encoding.encode(VELOCITY, values / 10),
+        ],
+        names=[TIME_STEP, AGENT_ID, COORD_X, COORD_Y, VELOCITY],
+    ).replace_schema_metadata(encoding.schema_metadata())
+    pq.write_table(positions, output_path / "positions" / "vehicles.parquet")
+
+    links = pa.Table.from_arrays(
+        [
+            pa.array([0, 0, 100], pa.int64()),
+            pa.array([100003, 100007, 100005], pa.int64()),
+            pa.array([200000, 200001, 200000], pa.int64()),
+            pa.array([1.5, 2.5, 3.5]),
+        ],
+        schema=build_link_schema(),
+    )
+    pq.write_table(links, output_path / "links" / "v2r_links" / "part-00000.parquet")
+
+
+@pytest.mark.parametrize("engine", ["arrow", "polars"])
+def test_export_maps_dense_ids(tmp_path: Path, engine: str) -> None:
+    (tmp_path / "config.toml").write_text(CONFIG.format(engine=engine))
+    write_scenario(tmp_path / "out")
+    exporter = Ns3Exporter(Config(str(tmp_path / "config.toml")))
+
+    exporter.export(tmp_path / "out" / "positions" / "vehicles.parquet", None)
+
+    # Vehicles come first in the order of activation, RSUs follow.
+    mapping = pq.read_table(exporter.mapping_file)
+    assert mapping[AGENT_ID].to_pylist() == VEHICLE_IDS + RSU_IDS
+    assert mapping[NS3_ID].to_pylist() == [0, 1, 2, 3, 4]
+
+    positions = pq.read_table(tmp_path / "ns3" / "positions" / "vehicles.parquet")
+    assert positions[AGENT_ID].to_pylist() == [0, 1, 2] * 4
+    assert positions.schema.field(COORD_X).type == pa.float64()
+    np.testing.assert_allclose(
+        positions[COORD_X].to_numpy(), np.linspace(0.0, 100.0, 12), atol=0.005
+    )
+
+    links = pq.read_table(
+        tmp_path / "ns3" / "links" / "v2r_links" / "part-00000.parquet"
+    )
+    assert links[AGENT_ID].to_pylist() == [1, 0, 2]
+    assert links[TARGET_ID].to_pylist() == [4, 3, 4]
+    assert links.schema == build_link_schema()
+
+
+def test_remap_rejects_unknown_ids(tmp_path: Path) -> None:
+    pq.write_table(pa.table({AGENT_ID: [1, 2, 3]}), tmp_path / "ids.parquet")
+    mapping = IdMapping(np.array([1, 2]), np.array([0, 1]))
+
+    with pytest.raises(ValueError, match="not in the ns-3 ID mapping"):
+        remap_parquet(
+            tmp_path / "ids.parquet", tmp_path / "out.parquet", {AGENT_ID: mapping}
+        )
+
+
+def test_export_keeps_csr_links_sorted_by_agent(tmp_path: Path) -> None:
+    (tmp_path / "config.toml").write_text(CONFIG.format(engine="arrow"))
+    output_path = tmp_path / "out"
+    (output_path / "activations").mkdir(parents=True)
+    rng = np.random.default_rng(3)
+    time_steps = np.repeat(np.arange(10, dtype=np.int64) * 100, 30)
+    agent_ids = np.tile(np.arange(100000, 100030, dtype=np.int64), 10)
+    pq.write_table(
+        pa.table(
+            {
+                TIME_STEP: time_steps,
+                AGENT_ID: agent_ids,
+                COORD_X: rng.uniform(0, 300, len(time_steps)),
+                COORD_Y: rng.uniform(0, 300, len(time_steps)),
+            }
+        ),
+        tmp_path / "positions.parquet",
+    )
+    # The vehicles activate in a shuffled order, so the ns-3 IDs reorder them.
+    activation_ids = rng.permutation(np.arange(100000, 100030, dtype=np.int64))
+    pq.write_table(
+        pa.table({AGENT_ID: activation_ids}),
+        output_path / "activations" / "vehicle_activations.parquet",
+    )
+    generator = LinkGenerator(
+        tmp_path / "positions.parquet",
+        None,
+        {V2V: 60.0},
+        output_path / "links",
+        link_format=CSR_FORMAT,
+        distance_resolution=0.01,
+    )
+    generator.generate_links()
+
+    exporter = Ns3Exporter(Config(str(tmp_path / "config.toml")))
+    exporter.export(None, None)
+
+    ns3_ids = dict(zip(activation_ids.tolist(), range(30), strict=True))
+    expected: dict[tuple[int, int], dict[int, float]] = {}
+    for link_batch in iter_link_batches(output_path / "links" / "v2v_links"):
+        for time_step, agent_id, target_id, distance in zip(
+            *(column.to_pylist() for column in link_batch.columns), strict=True
+        ):
+            key = (time_step, ns3_ids[agent_id])
+            expected.setdefault(key, {})[ns3_ids[target_id]] = distance
+    assert expected
+    reader = CsrLinkReader(tmp_path / "ns3" / "links" / "v2v_links")
+    for time_step in range(0, 1000, 100):
+        for ns3_id in range(30):
+            target_ids, distances = reader.neighbours(time_step, ns3_id)
+            links = expected.get((time_step, ns3_id), {})
+            assert sorted(target_ids.tolist()) == sorted(links)
+            for target_id, distance in zip(target_ids, distances, strict=True):
+                assert distance == pytest.approx(links[target_id], abs=0.005)
@@ -0,0 +1,69 @@
+from __future__ import annotations
+
+import os
+
+import pytest
+
+from prep_disolv.common import pipeline
+from prep_disolv.common.pipeline import (
+    DEFAULT_QUEUE_SIZE,
+    WriterThread,
+    batches_in_memory,
+    default_queue_size,
+)
+
+
+@pytest.mark.parametrize(
+    ("cpu_count", "queue_size"), [(4, DEFAULT_QUEUE_SIZE), (1, 0), (None, 0)]
+)
+def test_queue_size_without_cpu_affinity(
+    monkeypatch: pytest.MonkeyPatch, cpu_count: int | None, queue_size: int
+) -> None:
+    # macOS and Windows have no CPU affinity, only the number of CPUs.
+    monkeypatch.delattr(pipeline.os, "sched_getaffinity", raising=False)
+    monkeypatch.setattr(pipeline.os, "cpu_count", lambda: cpu_count)
+
+    assert default_queue_size() == queue_size
+
+
+@pytest.mark.skipif(not hasattr(os, "sched_getaffinity"), reason="Needs CPU affinity.")
+def test_queue_size_follows_cpu_affinity(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(pipeline.os, "sched_getaffinity", lambda _: {0})
+    monkeypatch.setattr(pipeline.os, "cpu_count", lambda: 8)
+
+    assert default_queue_size() == 0
+    assert batches_in_memory(0) == 1
+    assert batches_in_memory(DEFAULT_QUEUE_SIZE) == DEFAULT_QUEUE_SIZE + 2
+
+
+def write_all(writer: WriterThread, batch_count: int) -> None:
+    """Hand the batches to the writer like a producer and wait for them."""
+    for batch in range(batch_count):
+        writer.put(batch)
+    writer.close()
+
+
+@pytest.mark.parametrize("queue_size", [0, 1, 3])
+def test_batches_are_written_in_order(queue_size: int) -> None:
+    written = []
+    write_all(WriterThread(written.append, queue_size), 20)
+
+    assert written == list(range(20))
+
+
+def test_write_error_is_raised_on_the_producer() -> None:
+    written = []
+
+    def write(batch: int) -> None:
+        if batch == 3:
+            msg = "No space left on device"
+            raise OSError(msg)
+        written.append(batch)
+
+    writer = WriterThread(write, 1)
+    with pytest.raises(OSError, match="No space left"):
+        write_all(writer, 1000)
+
+    # The writer stops writing after the failed batch.
+    writer.close(raise_error=False)
+    assert written == [0, 1, 2]
@@ -0,0 +1,121 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+import pytest
+
+from prep_disolv.common.columns import AGENT_ID, COORD_X, COORD_Y, TIME_STEP
+from prep_disolv.common.config import FIXED_COORDINATES, FLOAT64_COORDINATES
+from prep_disolv.common.coordinates import CoordinateEncoding, decode_positions
+from prep_disolv.store.positions import PositionStore
+
+TIME_STEPS = 40
+AGENTS = 10
+
+
+def write_positions(position_file: Path, coordinates: str) -> pa.Table:
+    """Write 10 agents that drive along x, five time steps per row group.
+
+    Returns the positions as the store decodes them.
+    """
+    rng = np.random.default_rng(4)
+    time_steps = np.repeat(np.arange(TIME_STEPS) * 100, AGENTS)
+    # The agents move along x over time, so the row groups also split x.
+    x = time_steps / 10 + rng.uniform(0, 5, len(time_steps))
+    y = rng.uniform(-20, 20, len(time_steps))
+    encoding = CoordinateEncoding(coordinates)
+    positions = pa.Table.from_arrays(
+        [
+            pa.array(time_steps, pa.int64()),
+            pa.array(np.tile(np.arange(AGENTS), TIME_STEPS), pa.int64()),
+            encoding.encode(COORD_X, x),
+            encoding.encode(COORD_Y, y),
+        ],
+        names=[TIME_STEP, AGENT_ID, COORD_X, COORD_Y],
+    ).replace_schema_metadata(encoding.schema_metadata())
+    pq.write_table(positions, position_file, row_group_size=5 * AGENTS)
+    return decode_positions(positions)
+
+
+@pytest.fixture(params=[FLOAT64_COORDINATES, FIXED_COORDINATES])
+def positions(tmp_path: Path, request: pytest.FixtureRequest) -> pa.Table:
+    return write_positions(tmp_path / "positions.parquet", request.param)
+
+
+def test_at_and_window_match_a_filter(tmp_path: Path, positions: pa.Table) -> None:
+    store = PositionStore(tmp_path / "positions.parquet")
+
+    assert store.at(1200).equals(
+        positions.filter(pc.equal(positions[TIME_STEP], 1200))
+    )
+    assert len(store.at(1250)) == 0
+    # The end of a window is excluded.
+    window = store.window(700, 1500, columns=[AGENT_ID, COORD_X])
+    expected = positions.filter(
+        pc.and_(
+            pc.greater_equal(positions[TIME_STEP], 700),
+            pc.less(positions[TIME_STEP], 1500),
+        )
+    )
+    assert window.equals(expected.select([AGENT_ID, COORD_X]))
+    arrays = store.window(700, 1500, as_numpy=True)
+    np.testing.assert_array_equal(arrays[TIME_STEP], expected[TIME_STEP].to_numpy())
+
+
+@pytest.mark.parametrize("time_window", [(None, None), (1000, 3000), (None, 500)])
+def test_bbox_matches_a_filter(
+    tmp_path: Path, positions: pa.Table, time_window: tuple[int | None, int | None]
+) -> None:
+    store = PositionStore(tmp_path / "positions.parquet")
+    # Two positions of the file are the corners of the box, which includes them.
+    x = positions[COORD_X].to_numpy()
+    y = positions[COORD_Y].to_numpy()
+    order = np.argsort(x)
+    low_corner = order[50:][y[order[50:]] < -10][0]
+    high_corner = order[300:][y[order[300:]] > 10][0]
+    x_min, y_min = x[low_corner], y[low_corner]
+    x_max, y_max = x[high_corner], y[high_corner]
+    start, end = time_window
+
+    box = store.bbox(x_min, y_min, x_max, y_max, start, end)
+
+    mask = (x >= x_min) & (x <= x_max) & (y >= y_min) & (y <= y_max)
+    time_steps = positions[TIME_STEP].to_numpy()
+    if start is not None:
+        mask &= time_steps >= start
+    if end is not None:
+        mask &= time_steps < end
+    assert box.equals(positions.filter(pa.array(mask)))
+    if start is None and end is None:
+        corners = set(
+            zip(box[COORD_X].to_pylist(), box[COORD_Y].to_pylist(), strict=True)
+        )
+        assert {(x_min, y_min), (x_max, y_max)} <= corners
+
+
+def test_row_groups_skip_the_groups_outside_the_range(
+    tmp_path: Path, positions: pa.Table
+) -> None:
+    store = PositionStore(tmp_path / "positions.parquet")
+    group_rows = 5 * AGENTS
+
+    assert store.row_group_count == TIME_STEPS // 5
+    assert store.row_groups({TIME_STEP: (1200, 1200)}) == [2]
+    assert store.row_groups({TIME_STEP: (400, 1000)}) == [0, 1, 2]
+    assert store.row_groups({TIME_STEP: (10**6, 10**7)}) == []
+
+    # The x range is compared in metres, also for fixed-point coordinates.
+    x = positions[COORD_X].to_numpy()
+    low, high = 12.0, 18.0
+    expected = [
+        row_group
+        for row_group in range(store.row_group_count)
+        if x[row_group * group_rows : (row_group + 1) * group_rows].max() >= low
+        and x[row_group * group_rows : (row_group + 1) * group_rows].min() <= high
+    ]
+    assert 0 < len(expected) < store.row_group_count
+    assert store.row_groups({COORD_X: (low, high)}) == expected
@@ -0,0 +1,124 @@
+from __future__ import annotations
+
+import logging
+import xml.etree.ElementTree as Et
+from pathlib import Path
+
+import pytest
+
+from prep_disolv.routes.mapping import IdMappingWriter, read_id_mapping
+from prep_disolv.routes.normalizer import RouteIdNormalizer
+from prep_disolv.routes.sampler import RouteSampler
+
+
+def write_routes(route_file: Path, departures: list[float]) -> None:
+    """Write a route file with a vehicle type, a route and one vehicle per departure."""
+    vehicles = "".join(
+        f'    <vehicle id="veh_{index}" type="car" route="r0" depart="{depart:.2f}"/>\n'
+        for index, depart in enumerate(departures)
+    )
+    route_file.write_text(
+        '<?xml version="1.0" encoding="UTF-8"?>\n'
+        '<routes xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance">\n'
+        '    <vType id="car" accel="2.6"/>\n'
+        '    <route id="r0" edges="a b c"/>\n'
+        f"{vehicles}</routes>\n"
+    )
+
+
+def sample(
+    tmp_path: Path, factor: float, seed: int, renumber: bool = False
+) -> list[Et.Element]:
+    """Sample the route file of the test and read the sampled elements."""
+    output_file = tmp_path / f"sampled_{factor}_{seed}.rou.xml"
+    RouteSampler(
+        tmp_path / "scenario.rou.xml", output_file, factor, seed, 10.0, renumber
+    ).sample()
+    return list(Et.parse(output_file).getroot())
+
+
+def vehicle_ids(elements: list[Et.Element]) -> list[str]:
+    """Get the IDs of the vehicles in file order."""
+    return [element.get("id") for element in elements if element.tag == "vehicle"]
+
+
+def test_sample_is_reproducible(tmp_path: Path) -> None:
+    write_routes(tmp_path / "scenario.rou.xml", [index * 0.5 for index in range(200)])
+
+    first = vehicle_ids(sample(tmp_path, 0.3, seed=4))
+    assert first == vehicle_ids(sample(tmp_path, 0.3, seed=4))
+    assert first != vehicle_ids(sample(tmp_path, 0.3, seed=5))
+    # A smaller share keeps a subset of the vehicles of a larger one.
+    assert set(vehicle_ids(sample(tmp_path, 0.1, seed=4))) < set(first)
+
+
+def test_sample_keeps_a_share_of_every_bucket(tmp_path: Path) -> None:
+    # Buckets of 10 s with 20, 10 and 5 vehicles.
+    departures = [index * 0.5 for index in range(20)]
+    departures += [10 + index for index in range(10)]
+    departures += [20 + index * 2 for index in range(5)]
+    write_routes(tmp_path / "scenario.rou.xml", departures)
+
+    elements = sample(tmp_path, 0.5, seed=1)
+
+    # The elements before the vehicles are kept in place.
+    assert [element.tag for element in elements[:2]] == ["vType", "route"]
+    buckets = [
+        int(departures[int(vehicle_id.removeprefix("veh_"))] // 10)
+        for vehicle_id in vehicle_ids(elements)
+    ]
+    assert [buckets.count(bucket) for bucket in range(3)] == [10, 5, 2]
+    assert buckets == sorted(buckets)
+
+
+def test_sample_renumbers_in_file_order(tmp_path: Path) -> None:
+    write_routes(tmp_path / "scenario.rou.xml", [index * 0.5 for index in range(60)])
+
+    elements = sample(tmp_path, 0.5, seed=2, renumber=True)
+
+    assert vehicle_ids(elements) == [str(index) for index in range(30)]
+
+
+def test_unsorted_routes_are_sampled_in_parts(
+    tmp_path: Path, caplog: pytest.LogCaptureFixture
+) -> None:
+    write_routes(tmp_path / "scenario.rou.xml", [1.0, 2.0, 15.0, 3.0, 4.0])
+
+    with caplog.at_level(logging.WARNING):
+        elements = sample(tmp_path, 1.0, seed=0)
+
+    assert vehicle_ids(elements) == [f"veh_{index}" for index in range(5)]
+    assert "is not sorted by departure" in caplog.text
+
+
+def test_sampling_factor_is_checked(tmp_path: Path) -> None:
+    with pytest.raises(ValueError, match="between 0 and 1"):
+        RouteSampler(tmp_path / "in.rou.xml", tmp_path / "out.rou.xml", 1.5)
+
+
+def test_normalizer_stores_the_id_mapping(tmp_path: Path) -> None:
+    write_routes(tmp_path / "scenario.rou.xml", [index * 0.5 for index in range(7)])
+
+    count = RouteIdNormalizer(
+        tmp_path / "scenario.rou.xml",
+        tmp_path / "normalized.rou.xml",
+        tmp_path / "mapping.parquet",
+        id_init=10,
+    ).normalize()
+
+    assert count == 7
+    elements = list(Et.parse(tmp_path / "normalized.rou.xml").getroot())
+    assert vehicle_ids(elements) == [str(10 + index) for index in range(7)]
+    assert read_id_mapping(tmp_path / "mapping.parquet") == {
+        f"veh_{index}": 10 + index for index in range(7)
+    }
+
+
+def test_duplicate_original_ids_are_rejected(tmp_path: Path) -> None:
+    mapping_writer = IdMappingWriter(tmp_path / "mapping.parquet", batch_size=1)
+    mapping_writer.add("veh_0", 0)
+    mapping_writer.add("veh_0", 1)
+    mapping_writer.close()
+
+    with pytest.raises(ValueError, match="duplicate original IDs"):
+        read_id_mapping(tmp_path / "mapping.parquet")
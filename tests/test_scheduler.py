@@ -0,0 +1,57 @@
+from __future__ import annotations
+
+import operator
+
+import pytest
+
+from prep_disolv.core.scheduler import Stage, StageScheduler
+
+
+def build_scheduler(workers: int, order: list[str]) -> StageScheduler:
+    """Schedule two independent remote stages and a local stage using both."""
+    scheduler = StageScheduler(workers)
+
+    def combine() -> int:
+        order.append("combine")
+        return scheduler.results["left"] + scheduler.results["right"]
+
+    scheduler.add_stage(Stage("left", operator.mul, (6, 7), remote=True))
+    scheduler.add_stage(Stage("right", operator.add, (1, 2), remote=True))
+    scheduler.add_stage(Stage("combine", combine, depends_on=["left", "right"]))
+    return scheduler
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_stages_run_after_their_dependencies(workers: int) -> None:
+    order: list[str] = []
+    scheduler = build_scheduler(workers, order)
+
+    results = scheduler.run()
+
+    assert results == {"left": 42, "right": 3, "combine": 45}
+    assert order == ["combine"]
+    assert [metrics.name for metrics in scheduler.performance.stages][-1] == "combine"
+    assert len(scheduler.performance.stages) == 3
+
+
+def test_report_fills_the_stage_metrics() -> None:
+    scheduler = StageScheduler()
+
+    def report(metrics, result) -> None:
+        metrics.rows = len(result)
+
+    scheduler.add_stage(Stage("rows", list, ("abc",), report=report))
+    scheduler.run()
+
+    assert scheduler.performance.stages[0].rows == 3
+    assert scheduler.performance.stages[0].wall_time >= 0
+
+
+def test_unknown_and_duplicate_stages_are_rejected() -> None:
+    scheduler = StageScheduler()
+    scheduler.add_stage(Stage("first", list))
+
+    with pytest.raises(ValueError, match="already scheduled"):
+        scheduler.add_stage(Stage("first", list))
+    with pytest.raises(ValueError, match="unknown stage missing"):
+        scheduler.add_stage(Stage("second", list, depends_on=["missing"]))
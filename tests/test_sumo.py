@@ -0,0 +1,203 @@
+from __future__ import annotations
+
+import xml.etree.ElementTree as Et
+from pathlib import Path
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+
+from prep_disolv.common.config import Config
+from prep_disolv.routes.mapping import IdMappingWriter
+from prep_disolv.vehicle import sumo
+from prep_disolv.vehicle.sumo import AGENT_ID, TIME_STEP, SumoConverter
+
+NETWORK = """<net version="1.16">
+<location netOffset="0.00,0.00" convBoundary="0.00,0.00,100.00,100.00" origBoundary="0,0,1,1" projParameter="!"/>
+</net>
+"""
+
+
+def write_config(
+    scenario_path: Path,
+    traces: list[str],
+    extra_traffic: str = "",
+    extra_vehicles: str = "",
+) -> Config:
+    """Write a scenario with the given traces and open its config."""
+    (scenario_path / "scenario.net.xml").write_text(NETWORK)
+    (scenario_path / "config.toml").write_text(
+        "[simulation]\nduration = 10\nstep_size = 1\n\n"
+        '[traffic]\nnetwork = "scenario.net.xml"\n'
+        f"trace = {traces!r}\n{extra_traffic}\n"
+        f'[vehicles]\nsimulator = "sumo"\nid_init = 100000\n{extra_vehicles}\n'
+        '[output]\noutput_path = "out"\n'
+    )
+    return Config(str(scenario_path / "config.toml"))
+
+
+def write_trace(fcd_file: Path, time_steps: dict[int, list[str]], x: float) -> None:
+    """Write a SUMO FCD file with the vehicles of every time step."""
+    steps = []
+    for time_step, vehicles in time_steps.items():
+        rows = "".join(
+            f'    <vehicle id="{vehicle}" x="{x + time_step}" y="20.00" angle="0" '
+            f'type="car" speed="5.00" pos="1" lane="e1_0" slope="0"/>\n'
+            for vehicle in vehicles
+        )
+        steps.append(f'  <timestep time="{time_step:.2f}">\n{rows}  </timestep>\n')
+    fcd_file.write_text(f"<fcd-export>\n{''.join(steps)}</fcd-export>\n")
+
+
+def convert(config: Config, output_path: Path) -> pa.Table:
+    """Convert the trace of a scenario and read the positions."""
+    converter = SumoConverter(config, output_path)
+    converter.fcd_to_parquet()
+    return pq.read_table(converter.get_parquet_file())
+
+
+def test_sharded_vehicles_get_unique_ids(tmp_path: Path) -> None:
+    # Both shards use the same SUMO IDs, and numeric IDs in the pooled range.
+    vehicles = ["veh0", "100000", "7", "veh1"]
+    write_trace(tmp_path / "a.fcd.xml", {0: vehicles[:3], 1: vehicles}, 0)
+    write_trace(tmp_path / "b.fcd.xml", {0: vehicles, 2: ["100001"]}, 1000)
+    config = write_config(tmp_path, ["a.fcd.xml", "b.fcd.xml"])
+
+    positions = convert(config, tmp_path / "out")
+
+    assert positions[TIME_STEP].to_pylist() == [0] * 7 + [1000] * 4 + [2000]
+    # Every vehicle of a shard keeps its ID, which no other vehicle has.
+    first_shard = [100000, 100001, 100002]
+    second_shard = [100003, 100004, 100005, 100006]
+    assert positions[AGENT_ID].to_pylist() == [
+        *first_shard,
+        *second_shard,
+        *first_shard,
+        100007,
+        100008,
+    ]
+
+
+def test_id_mapping_names_the_first_shard(tmp_path: Path) -> None:
+    mapping_writer = IdMappingWriter(tmp_path / "mapping.parquet")
+    mapping_writer.add("veh0", 3)
+    mapping_writer.add("veh1", 4)
+    mapping_writer.close()
+    write_trace(tmp_path / "a.fcd.xml", {0: ["veh0", "veh1"]}, 0)
+    write_trace(tmp_path / "b.fcd.xml", {0: ["veh0", "5"]}, 1000)
+    config = write_config(
+        tmp_path, ["a.fcd.xml", "b.fcd.xml"], 'id_mapping = "mapping.parquet"'
+    )
+
+    positions = convert(config, tmp_path / "out")
+
+    assert positions[AGENT_ID].to_pylist() == [3, 4, 100000, 100001]
+
+
+def test_single_trace_keeps_numeric_ids(tmp_path: Path) -> None:
+    write_trace(tmp_path / "a.fcd.xml", {0: ["12", "veh0"], 1: ["veh0", "12"]}, 0)
+    config = write_config(tmp_path, ["a.fcd.xml"])
+
+    positions = convert(config, tmp_path / "out")
+
+    assert positions[AGENT_ID].to_pylist() == [12, 100000, 100000, 12]
+
+
+@pytest.mark.parametrize("shards", [1, 2])
+def test_writer_thread_writes_what_the_parser_writes(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch, shards: int
+) -> None:
+    # Batches of 50 rows make many batches for the writer thread.
+    monkeypatch.setattr(sumo, "FCD_BATCH_SIZE", 50)
+    traces = []
+    for shard in range(shards):
+        traces.append(f"shard_{shard}.fcd.xml")
+        write_trace(
+            tmp_path / traces[-1],
+            {
+                time_step: [f"veh{index}" for index in range(time_step % 30)]
+                for time_step in range(60)
+            },
+            shard * 1000,
+        )
+    outputs = []
+    for queue_size in [0, 2]:
+        scenario_path = tmp_path / f"queue_{queue_size}"
+        scenario_path.mkdir()
+        for trace in traces:
+            (scenario_path / trace).write_bytes((tmp_path / trace).read_bytes())
+        config = write_config(
+            scenario_path, traces, extra_vehicles=f"queue_size = {queue_size}"
+        )
+        outputs.append(
+            (
+                convert(config, scenario_path / "out"),
+                pq.read_table(
+                    scenario_path
+                    / "out"
+                    / "activations"
+                    / "vehicle_activations.parquet"
+                ),
+            )
+        )
+
+    sequential, threaded = outputs
+    assert sequential[0].num_rows == shards * sum(step % 30 for step in range(60))
+    assert (
+        pq.ParquetFile(
+            tmp_path / "queue_2" / "out" / "positions" / f"{Path(traces[0]).stem}"
+            f"{'_merged' if shards > 1 else ''}.parquet"
+        ).metadata.num_row_groups
+        > 10
+    )
+    assert threaded[0].equals(sequential[0])
+    assert threaded[1].equals(sequential[1])
+
+
+def failing_write(*_: object) -> None:
+    """Fail to write a batch like a full disk."""
+    msg = "No space left on device"
+    raise OSError(msg)
+
+
+@pytest.mark.parametrize("queue_size", [0, 2])
+def test_write_error_reaches_the_parser(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch, queue_size: int
+) -> None:
+    monkeypatch.setattr(sumo, "FCD_BATCH_SIZE", 5)
+    monkeypatch.setattr(SumoConverter, "_write_batch", failing_write)
+    write_trace(
+        tmp_path / "a.fcd.xml", {step: ["veh0", "veh1"] for step in range(9)}, 0
+    )
+    config = write_config(
+        tmp_path, ["a.fcd.xml"], extra_vehicles=f"queue_size = {queue_size}"
+    )
+    converter = SumoConverter(config, tmp_path / "out")
+
+    with pytest.raises(OSError, match="No space left"):
+        converter.fcd_to_parquet()
+
+    # The positions file is closed, without the failed batches.
+    assert pq.read_table(converter.get_parquet_file()).num_rows == 0
+
+
+def test_parse_error_is_raised_over_a_write_error(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    # The 16 rows before the cut fill one batch, whose write fails on the writer
+    # thread, so the parser only learns of the write error when it closes it.
+    monkeypatch.setattr(sumo, "FCD_BATCH_SIZE", 10)
+    monkeypatch.setattr(SumoConverter, "_write_batch", failing_write)
+    write_trace(
+        tmp_path / "a.fcd.xml", {step: ["veh0", "veh1"] for step in range(9)}, 0
+    )
+    # A trace cut off in the middle of a time step.
+    trace = (tmp_path / "a.fcd.xml").read_text()
+    (tmp_path / "a.fcd.xml").write_text(trace[: trace.rindex("<vehicle")])
+    config = write_config(tmp_path, ["a.fcd.xml"], extra_vehicles="queue_size = 2")
+    converter = SumoConverter(config, tmp_path / "out")
+
+    with pytest.raises(Et.ParseError):
+        converter.fcd_to_parquet()
+
+    assert pq.read_table(converter.get_parquet_file()).num_rows == 0
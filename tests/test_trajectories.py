@@ -0,0 +1,136 @@
+from __future__ import annotations
+
+import logging
+import os
+from pathlib import Path
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+
+from prep_disolv.common.columns import AGENT_ID, COORD_X, COORD_Y, TIME_STEP
+from prep_disolv.store.positions import PositionStore
+from prep_disolv.store.trajectories import (
+    ROW_COUNT,
+    ROW_START,
+    SORT_KEYS,
+    TRAJECTORY_ROW_GROUP_SIZE,
+    AgentIndexBuilder,
+    TrajectorySorter,
+    agent_major_files,
+    remove_agent_major_files,
+)
+
+
+def write_positions(position_file: Path, time_steps: int) -> pa.Table:
+    """Write the positions of 5 agents, one of them at every time step."""
+    rng = np.random.default_rng(6)
+    # Agent 2 is at every time step, the others at a random half of them.
+    agent_ids = np.concatenate(
+        [
+            np.full(time_steps, 2),
+            *(np.full(time_steps // 2, agent_id) for agent_id in [0, 1, 3, 4]),
+        ]
+    )
+    step_indices = np.concatenate(
+        [
+            np.arange(time_steps),
+            *(
+                np.sort(rng.choice(time_steps, time_steps // 2, replace=False))
+                for _ in range(4)
+            ),
+        ]
+    )
+    positions = pa.table(
+        {
+            TIME_STEP: step_indices * 100,
+            AGENT_ID: agent_ids,
+            COORD_X: rng.uniform(0, 1000, len(agent_ids)),
+            COORD_Y: rng.uniform(0, 1000, len(agent_ids)),
+        }
+    ).sort_by([(TIME_STEP, "ascending"), (AGENT_ID, "ascending")])
+    pq.write_table(positions, position_file, row_group_size=5000)
+    return positions
+
+
+def test_agent_index_continues_agents_across_calls() -> None:
+    index = AgentIndexBuilder()
+    index.add(np.array([1, 1, 2, 2]))
+    # A call whose rows all continue the previous agent adds no agent.
+    index.add(np.array([2, 2, 2]))
+    index.add(np.array([], dtype=np.int64))
+    index.add(np.array([2, 3]))
+
+    table = index.to_table()
+
+    assert table[AGENT_ID].to_pylist() == [1, 2, 3]
+    assert table[ROW_START].to_pylist() == [0, 2, 8]
+    assert table[ROW_COUNT].to_pylist() == [2, 6, 1]
+
+
+def test_sorted_positions_match_the_index(tmp_path: Path) -> None:
+    time_steps = TRAJECTORY_ROW_GROUP_SIZE + 5000
+    positions = write_positions(tmp_path / "positions.parquet", time_steps)
+
+    sorter = TrajectorySorter(tmp_path / "positions.parquet", run_rows=20000)
+    row_count = sorter.sort()
+
+    agent_major_file, index_file = agent_major_files(tmp_path / "positions.parquet")
+    assert sorter.run_count == -(-positions.num_rows // 20000)
+    assert row_count == positions.num_rows
+    assert pq.read_table(agent_major_file).equals(positions.sort_by(SORT_KEYS))
+    index = pq.read_table(index_file)
+    assert index[AGENT_ID].to_pylist() == [0, 1, 2, 3, 4]
+    assert (
+        index[ROW_COUNT].to_pylist()
+        == [time_steps // 2] * 2 + [time_steps] + [time_steps // 2] * 2
+    )
+    # Agent 2 crosses the row groups of the agent-major file.
+    agent_start, agent_end = index[ROW_START][2:4].to_pylist()
+    assert agent_start < 2 * TRAJECTORY_ROW_GROUP_SIZE < agent_end
+
+    store = PositionStore(tmp_path / "positions.parquet")
+    assert store.agent_major_file is not None
+    for agent_id in [0, 2, 4, 7]:
+        expected = positions.filter(pa.compute.equal(positions[AGENT_ID], agent_id))
+        assert store.trajectory(agent_id).equals(expected)
+
+
+def test_many_runs_are_merged_in_passes(tmp_path: Path) -> None:
+    positions = write_positions(tmp_path / "positions.parquet", 4000)
+
+    # Batches of 1500 rows hold slices of only two runs of the smallest merge size.
+    sorter = TrajectorySorter(tmp_path / "positions.parquet", run_rows=1500)
+    row_count = sorter.sort()
+
+    agent_major_file, _ = agent_major_files(tmp_path / "positions.parquet")
+    assert sorter.run_count == 8
+    assert sorter.merge_passes == 2
+    assert row_count == positions.num_rows
+    assert pq.read_table(agent_major_file).equals(positions.sort_by(SORT_KEYS))
+    assert not list(tmp_path.glob("sort_*"))
+
+
+def test_stale_agent_major_files_are_ignored(
+    tmp_path: Path, caplog: pytest.LogCaptureFixture
+) -> None:
+    write_positions(tmp_path / "positions.parquet", 2000)
+    TrajectorySorter(tmp_path / "positions.parquet").sort()
+    # The positions are written again with other rows after the sort.
+    positions = write_positions(tmp_path / "positions.parquet", 1000)
+    agent_major_file, index_file = agent_major_files(tmp_path / "positions.parquet")
+    for sidecar in [agent_major_file, index_file]:
+        os.utime(sidecar, (0, 0))
+
+    with caplog.at_level(logging.WARNING):
+        store = PositionStore(tmp_path / "positions.parquet")
+
+    assert store.agent_major_file is None
+    assert "Ignoring the stale agent-major positions" in caplog.text
+    expected = positions.filter(pa.compute.equal(positions[AGENT_ID], 3))
+    assert store.trajectory(3).equals(expected)
+
+    remove_agent_major_files(tmp_path / "positions.parquet")
+    assert not agent_major_file.exists()
+    assert not index_file.exists()
@@ -0,0 +1,166 @@
+from __future__ import annotations
+
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+import pytest
+
+from prep_disolv.common.columns import AGENT_ID, DISTANCE, TARGET_ID, TIME_STEP
+from prep_disolv.common.config import V2V
+from prep_disolv.links.csr import CsrLinkWriter
+from prep_disolv.links.transitions import LazyLinkTransitions, LinkTransitions
+from prep_disolv.links.writer import build_link_schema
+
+ENGINES = {"arrow": LinkTransitions, "polars": LazyLinkTransitions}
+
+
+def write_links(link_folder: Path, time_steps: int = 50, seed: int = 5) -> pa.Table:
+    """Write random links of 30 agents to 6 targets in two part files."""
+    rng = np.random.default_rng(seed)
+    rows = []
+    for time_step in range(time_steps):
+        for agent_id in rng.choice(30, 20, replace=False):
+            for target_id in rng.choice(6, rng.integers(1, 4), replace=False):
+                rows.append((time_step * 100, agent_id, target_id, rng.uniform(0, 50)))
+    links = pa.Table.from_arrays(
+        [pa.array(column) for column in zip(*rows, strict=True)],
+        schema=build_link_schema(),
+    )
+    link_folder.mkdir()
+    half = links.num_rows // 2
+    # Small row groups split the time steps across batches and part files.
+    pq.write_table(links.slice(0, half), link_folder / "part-00000.parquet", 37)
+    pq.write_table(links.slice(half), link_folder / "part-00001.parquet", 37)
+    return links
+
+
+def expected_transitions(links: pa.Table) -> list[tuple]:
+    """Follow the nearest target of every agent row by row."""
+    nearest = {}
+    for time_step, agent_id, target_id, distance in zip(
+        *(column.to_pylist() for column in links.columns), strict=True
+    ):
+        key = (time_step, agent_id)
+        if key not in nearest or distance < nearest[key][1]:
+            nearest[key] = (target_id, distance)
+    last_targets: dict[int, int] = {}
+    transitions = []
+    for (time_step, agent_id), (target_id, distance) in sorted(nearest.items()):
+        if last_targets.get(agent_id) != target_id:
+            transitions.append((time_step, agent_id, target_id, distance))
+        last_targets[agent_id] = target_id
+    return transitions
+
+
+def read_transitions(transitions_file: Path) -> list[tuple]:
+    """Read the transitions sorted by time step and agent."""
+    table = pq.read_table(transitions_file)
+    return sorted(
+        zip(
+            *(table[column].to_pylist() for column in build_link_schema().names),
+            strict=True,
+        )
+    )
+
+
+def write_csr_links(links: pa.Table, link_folder: Path) -> None:
+    """Write links sorted by time step as compact links with exact distances."""
+    link_folder.mkdir()
+    links = links.sort_by([(TIME_STEP, "ascending"), (AGENT_ID, "ascending")])
+    writer = CsrLinkWriter(link_folder / "part-00000.arrow", 50.0, 0.001, 50)
+    for time_step in np.unique(links[TIME_STEP].to_numpy()):
+        step = links.filter(pc.equal(links[TIME_STEP], time_step))
+        writer.add_links(
+            int(time_step),
+            *(step[column].to_numpy() for column in [AGENT_ID, TARGET_ID, DISTANCE]),
+        )
+    writer.close()
+
+
+def write_many_links(link_file: Path, time_steps: int) -> None:
+    """Write 5000 random links of 2000 agents per time step."""
+    rng = np.random.default_rng(11)
+    with pq.ParquetWriter(link_file, build_link_schema()) as writer:
+        for time_step in range(time_steps):
+            writer.write_table(
+                pa.Table.from_arrays(
+                    [
+                        np.full(5000, time_step * 100, dtype=np.int64),
+                        rng.integers(0, 2000, 5000),
+                        rng.integers(0, 50, 5000),
+                        rng.uniform(0, 100, 5000),
+                    ],
+                    schema=build_link_schema(),
+                )
+            )
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_transitions_follow_the_nearest_target(tmp_path: Path, engine: str) -> None:
+    links = write_links(tmp_path / "links")
+    transitions = ENGINES[engine](tmp_path / "links", tmp_path / "transitions.parquet")
+
+    count = transitions.extract_transitions()
+
+    expected = expected_transitions(links)
+    assert count == len(expected)
+    assert read_transitions(tmp_path / "transitions.parquet") == expected
+    assert pq.read_schema(tmp_path / "transitions.parquet").names == [
+        TIME_STEP,
+        AGENT_ID,
+        TARGET_ID,
+        DISTANCE,
+    ]
+
+
+def test_engines_write_the_same_transitions(tmp_path: Path) -> None:
+    links = write_links(tmp_path / "links", time_steps=80)
+    write_csr_links(links, tmp_path / f"{V2V}_links")
+    for link_folder in ["links", f"{V2V}_links"]:
+        tables = []
+        for engine, transitions in ENGINES.items():
+            transitions_file = tmp_path / f"{link_folder}_{engine}.parquet"
+            transitions(tmp_path / link_folder, transitions_file).extract_transitions()
+            tables.append(pq.read_table(transitions_file))
+        assert tables[0].num_rows > 0
+        assert tables[0].equals(tables[1])
+
+
+def peak_rss_of_run(engine: str, link_file: Path) -> int:
+    """Extract the transitions in a new process and get its peak RSS in bytes."""
+    script = f"""
+import resource
+from pathlib import Path
+from prep_disolv.links.transitions import {ENGINES[engine].__name__}
+{ENGINES[engine].__name__}(
+    Path({str(link_file)!r}), Path({str(link_file.with_suffix(".out"))!r})
+).extract_transitions()
+print(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+"""
+    result = subprocess.run(
+        [sys.executable, "-c", script],
+        capture_output=True,
+        check=True,
+        text=True,
+        env={**os.environ, "PYTHONPATH": os.pathsep.join(sys.path)},
+    )
+    return int(result.stdout.split()[-1]) * 1024
+
+
+@pytest.mark.skipif(sys.platform != "linux", reason="Needs ru_maxrss in kilobytes.")
+@pytest.mark.parametrize("engine", ENGINES)
+def test_transitions_memory_is_bounded(tmp_path: Path, engine: str) -> None:
+    write_many_links(tmp_path / "short.parquet", 100)
+    write_many_links(tmp_path / "long.parquet", 400)
+
+    short_peak = peak_rss_of_run(engine, tmp_path / "short.parquet")
+    long_peak = peak_rss_of_run(engine, tmp_path / "long.parquet")
+
+    # Four times the links, which take 48 MB more in memory, need no more memory.
+    assert long_peak < short_peak + 16 * 2**20